@@ -0,0 +1,151 @@
+import main
+
+import concurrent.futures
+import functools
+import glob
+import os
+import sys
+import time
+import traceback
+
+# Corrida en lote de muchos modelos .dat
+#
+#   python Batch.py [--workers N] [--method metodo] [--stations k] [--summary archivo] ruta [ruta ...]
+#
+#   Cada ruta puede ser un directorio (se toman todos sus .dat) o un patron
+#   de glob ("variantes/*.dat"). Los modelos se reparten en un pool de
+#   procesos de N trabajadores (por omision el numero de CPUs); cada uno
+#   escribe su .log, .post.res y .stats.json igual que una corrida desde
+#   GiD, y los errores quedan en el .log y en un .err junto al modelo.
+#   --method elige el metodo de solucion de K11 y --stations el numero de
+#   estaciones por barra de los diagramas (ver main.RunModel).
+#   Al final se imprime una tabla con el estado y los tiempos de cada
+#   modelo (y se guarda en el archivo de --summary si se indica).
+
+# Lista ordenada de documentos (rutas sin la extension .dat)
+def FindModels(paths) :
+
+    dataFileNames = []
+    for path in paths :
+        if os.path.isdir(path) :
+            dataFileNames.extend(glob.glob(os.path.join(path, "*.dat")))
+        else :
+            dataFileNames.extend(glob.glob(path))
+
+    fileNames = [os.path.splitext(name)[0] for name in dataFileNames if name.endswith(".dat")]
+
+    return sorted(set(fileNames))
+
+# Correr un modelo en un proceso del pool
+#
+#   Regresa siempre un renglon del resumen; un error no detiene el lote
+def RunOne(fileName, method="auto", stations=0) :
+
+    start = time.perf_counter()
+    row = {"Model"  : fileName,
+           "Status" : "OK",
+           "DOF"    : None,
+           "Method" : "",
+           "Stages" : {},
+           "Error"  : ""}
+
+    try :
+        summary = main.RunModel(fileName, method=method, stations=stations)
+        row["DOF"] = summary["DOF"]
+        row["Method"] = summary["Method"]
+        row["Stages"] = {stage["Name"] : stage["WallTime"] for stage in summary["Stages"]}
+    except Exception as error :
+        row["Status"] = "ERROR"
+        row["Error"] = str(error).splitlines()[0] if str(error) else type(error).__name__
+        with open(fileName + ".err", "w") as errFile :
+            errFile.write(traceback.format_exc())
+
+    row["WallTime"] = time.perf_counter() - start
+
+    return row
+
+# Tabla resumen del lote
+def SummaryTable(rows, wallTime, workers) :
+
+    width = max([len(os.path.basename(row["Model"])) for row in rows] + [6])
+    table = "%-*s %6s %9s %-16s %10s %10s %10s\n" % (width, "Modelo", "Estado", "GDL", "Metodo", "Solucion", "Escritura", "Total(s)")
+    for row in rows :
+        dof = "" if row["DOF"] is None else str(row["DOF"])
+        solve = row["Stages"].get("Desplazamientos")
+        export = row["Stages"].get("Escritura de resultados")
+        table = table + "%-*s %6s %9s %-16s %10s %10s %10.3f\n" % (width, os.path.basename(row["Model"]), row["Status"], dof, row["Method"],
+                                                                  "" if solve is None else "%.3f" % solve,
+                                                                  "" if export is None else "%.3f" % export,
+                                                                  row["WallTime"])
+
+    failed = [row for row in rows if row["Status"] != "OK"]
+    table = table + "\n"
+    table = table + "Modelos:      " + str(len(rows)) + " (" + str(len(failed)) + " con error)\n"
+    table = table + "Trabajadores: " + str(workers) + "\n"
+    table = table + "Tiempo total: %.3f s (suma de modelos %.3f s)\n" % (wallTime, sum(row["WallTime"] for row in rows))
+    for row in failed :
+        table = table + "ERROR " + row["Model"] + ": " + row["Error"] + "\n"
+
+    return table
+
+# Funcion RunBatch
+#
+#   Entradas:
+#       fileNames   Documentos sin extension (ver FindModels)
+#       workers     Numero de procesos (None: numero de CPUs)
+#       method      Metodo de solucion de K11
+#       stations    Estaciones por barra (0: sin diagramas)
+#
+#   Salidas:
+#       rows        Renglones del resumen en el orden de fileNames
+#       table       Tabla resumen en texto
+def RunBatch(fileNames, workers=None, method="auto", stations=0) :
+
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(fileNames)))
+
+    runOne = functools.partial(RunOne, method=method, stations=stations)
+
+    start = time.perf_counter()
+    if workers == 1 :
+        rows = [runOne(fileName) for fileName in fileNames]
+    else :
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool :
+            rows = list(pool.map(runOne, fileNames))
+    wallTime = time.perf_counter() - start
+
+    return rows, SummaryTable(rows, wallTime, workers)
+
+if __name__ == "__main__" :
+
+    arguments = sys.argv[1:]
+    workers = None
+    summaryFileName = None
+    method = "auto"
+    stations = 0
+    paths = []
+    while arguments :
+        argument = arguments.pop(0)
+        if argument == "--workers" and arguments :
+            workers = int(arguments.pop(0))
+        elif argument == "--method" and arguments :
+            method = arguments.pop(0)
+        elif argument == "--stations" and arguments :
+            stations = int(arguments.pop(0))
+        elif argument == "--summary" and arguments :
+            summaryFileName = arguments.pop(0)
+        else :
+            paths.append(argument)
+
+    fileNames = FindModels(paths)
+    if not fileNames :
+        print("Uso: python Batch.py [--workers N] [--method metodo] [--stations k] [--summary archivo] directorio|patron [...]")
+        sys.exit(1)
+
+    rows, table = RunBatch(fileNames, workers, method, stations)
+    print(table)
+    if summaryFileName is not None :
+        with open(summaryFileName, "w") as summaryFile :
+            summaryFile.write(table)
+
+    sys.exit(1 if any(row["Status"] != "OK" for row in rows) else 0)
@@ -0,0 +1,710 @@
+import IOFiles as io
+import Routines as rt
+import Solver as sl
+import Generators as gen
+import Combinations as cb
+import Instrumentation as ins
+import main
+
+import numpy as np
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Benchmarks
+#
+#   python Benchmark.py reader [renglones ...]
+#       Compara ReadDataFile (con y sin mmap) contra el lector original
+#       ReadDataFileByLines en archivos sinteticos con el numero de
+#       renglones indicado (nodos + barras + cargas), por omision
+#       1E5, 3E5 y 1E6
+#
+#   python Benchmark.py writer [crujias ...]
+#       Compara ExportResultsFile contra el escritor original
+#       ExportResultsFileByLines (MB/s) en marcos de crujias x crujias
+#
+#   python Benchmark.py fixedend [crujias ...] [--loads N]
+#       Compara GenerateElementFixedEndForces (integrales exactas por lotes)
+#       contra la version original GenerateElementFixedEndForcesByLoads
+#       (regla de Boole, una carga a la vez) en marcos de crujias x crujias
+#       con N cargas trapezoidales aleatorias en cada barra, y verifica el
+#       ejemplo de Auxiliar Files/NumericalIntegration.xlsx. Termina con
+#       codigo 1 si los momentos de la hoja o la diferencia entre las dos
+#       versiones exceden FIXED_END_TOLERANCE
+#
+#   python Benchmark.py combinations [crujias ...] [--cases N]
+#                                    [--combinations C]
+#       Envolventes de C combinaciones de N casos con
+#       Combinations.CombineAndEnvelope en un marco de crujias x crujias
+#       (resultados aleatorios con las dimensiones del marco): una
+#       combinacion a la vez, por bloques de COMBINATION_BLOCK y todas en un
+#       solo producto. Tiempo y memoria pico (tracemalloc) de cada una
+#
+#   python Benchmark.py suite [--dofs N ...] [--generators G ...]
+#                             [--json archivo] [--baseline archivo]
+#                             [--no-memory]
+#       Corre main.RunModel en modelos de Generators (marcos, armaduras
+#       largas y marcos contraventeados) de 1E2 a 1E5 GDL por omision (1E6
+#       con --dofs 1000000) y registra en un reporte JSON el tiempo y la
+#       memoria pico de cada etapa, leidos del .stats.json que escribe el
+#       PipelineMonitor de la corrida (la memoria se mide con tracemalloc en
+#       una segunda corrida, que se omite con --no-memory). Con --baseline
+#       compara contra un reporte anterior y marca las etapas que se
+#       hicieron mas lentas que SUITE_TOLERANCE veces
+#
+#   python Benchmark.py operator [--dofs N ...] [--generators G ...]
+#                                [--products N] [--json archivo]
+#       Compara K11 ensamblada (CSR) contra el operador sin ensamblar
+#       Solver.ElementOperator: tiempo y memoria pico (tracemalloc) del
+#       ensamble, memoria que queda guardada, tiempo de un producto K11 * v
+#       (promedio de --products productos) y tiempo de la solucion
+#       pcg_jacobi contra pcg_matrixfree. La memoria guardada del operador
+#       cuenta las Ke, que de todos modos existen en model["Arrays"]
+#
+#   python Benchmark.py startup [--executable ruta] [--repeat N]
+#                               [--json archivo]
+#       Arranque en frio de una corrida de una sola vez sobre Model.dat:
+#       tiempo hasta el primer renglon del .log, hasta el .post.res completo
+#       y la etapa "Carga de modulos" del .stats.json. Por omision corre
+#       "python main.py"; con --executable mide el ejecutable de PyInstaller
+#       que usa Taller.unix.bat. Marca si la mediana del primer renglon
+#       excede STARTUP_BUDGET segundos
+#
+#   python Benchmark.py check [documento.dat ...]
+#       Verificaciones de regresion de las versiones por lotes contra las
+#       originales sobre Model.dat y un marco contraventeado de Generators
+#       (o sobre los .dat indicados). Termina con codigo 1 si alguna no
+#       coincide:
+#           fuerzas elementales: SolveElementForces contra el ciclo por
+#           barra original (diferencia relativa hasta CHECK_TOLERANCE)
+#           lector: ReadDataFile (con y sin mmap) contra ReadDataFileByLines
+#           (arreglos del modelo y de los casos de carga identicos)
+#           escritor: ExportResultsFile y ResultsWriter contra
+#           ExportResultsFileByLines con los mismos resultados (.post.res
+#           identicos byte por byte)
+
+# Marco sintetico con aproximadamente rowCount renglones de datos
+def _FrameForRows(rowCount, shuffle=False) :
+
+    # Un marco de b crujias y b niveles tiene ~ (b+1)^2 nodos,
+    # ~ 2 b (b+1) barras y ~ b^2 cargas en vigas
+    bays = max(1, int((rowCount / 4.0) ** 0.5))
+
+    return gen.GridFrame(bays, bays, shuffle=shuffle)
+
+def _Time(function, *args, **kwargs) :
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+# Resolver un modelo completo (sin escribir resultados)
+def _Solve(model) :
+
+    dofData = rt.GenerateDOF(model)
+    rt.GenerateElementsDOF(model,dofData)
+    rt.GenerateElementMatrices(model,dofData)
+    rt.GenerateElementFixedEndForces(model)
+    K = sl.AssembleStiffnessMatrix(model,dofData)
+    QF = sl.AssebembleElementForcesVector(model,dofData)
+    Q = sl.AssembleForceVector(model,dofData)
+    Dk = np.zeros((dofData["DOFCount"] - dofData["UnknownDOFCount"], len(model["LoadCases"])))
+    D = {"Du" : sl.SolveDisplacements(K,QF,Q,Dk),
+         "Dk" : Dk}
+    R = sl.SolveReactions(K,QF,Q,D)
+    sl.SolveElementForces(model,D)
+
+    return dofData, D, R
+
+# Benchmark del escritor de resultados .post.res
+def BenchmarkWriter(bayCounts) :
+
+    print("%8s %9s %9s %12s %12s %8s" % ("Crujias", "Barras", "MB", "ByLines MB/s", "Bulk MB/s", "Mejora"))
+
+    with tempfile.TemporaryDirectory() as directory :
+        for bays in bayCounts :
+            model = gen.GridFrame(bays, bays)
+            dofData, D, R = _Solve(model)
+
+            fileName = os.path.join(directory, "bench.post.res")
+            tLines, _ = _Time(io.ExportResultsFileByLines, fileName, model, D, R, dofData)
+            tBulk, _ = _Time(io.ExportResultsFile, fileName, model, D, R, dofData)
+            size = os.path.getsize(fileName) / 1.0E6
+
+            print("%8d %9d %9.1f %12.1f %12.1f %7.1fx" % (bays, model["Arrays"]["BarIDs"].shape[0], size,
+                                                           size / tLines, size / tBulk, tLines / tBulk))
+
+    return
+
+# Benchmark del lector de archivos .dat
+def BenchmarkReader(rowCounts) :
+
+    print("%10s %9s %12s %12s %12s %8s" % ("Renglones", "MB", "ByLines(s)", "Bulk(s)", "Bulk+mmap(s)", "Mejora"))
+
+    with tempfile.TemporaryDirectory() as directory :
+        for rowCount in rowCounts :
+            fileName = os.path.join(directory, "bench.dat")
+            io.WriteDataFile(fileName, _FrameForRows(rowCount))
+
+            with open(fileName) as dataFile :
+                rows = sum(1 for _ in dataFile)
+            size = os.path.getsize(fileName) / 1.0E6
+
+            tLines, _ = _Time(io.ReadDataFileByLines, fileName)
+            tBulk, _ = _Time(io.ReadDataFile, fileName)
+            tMap, _ = _Time(io.ReadDataFile, fileName, memoryMap=True)
+
+            print("%10d %9.1f %12.3f %12.3f %12.3f %7.1fx" % (rows, size, tLines, tBulk, tMap, tLines / min(tBulk, tMap)))
+
+    return
+
+# Ejemplo de Auxiliar Files/NumericalIntegration.xlsx (regla de Boole):
+# L, a, wa, b, wb y los momentos MA, MB de la hoja
+FIXED_END_SHEET = (5.0, 1.0, 3.0, 3.0, 4.0)
+FIXED_END_SHEET_MOMENTS = (4.634666666666666, -3.3653333333333335)
+
+# Diferencia relativa permitida (Boole es exacta para cargas trapezoidales)
+FIXED_END_TOLERANCE = 1.0E-9
+
+# Benchmark de las fuerzas de empotramiento perfecto; regresa las
+# verificaciones que fallaron
+def BenchmarkFixedEnd(bayCounts, loadsPerBar) :
+
+    failures = []
+
+    qF = rt.BatchFixedEndForces_FRAME(*[[value] for value in FIXED_END_SHEET])
+    print("NumericalIntegration.xlsx: MA %.12f (hoja %.12f)  MB %.12f (hoja %.12f)" % (qF[0,2], FIXED_END_SHEET_MOMENTS[0],
+                                                                                   qF[0,5], FIXED_END_SHEET_MOMENTS[1]))
+    if not np.allclose(qF[0,[2,5]], FIXED_END_SHEET_MOMENTS, rtol=FIXED_END_TOLERANCE, atol=0.0) :
+        failures.append("NumericalIntegration.xlsx")
+
+    print("%8s %9s %9s %12s %12s %8s %12s" % ("Crujias", "Barras", "Cargas", "ByLoads(s)", "Lotes(s)", "Mejora", "Dif. rel."))
+
+    rng = np.random.default_rng(0)
+    for bays in bayCounts :
+        model = gen.GridFrame(bays, bays)
+        dofData = rt.GenerateDOF(model)
+        rt.GenerateElementsDOF(model,dofData)
+        rt.GenerateElementMatrices(model,dofData)
+
+        # Cargas trapezoidales aleatorias dentro de cada barra
+        arrays = model["Arrays"]
+        barIDs = np.repeat(arrays["BarIDs"], loadsPerBar)
+        lengths = np.repeat(arrays["Length"], loadsPerBar)
+        a = rng.uniform(0.0, 0.5, barIDs.shape[0]) * lengths
+        b = a + rng.uniform(0.1, 1.0, barIDs.shape[0]) * (lengths - a)
+        caseData = model["LoadCases"][0]["Arrays"]
+        caseData["BarID"] = barIDs
+        caseData["BarLoads"] = np.column_stack((a, rng.normal(-15.0, 5.0, a.shape[0]), b, rng.normal(-15.0, 5.0, a.shape[0])))
+
+        tLoads, _ = _Time(rt.GenerateElementFixedEndForcesByLoads, model)
+        reference = arrays["qF"]
+        tBatch, _ = _Time(rt.GenerateElementFixedEndForces, model)
+        difference = np.abs(arrays["qF"] - reference).max() / np.abs(reference).max()
+
+        print("%8d %9d %9d %12.3f %12.3f %7.1fx %12.1e" % (bays, arrays["BarIDs"].shape[0], barIDs.shape[0],
+                                                          tLoads, tBatch, tLoads / tBatch, difference))
+        if not difference <= FIXED_END_TOLERANCE :
+            failures.append("marco de %d crujias" % bays)
+
+    for failure in failures :
+        print("ERROR: las fuerzas de empotramiento no coinciden (" + failure + ")")
+
+    return failures
+
+COMBINATION_BAYS = [50, 100, 224]
+COMBINATION_CASES = 6
+COMBINATION_COUNT = 200
+
+# Benchmark de las combinaciones de carga por superposicion
+def BenchmarkCombinations(bayCounts, caseCount=COMBINATION_CASES, combinationCount=COMBINATION_COUNT) :
+
+    blocks = [1, cb.COMBINATION_BLOCK, combinationCount]
+    print("%8s %9s %6s %6s" % ("Crujias", "Barras", "Casos", "Comb.") +
+          "".join(" %12s %10s" % ("Bloque %d(s)" % block, "Pico(MB)") for block in blocks))
+
+    rng = np.random.default_rng(0)
+    for bays in bayCounts :
+        model = gen.GridFrame(bays, bays)
+        dofData = rt.GenerateDOF(model)
+        dofCount = dofData["DOFCount"]
+        dofU = dofData["UnknownDOFCount"]
+        barCount = model["Arrays"]["BarIDs"].shape[0]
+
+        results = {"Du"      : rng.normal(size=(dofU, caseCount)),
+                   "Dk"      : np.zeros((dofCount - dofU, caseCount)),
+                   "R"       : rng.normal(size=(dofCount - dofU, caseCount)),
+                   "qe"      : rng.normal(size=(barCount, 6, caseCount)),
+                   "DOFData" : dofData}
+        table = {"Names"   : ["C" + str(combination + 1) for combination in range(combinationCount)],
+                 "Factors" : rng.choice([0.0, 0.9, 1.0, 1.2, 1.4, 1.6], size=(caseCount, combinationCount))}
+
+        line = "%8d %9d %6d %6d" % (bays, barCount, caseCount, combinationCount)
+        envelopes = []
+        for block in blocks :
+            elapsed, peak, envelope = _TimeAndMemory(cb.CombineAndEnvelope, model, results, table, [], None, block)
+            envelopes.append(envelope)
+            line = line + " %12.3f %10.1f" % (elapsed, peak)
+        print(line)
+
+        for envelope in envelopes[1:] :
+            for key in envelope :
+                for bound in ["Max", "Min"] :
+                    reference = envelopes[0][key][bound]
+                    if np.abs(envelope[key][bound] - reference).max() > 1.0E-12 * np.abs(reference).max() :
+                        print("%8s diferencia en la envolvente %s %s" % ("", key, bound))
+
+    return
+
+SUITE_DOFS = [100, 1000, 10000, 100000]
+SUITE_TOLERANCE = 1.25
+SUITE_MIN_TIME = 0.05
+
+# Etapas de main.RunModel que se comparan y su columna en la tabla
+SUITE_STAGES = ["Lectura", "Grados de libertad", "Matrices elementales", "Ensamble",
+                "Desplazamientos", "Reacciones", "Fuerzas elementales", "Escritura de resultados"]
+SUITE_COLUMNS = ["Lectura", "GDL", "Elementos", "Ensamble", "Solucion", "Reacciones", "Fuerzas", "Escritura"]
+
+# Correr main.RunModel sobre el documento fileName y leer su .stats.json.
+# El cache binario se borra antes para que la lectura sea siempre del .dat
+def _RunPipeline(fileName) :
+
+    cacheFileName = io.CacheFileName(fileName + ".dat")
+    if os.path.exists(cacheFileName) :
+        os.remove(cacheFileName)
+
+    main.RunModel(fileName)
+
+    with open(fileName + ".stats.json") as statsFile :
+        stats = json.load(statsFile)
+
+    return stats, {stage["Name"] : stage for stage in stats["Stages"]}
+
+# Suite de escalamiento: generadores x tamanos, reporte JSON
+def BenchmarkSuite(dofCounts, generators, reportFileName=None, baselineFileName=None, traceMemory=True) :
+
+    report = {"Python"   : sys.version.split()[0],
+              "NumPy"    : np.__version__,
+              "Platform" : sys.platform,
+              "Runs"     : []}
+
+    header = "%-8s %9s" % ("Modelo", "GDL") + "".join(" %9s" % column[:9] for column in SUITE_COLUMNS) + " %9s %9s"
+    print(header % ("Total(s)", "RSS(MB)"))
+
+    with tempfile.TemporaryDirectory() as directory :
+        fileName = os.path.join(directory, "suite")
+
+        # Calentamiento: carga NumPy y los modulos de scipy que se importan
+        # al primer uso (RCM, solucion rala) para que no se sumen a la
+        # primera corrida
+        io.WriteDataFile(fileName + ".dat", gen.GridFrame(20, 20))
+        _RunPipeline(fileName)
+
+        for kind in generators :
+            for dofCount in dofCounts :
+                io.WriteDataFile(fileName + ".dat", gen.ModelForDOFs(kind, dofCount, shuffle=True))
+
+                stats, pipeline = _RunPipeline(fileName)
+                stages = {name : {"Time"        : stage["WallTime"],
+                                  "CPUTime"     : stage["CPUTime"],
+                                  "RSSGrowthMB" : stage["RSSGrowthMB"],
+                                  "Info"        : stage["Info"]} for name, stage in pipeline.items()}
+                if traceMemory :
+                    tracemalloc.start()
+                    _, traced = _RunPipeline(fileName)
+                    tracemalloc.stop()
+                    for name in stages :
+                        stages[name]["PeakMemoryMB"] = traced[name]["TracedPeakMB"]
+
+                run = {"Generator" : kind,
+                       "TargetDOF" : dofCount,
+                       "Model"     : {key : stats[key] for key in ["DOF", "UnknownDOF", "Nodes", "Bars", "Method", "Reordering", "Bandwidth"]},
+                       "Stages"    : stages,
+                       "TotalTime" : stats["WallTime"],
+                       "MaxRSSMB"  : ins.PeakRSS()}
+                report["Runs"].append(run)
+
+                rss = "" if run["MaxRSSMB"] is None else "%.1f" % run["MaxRSSMB"]
+                print("%-8s %9d" % (kind, stats["DOF"]) + "".join(" %9.3f" % stages[stage]["Time"] for stage in SUITE_STAGES) +
+                      " %9.3f %9s" % (run["TotalTime"], rss))
+
+    if reportFileName is not None :
+        with open(reportFileName, "w") as reportFile :
+            json.dump(report, reportFile, indent=2)
+        print("Reporte: " + reportFileName)
+
+    regressions = []
+    if baselineFileName is not None :
+        regressions = CompareReports(report, baselineFileName)
+
+    return report, regressions
+
+# Comparar un reporte contra una linea base; regresa las etapas que se
+# hicieron mas lentas que SUITE_TOLERANCE veces (se ignoran las etapas de menos de
+# SUITE_MIN_TIME segundos, dominadas por ruido)
+def CompareReports(report, baselineFileName) :
+
+    with open(baselineFileName) as baselineFile :
+        baseline = json.load(baselineFile)
+
+    previous = {(run["Generator"], run["TargetDOF"]) : run for run in baseline["Runs"]}
+
+    regressions = []
+    for run in report["Runs"] :
+        old = previous.get((run["Generator"], run["TargetDOF"]))
+        if old is None :
+            continue
+        for stage in SUITE_STAGES :
+            new = run["Stages"][stage]["Time"]
+            ref = old["Stages"].get(stage, {}).get("Time")
+            if ref is not None and new > SUITE_MIN_TIME and new > SUITE_TOLERANCE * ref :
+                regressions.append((run["Generator"], run["TargetDOF"], stage, ref, new))
+
+    for kind, dofCount, stage, ref, new in regressions :
+        print("REGRESION %-8s %9d %-24s %9.3f -> %9.3f s" % (kind, dofCount, stage, ref, new))
+    if not regressions :
+        print("Sin regresiones contra " + baselineFileName)
+
+    return regressions
+
+OPERATOR_DOFS = [1000, 10000, 100000]
+OPERATOR_PRODUCTS = 50
+
+# Tiempo y memoria pico (tracemalloc, en una segunda llamada) de function
+def _TimeAndMemory(function, *args) :
+
+    elapsed, result = _Time(function, *args)
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 1.0E6
+    tracemalloc.stop()
+
+    return elapsed, peak, result
+
+# Benchmark de K11 ensamblada contra el operador elemento por elemento
+def BenchmarkOperator(dofCounts, generators, products=OPERATOR_PRODUCTS, reportFileName=None) :
+
+    report = {"Python"   : sys.version.split()[0],
+              "NumPy"    : np.__version__,
+              "Platform" : sys.platform,
+              "Runs"     : []}
+
+    print("%-8s %8s %-10s %10s %10s %10s %10s %10s %6s" % ("Modelo", "GDL", "K11", "Ensamble", "Pico(MB)", "Guarda(MB)",
+                                                        "K11*v(ms)", "PCG(s)", "Iter"))
+
+    for kind in generators :
+        for dofCount in dofCounts :
+            model = gen.ModelForDOFs(kind, dofCount)
+            dofData = rt.GenerateDOF(model)
+            rt.GenerateElementsDOF(model,dofData)
+            rt.GenerateElementMatrices(model,dofData)
+            rt.GenerateElementFixedEndForces(model)
+            QF = sl.AssebembleElementForcesVector(model,dofData)
+            Q = sl.AssembleForceVector(model,dofData)
+            Dk = np.zeros((dofData["DOFCount"] - dofData["UnknownDOFCount"], len(model["LoadCases"])))
+            v = np.random.default_rng(0).random(dofData["UnknownDOFCount"])
+
+            solutions = {}
+            for storage, matrixFree, method in [("csr", False, "pcg_jacobi"), ("operador", True, "pcg_matrixfree")] :
+                tAssembly, peak, K = _TimeAndMemory(sl.AssembleStiffnessMatrix, model, dofData, True, matrixFree)
+                K11 = K["K11"]
+                if matrixFree :
+                    stored = K11.nbytes / 1.0E6
+                else :
+                    stored = (K11.data.nbytes + K11.indices.nbytes + K11.indptr.nbytes) / 1.0E6
+
+                tProduct, _ = _Time(lambda : [K11 @ v for _ in range(products)])
+                tSolve, Du = _Time(sl.SolveDisplacements, K, QF, Q, Dk, method)
+                solutions[storage] = Du
+                iterations = max(K["Factorization"]["Iterations"])
+
+                run = {"Generator"      : kind,
+                       "DOF"            : dofData["DOFCount"],
+                       "UnknownDOF"     : dofData["UnknownDOFCount"],
+                       "Storage"        : storage,
+                       "AssemblyTime"   : tAssembly,
+                       "AssemblyPeakMB" : peak,
+                       "StoredMB"       : stored,
+                       "ProductTime"    : tProduct / products,
+                       "SolveTime"      : tSolve,
+                       "Iterations"     : iterations,
+                       "Method"         : K["Factorization"]["Method"]}
+                report["Runs"].append(run)
+
+                print("%-8s %8d %-10s %10.3f %10.1f %10.1f %10.3f %10.3f %6d" % (kind, run["DOF"], storage, tAssembly, peak, stored,
+                                                                               1.0E3 * run["ProductTime"], tSolve, iterations))
+
+            scale = max(np.abs(solutions["csr"]).max(), 1.0E-300)
+            print("%-8s %8s diferencia relativa en Du: %.1e" % ("", "", np.abs(solutions["csr"] - solutions["operador"]).max() / scale))
+
+    if reportFileName is not None :
+        with open(reportFileName, "w") as reportFile :
+            json.dump(report, reportFile, indent=2)
+        print("Reporte: " + reportFileName)
+
+    return report
+
+STARTUP_BUDGET = 0.1
+STARTUP_POLL = 0.0005
+
+# Correr una vez el comando sobre el documento fileName y medir el tiempo
+# hasta el primer renglon del .log y hasta que termina el proceso
+def _StartupRun(command, fileName) :
+
+    logFileName = fileName + ".log"
+    for extension in [".log", ".post.res", ".stats.json"] :
+        if os.path.exists(fileName + extension) :
+            os.remove(fileName + extension)
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command + [fileName], stdout=subprocess.DEVNULL)
+
+    firstLine = None
+    while process.poll() is None :
+        if firstLine is None and os.path.exists(logFileName) and os.path.getsize(logFileName) > 0 :
+            firstLine = time.perf_counter() - start
+        time.sleep(STARTUP_POLL)
+    total = time.perf_counter() - start
+
+    if process.returncode != 0 :
+        raise RuntimeError("La corrida fallo con codigo " + str(process.returncode))
+    if firstLine is None :
+        firstLine = total
+
+    with open(fileName + ".stats.json") as statsFile :
+        stages = {stage["Name"] : stage["WallTime"] for stage in json.load(statsFile)["Stages"]}
+
+    return {"FirstLogLine" : firstLine,
+            "Total"        : total,
+            "LoadModules"  : stages.get("Carga de modulos")}
+
+# Benchmark de arranque en frio (ver arriba)
+def BenchmarkStartup(executable=None, repeat=5, reportFileName=None) :
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    command = [executable] if executable else [sys.executable, os.path.join(here, "main.py")]
+
+    with tempfile.TemporaryDirectory() as directory :
+        fileName = os.path.join(directory, "Model")
+        shutil.copy(os.path.join(here, "Model.dat"), fileName + ".dat")
+
+        # La primera corrida crea el cache del modelo y calienta el disco
+        _StartupRun(command, fileName)
+        runs = [_StartupRun(command, fileName) for _ in range(repeat)]
+
+    median = {key : float(np.median([run[key] for run in runs])) for key in ["FirstLogLine", "Total", "LoadModules"]}
+
+    print("Comando:                 " + " ".join(command))
+    print("Primer renglon del .log: %.3f s (presupuesto %.3f s)" % (median["FirstLogLine"], STARTUP_BUDGET))
+    print("Carga de modulos:        %.3f s" % median["LoadModules"])
+    print("Corrida completa:        %.3f s" % median["Total"])
+
+    report = {"Command" : command,
+              "Budget"  : STARTUP_BUDGET,
+              "Median"  : median,
+              "Runs"    : runs}
+    if reportFileName is not None :
+        with open(reportFileName, "w") as reportFile :
+            json.dump(report, reportFile, indent=2)
+
+    overBudget = median["FirstLogLine"] > STARTUP_BUDGET
+    if overBudget :
+        print("El primer renglon excede el presupuesto de arranque")
+
+    return report, overBudget
+
+CHECK_TOLERANCE = 1.0E-12
+
+# Diferencia relativa maxima entre dos arreglos
+def _RelativeDifference(values, reference) :
+    return np.abs(values - reference).max() / max(np.abs(reference).max(), 1.0E-300)
+
+# Fuerzas elementales del ciclo por barra original (qe = ke Te De + qF de
+# cada barra con sus GDL)
+def _ElementForcesByBars(model,D) :
+
+    arrays = model["Arrays"]
+    Disp = np.concatenate((D["Du"],D["Dk"]))
+    qe = np.zeros(arrays["qF"].shape)
+
+    for bar in range(arrays["BarIDs"].shape[0]) :
+        barDOF = arrays["BarDOF"][bar]
+        size = int((barDOF >= 0).sum())
+        ke = arrays["k"][bar,:size,:size]
+        Te = arrays["T"][bar,:size,:size]
+        De = Disp[barDOF[:size]]
+        qe[bar,:size] = ke @ Te @ De + arrays["qF"][bar,:size]
+
+    return qe
+
+# Arreglos en que difieren dos modelos (mismos valores y tipos)
+def _ModelDifferences(model, reference) :
+
+    pairs = [("Arrays", model["Arrays"], reference["Arrays"])]
+    if len(model["LoadCases"]) != len(reference["LoadCases"]) :
+        return ["LoadCases"]
+    for case, referenceCase in zip(model["LoadCases"], reference["LoadCases"]) :
+        if case["Name"] != referenceCase["Name"] :
+            return ["LoadCases"]
+        pairs.append((case["Name"], case["Arrays"], referenceCase["Arrays"]))
+
+    differences = []
+    for owner, arrays, referenceArrays in pairs :
+        for key in sorted(set(arrays) | set(referenceArrays)) :
+            if key not in arrays or key not in referenceArrays :
+                differences.append(owner + "/" + key)
+                continue
+            values = np.asarray(arrays[key])
+            referenceValues = np.asarray(referenceArrays[key])
+            if values.dtype != referenceValues.dtype or not np.array_equal(values, referenceValues) :
+                differences.append(owner + "/" + key)
+
+    return differences
+
+# Primer renglon en que difieren dos archivos (None si son identicos)
+def _FirstDifference(fileName, referenceFileName) :
+
+    with open(fileName, "rb") as resultsFile, open(referenceFileName, "rb") as referenceFile :
+        lines = resultsFile.read().split(b"\n")
+        referenceLines = referenceFile.read().split(b"\n")
+
+    for number, (line, referenceLine) in enumerate(zip(lines, referenceLines)) :
+        if line != referenceLine :
+            return "renglon %d: %r en lugar de %r" % (number + 1, line.decode(), referenceLine.decode())
+    if len(lines) != len(referenceLines) :
+        return "%d renglones en lugar de %d" % (len(lines), len(referenceLines))
+
+    return None
+
+# Verificaciones de regresion sobre cada archivo; regresa las que fallaron
+def CheckRegressions(dataFileNames) :
+
+    failures = []
+
+    def Check(fileName, name, ok, detail) :
+        print("%-32s %-26s %-6s %s" % (os.path.basename(fileName), name, "OK" if ok else "FALLA", detail))
+        if not ok :
+            failures.append((fileName, name))
+
+    with tempfile.TemporaryDirectory() as directory :
+        for dataFileName in dataFileNames :
+            reference = io.ReadDataFileByLines(dataFileName)
+            for name, memoryMap in [("Lector", False), ("Lector mmap", True)] :
+                differences = _ModelDifferences(io.ReadDataFile(dataFileName, memoryMap=memoryMap), reference)
+                Check(dataFileName, name, not differences, ", ".join(differences) or "identico")
+
+            model = io.ReadDataFile(dataFileName)
+            dofData, D, R = _Solve(model)
+
+            difference = _RelativeDifference(model["Arrays"]["qe"], _ElementForcesByBars(model,D))
+            Check(dataFileName, "Fuerzas elementales", difference <= CHECK_TOLERANCE, "dif. rel. %.1e" % difference)
+
+            referenceFileName = os.path.join(directory, "reference.post.res")
+            io.ExportResultsFileByLines(referenceFileName, model, D, R, dofData)
+
+            resultsFileName = os.path.join(directory, "bulk.post.res")
+            io.ExportResultsFile(resultsFileName, model, D, R, dofData)
+            difference = _FirstDifference(resultsFileName, referenceFileName)
+            Check(dataFileName, "Escritor", difference is None, difference or "identico")
+
+            resultsFileName = os.path.join(directory, "writer.post.res")
+            writer = io.ResultsWriter(resultsFileName, model)
+            writer.SubmitDisplacements(D, dofData)
+            writer.SubmitReactions(R, dofData)
+            writer.SubmitBarForces()
+            difference = writer.Close() or _FirstDifference(resultsFileName, referenceFileName)
+            Check(dataFileName, "Escritor en segundo plano", difference is None, difference or "identico")
+
+    return failures
+
+# Opciones "--nombre valor ..." de la linea de comandos
+def _Options(arguments) :
+
+    options = {}
+    name = None
+    for argument in arguments :
+        if argument.startswith("--") :
+            name = argument[2:]
+            options[name] = []
+        elif name is not None :
+            options[name].append(argument)
+
+    return options
+
+if __name__ == "__main__" :
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ["reader", "writer", "fixedend", "combinations", "suite", "operator", "startup", "check"] :
+        print("Uso: python Benchmark.py reader [renglones ...]")
+        print("     python Benchmark.py writer [crujias ...]")
+        print("     python Benchmark.py fixedend [crujias ...] [--loads N]")
+        print("     python Benchmark.py combinations [crujias ...] [--cases N] [--combinations C]")
+        print("     python Benchmark.py suite [--dofs N ...] [--generators " + " ".join(gen.GENERATORS) + "]")
+        print("                               [--json archivo] [--baseline archivo] [--no-memory]")
+        print("     python Benchmark.py operator [--dofs N ...] [--generators " + " ".join(gen.GENERATORS) + "]")
+        print("                                  [--products N] [--json archivo]")
+        print("     python Benchmark.py startup [--executable ruta] [--repeat N] [--json archivo]")
+        print("     python Benchmark.py check [documento.dat ...]")
+        sys.exit(1)
+
+    if sys.argv[1] == "reader" :
+        counts = [int(float(value)) for value in sys.argv[2:]] or [100000, 300000, 1000000]
+        BenchmarkReader(counts)
+
+    if sys.argv[1] == "writer" :
+        counts = [int(value) for value in sys.argv[2:]] or [50, 100, 200]
+        BenchmarkWriter(counts)
+
+    if sys.argv[1] == "fixedend" :
+        options = _Options(["--bays"] + sys.argv[2:])
+        counts = [int(value) for value in options.get("bays", [])] or [20, 50, 100]
+        loadsPerBar = int((options.get("loads") or [2])[0])
+        failures = BenchmarkFixedEnd(counts, loadsPerBar)
+        sys.exit(1 if failures else 0)
+
+    if sys.argv[1] == "combinations" :
+        options = _Options(["--bays"] + sys.argv[2:])
+        counts = [int(value) for value in options.get("bays", [])] or COMBINATION_BAYS
+        caseCount = int((options.get("cases") or [COMBINATION_CASES])[0])
+        combinationCount = int((options.get("combinations") or [COMBINATION_COUNT])[0])
+        BenchmarkCombinations(counts, caseCount, combinationCount)
+
+    if sys.argv[1] == "suite" :
+        options = _Options(sys.argv[2:])
+        dofCounts = [int(float(value)) for value in options.get("dofs", [])] or SUITE_DOFS
+        generators = options.get("generators") or gen.GENERATORS
+        reportFileName = (options.get("json") or ["benchmark.json"])[0]
+        baselineFileName = (options.get("baseline") or [None])[0]
+        traceMemory = "no-memory" not in options
+        _, regressions = BenchmarkSuite(dofCounts, generators, reportFileName, baselineFileName, traceMemory)
+        sys.exit(1 if regressions else 0)
+
+    if sys.argv[1] == "operator" :
+        options = _Options(sys.argv[2:])
+        dofCounts = [int(float(value)) for value in options.get("dofs", [])] or OPERATOR_DOFS
+        generators = options.get("generators") or gen.GENERATORS
+        products = int((options.get("products") or [OPERATOR_PRODUCTS])[0])
+        reportFileName = (options.get("json") or [None])[0]
+        BenchmarkOperator(dofCounts, generators, products, reportFileName)
+
+    if sys.argv[1] == "startup" :
+        options = _Options(sys.argv[2:])
+        executable = (options.get("executable") or [None])[0]
+        repeat = int((options.get("repeat") or [5])[0])
+        reportFileName = (options.get("json") or [None])[0]
+        _, overBudget = BenchmarkStartup(executable, repeat, reportFileName)
+        sys.exit(1 if overBudget else 0)
+
+    if sys.argv[1] == "check" :
+        with tempfile.TemporaryDirectory() as directory :
+            dataFileNames = sys.argv[2:]
+            if not dataFileNames :
+                here = os.path.dirname(os.path.abspath(__file__))
+                dataFileNames = [os.path.join(here, "Model.dat"), os.path.join(directory, "braced.dat")]
+                io.WriteDataFile(dataFileNames[1], gen.BracedFrame(8, 8, shuffle=True))
+            failures = CheckRegressions(dataFileNames)
+        sys.exit(1 if failures else 0)
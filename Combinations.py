@@ -0,0 +1,391 @@
+import IOFiles as io
+import Instrumentation as ins
+import ModelData as md
+
+import numpy as np
+
+import csv
+import sys
+
+# Combinaciones de carga por superposicion
+#
+#   python Combinations.py documento tabla.csv [--select nombre ...]
+#                          [--block n]
+#
+#   Los desplazamientos, reacciones y fuerzas en las barras de una
+#   combinacion son la suma de los de los casos basicos por sus factores,
+#   asi que no hace falta resolver otra vez: con F (casos x combinaciones)
+#
+#       D_comb = D F,   R_comb = R F,   qe_comb = qe F
+#
+#   Los casos se leen de documento.results.npz (main.py --save-results);
+#   si no existe o el .dat cambio, se resuelven en memoria (SolveCases) y se
+#   guarda un documento.results.npz nuevo. No se corre main.RunModel, que
+#   reemplazaria el .post.res, el .log y el .stats.json del documento.
+#
+#   La tabla es un CSV con un renglon de encabezado con los nombres de los
+#   casos del .dat (en cualquier orden; los que falten tienen factor 0) y un
+#   renglon por combinacion. Los renglones que empiezan con "#" y las
+#   celdas vacias (factor 0) se ignoran:
+#
+#       Combinacion, Base, LIVE
+#       1.4D,        1.4
+#       1.2D+1.6L,   1.2,  1.6
+#
+#   Las combinaciones se calculan por bloques de --block combinaciones
+#   (COMBINATION_BLOCK por omision), cada bloque con un solo producto de
+#   matrices (CaseMatrix), y con cada combinacion se actualizan las
+#   envolventes maxima y minima de cada GDL, reaccion y fuerza en los
+#   extremos de las barras, con la combinacion que la produce. La memoria
+#   depende del bloque y no del numero de combinaciones.
+#
+#   Salidas junto al documento:
+#       documento.combinations.post.res  Las combinaciones de --select (todas
+#                                        por omision; --select sin nombres
+#                                        solo escribe las envolventes), un
+#                                        paso de GiD por combinacion, y dos
+#                                        pasos mas con las envolventes
+#       documento.envelope.csv           Envolventes por nodo y por barra
+#                                        con la combinacion que las produce
+#       documento.combinations.log       Mediciones de las etapas
+
+# Combinaciones por bloque
+COMBINATION_BLOCK = 16
+
+# Nombres de los pasos de las envolventes en el .post.res
+ENVELOPE_NAMES = ["Envolvente maxima", "Envolvente minima"]
+
+# Funcion ReadCombinationTable
+#
+#   Entradas:
+#       tableFileName   Tabla CSV de factores (ver arriba)
+#       caseNames       Nombres de los casos de carga del modelo
+#
+#   Salidas:
+#       table           {"Names"   : nombres de las combinaciones,
+#                        "Factors" : factores (casos x combinaciones)}
+def ReadCombinationTable(tableFileName, caseNames) :
+
+    def error(line, message) :
+        raise ValueError(tableFileName + ", renglon " + str(line) + ": " + message)
+
+    names = []
+    factors = []
+    columns = None
+    with open(tableFileName, newline="") as tableFile :
+        reader = csv.reader(tableFile)
+        for row in reader :
+            cells = [cell.strip() for cell in row]
+            if not any(cells) or cells[0].startswith("#") :
+                continue
+
+            # Encabezado: nombres de los casos
+            if columns is None :
+                header = cells[1:]
+                for name in header :
+                    if name not in caseNames :
+                        error(reader.line_num, "el caso " + repr(name) + " no existe en el modelo")
+                    if header.count(name) > 1 :
+                        error(reader.line_num, "el caso " + repr(name) + " esta repetido")
+                columns = [caseNames.index(name) for name in header]
+                continue
+
+            if len(cells) - 1 > len(columns) :
+                error(reader.line_num, "hay mas factores que casos en el encabezado")
+            if cells[0] in names :
+                error(reader.line_num, "la combinacion " + repr(cells[0]) + " esta repetida")
+            column = np.zeros(len(caseNames))
+            try :
+                column[columns[:len(cells) - 1]] = [float(cell) if cell else 0.0 for cell in cells[1:]]
+            except ValueError :
+                error(reader.line_num, "se esperaban factores numericos")
+            names.append(cells[0])
+            factors.append(column)
+
+    if not names :
+        raise ValueError(tableFileName + ": la tabla no tiene combinaciones")
+
+    return {"Names"   : names,
+            "Factors" : np.array(factors).T}
+
+# Funcion CaseMatrix
+#   Resultados de los casos como una matriz (casos x renglones) con un
+#   renglon por GDL (desplazamientos), por GDL conocido (reacciones) y por
+#   barra y extremo (N1, N2, V1, V2, M1, M2 de BarEndForces, que son
+#   lineales en qe), para combinar todo con un solo producto F^T A. Los
+#   renglones de una combinacion quedan contiguos en memoria
+def CaseMatrix(model, results) :
+
+    caseCount = results["qe"].shape[2]
+    endForces = io.BarEndForces(dict(model, Arrays=dict(model["Arrays"], qe=results["qe"])), slice(None))
+    ends = np.stack(endForces["Axial"] + endForces["Shear"] + endForces["Moment"], axis=1)
+
+    return np.ascontiguousarray(np.concatenate((results["Du"], results["Dk"], results["R"],
+                                                ends.reshape(-1, caseCount))).T)
+
+# Desplazamientos (GDL), reacciones (GDL conocidos) y fuerzas en los
+# extremos (barras x 6) de un renglon de CaseMatrix
+def _Split(values, dofData) :
+
+    dofCount = dofData["DOFCount"]
+    reactionCount = dofCount - dofData["UnknownDOFCount"]
+
+    return (values[:dofCount],
+            values[dofCount:dofCount + reactionCount],
+            values[dofCount + reactionCount:].reshape(-1, 6))
+
+def _JoinBlocks(function, *args) :
+    return "".join(function(*args))
+
+# Bloques de una combinacion (o envolvente) al escritor como el caso case
+def _SubmitCombination(writer, model, dofData, values, case) :
+
+    # + 0.0 para no escribir -0.0 en los GDL restringidos y en los
+    # momentos de las TRUSS con factores negativos
+    disp, R, ends = _Split(values + 0.0, dofData)
+    endForces = {"Axial"  : (ends[:,0], ends[:,1]),
+                 "Shear"  : (ends[:,2], ends[:,3]),
+                 "Moment" : (ends[:,4], ends[:,5])}
+
+    writer.Submit(("Displacements", case), io.FormatDisplacementsBlock, model, disp[:,None], dofData, 0, case + 1)
+    writer.Submit(("Reactions", case), io.FormatReactionsBlock, model, R[:,None], dofData, 0, case + 1)
+    writer.Submit(("BarForces", case), _JoinBlocks, io.FormatEndForcesBlocks, model["Arrays"]["BarIDs"], endForces, case + 1)
+
+    return
+
+# Funcion CombineAndEnvelope
+#
+#   Entradas:
+#       model       Modelo (nodos y barras)
+#       results     Resultados de los casos (IOFiles.LoadCaseResults)
+#       table       Salida de ReadCombinationTable
+#       selected    Indices de las combinaciones a escribir, en orden
+#       writer      IOFiles.ResultsWriter (None: solo envolventes); la
+#                   combinacion selected[i] se escribe como el paso i + 1 y
+#                   las envolventes maxima y minima como los dos siguientes
+#       block       Combinaciones por bloque
+#
+#   Salidas:
+#       envelope    {"Displacements" : por GDL,
+#                    "Reactions"     : por GDL conocido,
+#                    "EndForces"     : por barra y extremo (m x 6: N1, N2,
+#                                      V1, V2, M1, M2)},
+#                   cada uno {"Max", "MaxCombination", "Min",
+#                   "MinCombination"}
+def CombineAndEnvelope(model, results, table, selected, writer=None, block=COMBINATION_BLOCK) :
+
+    factors = table["Factors"]
+    dofData = results["DOFData"]
+    steps = dict(zip(selected, range(len(selected))))
+
+    matrix = CaseMatrix(model, results)
+    rowCount = matrix.shape[1]
+    maxValues = np.full(rowCount, -np.inf)
+    minValues = np.full(rowCount, np.inf)
+    maxCombination = np.zeros(rowCount, dtype=np.int64)
+    minCombination = np.zeros(rowCount, dtype=np.int64)
+
+    for first in range(0, factors.shape[1], block) :
+
+        # Todas las combinaciones del bloque (c x renglones)
+        values = factors[:, first:first + block].T @ matrix
+
+        # Envolventes: la combinacion se busca solo en los renglones en los
+        # que el bloque supera a los anteriores
+        for bounds, combinations, reduce, pick, better in [(maxValues, maxCombination, np.max, np.argmax, np.greater),
+                                                           (minValues, minCombination, np.min, np.argmin, np.less)] :
+            blockBounds = reduce(values, axis=0)
+            rows = np.flatnonzero(better(blockBounds, bounds))
+            bounds[rows] = blockBounds[rows]
+            combinations[rows] = first + pick(values[:, rows], axis=0)
+
+        # Al escritor (Submit espera si el escritor va atrasado)
+        if writer is not None :
+            for offset in range(values.shape[0]) :
+                case = steps.get(first + offset)
+                if case is not None :
+                    _SubmitCombination(writer, model, dofData, values[offset], case)
+
+    if writer is not None :
+        _SubmitCombination(writer, model, dofData, maxValues, len(selected))
+        _SubmitCombination(writer, model, dofData, minValues, len(selected) + 1)
+
+    envelope = {"Displacements" : {},
+                "Reactions"     : {},
+                "EndForces"     : {}}
+    for bound, values in [("Max", maxValues), ("MaxCombination", maxCombination),
+                          ("Min", minValues), ("MinCombination", minCombination)] :
+        for key, part in zip(["Displacements", "Reactions", "EndForces"], _Split(values, dofData)) :
+            envelope[key][bound] = part
+
+    return envelope
+
+# Funcion ExportEnvelopeTable
+#   Tabla CSV de envolventes, un renglon por nodo o barra y resultado:
+#   desplazamientos UX, UY, RZ de todos los nodos, reacciones RX, RY, MZ de
+#   los GDL restringidos y N1, N2 (y V1, V2, M1, M2 en las FRAME) de las
+#   barras, con el maximo, el minimo y la combinacion de cada uno
+def ExportEnvelopeTable(envelopeFileName, model, dofData, envelope, names) :
+
+    arrays = model["Arrays"]
+    dofArray = dofData["DOFArray"]
+    dofU = dofData["UnknownDOFCount"]
+    nodeNumbers = arrays["NodeNumbers"]
+    barIDs = arrays["BarIDs"]
+    frame = arrays["TypeCode"] == md.TYPE_FRAME
+    quoted = np.array(['"' + name.replace('"', '""') + '"' for name in names], dtype=object)
+
+    def rows(kind, IDs, result, bounds, index) :
+        return io.FormatRows(kind + ",%d," + result + ",%r,%s,%r,%s\n",
+                             [IDs, bounds["Max"][index], quoted[bounds["MaxCombination"][index]],
+                              bounds["Min"][index], quoted[bounds["MinCombination"][index]]])
+
+    with open(envelopeFileName, "w") as envelopeFile :
+        envelopeFile.write("Kind,ID,Result,Max,MaxCombination,Min,MinCombination\n")
+
+        for direction, result in enumerate(["UX", "UY", "RZ"]) :
+            envelopeFile.write(rows("Node", nodeNumbers, result, envelope["Displacements"], dofArray[:,direction]))
+
+        for direction, result in enumerate(["RX", "RY", "MZ"]) :
+            known = dofArray[:,direction] >= dofU
+            envelopeFile.write(rows("Node", nodeNumbers[known], result, envelope["Reactions"], dofArray[known,direction] - dofU))
+
+        for end, result in enumerate(["N1", "N2", "V1", "V2", "M1", "M2"]) :
+            barRows = np.arange(barIDs.shape[0]) if end < 2 else np.flatnonzero(frame)
+            envelopeFile.write(rows("Bar", barIDs[barRows], result, envelope["EndForces"], (barRows, end)))
+
+    return
+
+# Funcion SolveCases
+#   Resuelve todos los casos de carga del modelo en memoria (las mismas
+#   etapas que main.py, sin escribir resultados)
+#
+#   Entradas:
+#       model       Diccionario del modelo (IOFiles.ReadModel)
+#
+#   Salidas:
+#       dofData     Numeracion de los GDL
+#       D, R        Desplazamientos {"Du","Dk"} y reacciones; las fuerzas en
+#                   los extremos de las barras quedan en model["Arrays"]["qe"]
+def SolveCases(model) :
+
+    import Routines as rt
+    import Solver as sl
+
+    dofData = model["Cache"]["DOFData"]
+    if dofData is None :
+        dofData = rt.GenerateDOF(model)
+        io.SaveCache(model, dofData)
+
+    rt.GenerateElementsDOF(model,dofData)
+    rt.GenerateElementMatrices(model,dofData)
+    rt.GenerateElementFixedEndForces(model)
+    K = sl.AssembleStiffnessMatrix(model,dofData)
+    QF = sl.AssebembleElementForcesVector(model,dofData)
+    Q = sl.AssembleForceVector(model,dofData)
+    Dk = np.zeros((dofData["DOFCount"] - dofData["UnknownDOFCount"], len(model["LoadCases"])))
+    D = {"Du" : sl.SolveDisplacements(K,QF,Q,Dk),
+         "Dk" : Dk}
+    R = sl.SolveReactions(K,QF,Q,D)
+    sl.SolveElementForces(model,D)
+
+    return dofData, D, R
+
+# Corrida completa sobre un documento (ver arriba)
+def RunCombinations(fileName, tableFileName, selectedNames=None, block=COMBINATION_BLOCK) :
+
+    monitor = ins.PipelineMonitor()
+    log = ins.LogFile(fileName + ".combinations.log", True)
+    writer = None
+
+    try :
+        with monitor.Stage("Lectura") :
+            model = io.ReadModel(fileName + ".dat")
+
+        # Resultados de los casos: guardados o resueltos en memoria
+        with monitor.Stage("Resultados por caso") as stage :
+            resultsCacheFileName = io.ResultsCacheFileName(fileName + ".dat")
+            results = io.LoadCaseResults(resultsCacheFileName, model["Cache"]["Hash"])
+            stage["Origen"] = "guardados"
+            if results is None :
+                log.Write("No hay resultados guardados de " + fileName + ".dat (o el .dat cambio): se resuelven los casos\n\n")
+                dofData, D, R = SolveCases(model)
+                io.SaveCaseResults(resultsCacheFileName, model, dofData, D, R)
+                results = {"CaseNames" : [loadCase["Name"] for loadCase in model["LoadCases"]],
+                           "Du"        : D["Du"],
+                           "Dk"        : D["Dk"],
+                           "R"         : R,
+                           "qe"        : model["Arrays"]["qe"],
+                           "DOFData"   : {key : dofData[key] for key in io.RESULTS_DOF_KEYS + io.RESULTS_DOF_VALUES}}
+                stage["Origen"] = "calculados (sin resultados guardados)"
+            stage["Casos"] = len(results["CaseNames"])
+
+        table = ReadCombinationTable(tableFileName, results["CaseNames"])
+        names = table["Names"]
+        if selectedNames is None :
+            selected = list(range(len(names)))
+        else :
+            for name in selectedNames :
+                if name not in names :
+                    raise ValueError("La combinacion " + repr(name) + " no esta en " + tableFileName)
+            selected = sorted(set(names.index(name) for name in selectedNames))
+
+        with monitor.Stage("Combinaciones") as stage :
+            outputModel = dict(model, LoadCases=[{"Name" : names[combination]} for combination in selected] +
+                                                [{"Name" : name} for name in ENVELOPE_NAMES])
+            writer = io.ResultsWriter(fileName + ".combinations.post.res", outputModel, queueSize=3 * block)
+            envelope = CombineAndEnvelope(model, results, table, selected, writer, block)
+            stage["Combinaciones"] = len(names)
+            stage["Escritas"] = len(selected)
+            stage["Bloque"] = block
+
+        with monitor.Stage("Escritura de resultados") :
+            ExportEnvelopeTable(fileName + ".envelope.csv", model, results["DOFData"], envelope, names)
+            error = writer.Close()
+            writer = None
+            if error is not None :
+                raise RuntimeError("No se pudo escribir " + fileName + ".combinations.post.res\n" + error)
+
+        message = "Combinaciones de " + str(len(results["CaseNames"])) + " casos de carga\n"
+        for name in ["Resultados por caso", "Combinaciones"] :
+            message = message + name + "\n" + monitor.StageMessage(name) + "\n"
+        moments = envelope["EndForces"]
+        barIDs = model["Arrays"]["BarIDs"]
+        for bound, pick in [("Max", np.argmax), ("Min", np.argmin)] :
+            bar, end = np.unravel_index(pick(moments[bound][:,4:]), (barIDs.shape[0], 2))
+            message = message + "M %s %.4g kN-m en la barra %d, extremo %d (%s)\n" % (bound.lower(), moments[bound][bar,4 + end], barIDs[bar],
+                                                                                     end + 1, names[moments[bound + "Combination"][bar,4 + end]])
+        message = message + "\n" + monitor.SummaryMessage()
+        log.Write(message)
+    except Exception :
+        import traceback
+        if writer is not None :
+            writer.Close()
+        log.Write("ERROR\n" + traceback.format_exc())
+        raise
+    finally :
+        log.Close()
+
+    return table, envelope
+
+if __name__ == "__main__" :
+
+    arguments = sys.argv[1:]
+    options = {"select" : [], "block" : []}
+    positional = []
+    name = None
+    for argument in arguments :
+        if argument.startswith("--") and argument[2:] in options :
+            name = argument[2:]
+        elif name is not None :
+            options[name].append(argument)
+        else :
+            positional.append(argument)
+
+    if len(positional) < 2 :
+        print("Uso: python Combinations.py documento tabla.csv [--select nombre ...] [--block n]")
+        sys.exit(1)
+
+    RunCombinations(positional[0], positional[1],
+                    options["select"] if "--select" in arguments else None,
+                    int(options["block"][0]) if options["block"] else COMBINATION_BLOCK)
@@ -0,0 +1,234 @@
+import json
+import os
+import socket
+import sys
+import tempfile
+
+# Servicio local de solucion (Unix socket)
+#
+#   Cada corrida desde GiD arranca un proceso nuevo que carga Python y NumPy
+#   antes de leer el modelo; en modelos chicos eso es casi todo el tiempo.
+#   Este servicio mantiene un proceso caliente que corre main.RunModel para
+#   cada modelo que se le pide y responde cuando el .post.res ya esta
+#   escrito.
+#
+#       python Daemon.py start [--socket ruta]     Inicia el servicio
+#       python Daemon.py stop  [--socket ruta]     Detiene el servicio
+#       python Daemon.py status [--socket ruta]    Indica si esta corriendo
+#       python Daemon.py run documento [--socket ruta]
+#           Pide al servicio que corra documento (ruta sin .dat, como la
+#           manda GiD). Codigo de salida 0 si el modelo se resolvio, 1 si
+#           fallo (el error queda en el .log y en stderr) y 3 si el servicio
+#           no esta disponible, para que Taller.unix.bat corra el ejecutable
+#           de una sola vez
+#
+#   El cliente espera CONNECT_TIMEOUT segundos a conectarse (si no, codigo
+#   3) y TALLER_TIMEOUT segundos (RUN_TIMEOUT por omision) a la respuesta.
+#   Si la respuesta no llega el codigo es 1 y no 3: el servicio puede estar
+#   ocupado con otra peticion y correr el modelo despues, y no debe
+#   escribir los mismos archivos que el ejecutable de una sola vez.
+#
+#   Cada modelo se corre en modo incremental (Reanalysis.py): si solo
+#   cambiaron las cargas o pocas barras desde la corrida anterior del mismo
+#   .dat, se reutiliza la factorizacion de K11 guardada en el servicio.
+#
+#   El cliente solo usa la biblioteca estandar: NumPy y el pipeline se
+#   importan unicamente en el proceso del servicio. Los cambios al codigo
+#   requieren reiniciar el servicio.
+#
+#   Protocolo: un renglon JSON por peticion y uno por respuesta
+#       {"Command" : "run", "Model" : ruta}  ->  {"Status" : "OK", ...}
+#       {"Command" : "ping"}                 ->  {"Status" : "OK", "PID" : n}
+#       {"Command" : "stop"}                 ->  {"Status" : "OK"}
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_UNAVAILABLE = 3
+
+# Segundos para conectarse y para esperar la respuesta de una peticion
+CONNECT_TIMEOUT = 2.0
+RUN_TIMEOUT = 3600.0
+
+# Ruta del socket: variable de ambiente TALLER_SOCKET o un archivo por
+# usuario en el directorio temporal
+def SocketPath() :
+
+    path = os.environ.get("TALLER_SOCKET")
+    if path :
+        return path
+
+    user = str(os.getuid()) if hasattr(os, "getuid") else os.environ.get("USERNAME", "")
+    return os.path.join(tempfile.gettempdir(), "taller-gid-" + user + ".sock")
+
+# Segundos para esperar la respuesta: variable de ambiente TALLER_TIMEOUT o
+# RUN_TIMEOUT
+def RequestTimeout() :
+
+    timeout = os.environ.get("TALLER_TIMEOUT")
+    return float(timeout) if timeout else RUN_TIMEOUT
+
+# Enviar una peticion y esperar la respuesta
+#
+#   Lanza ConnectionError si el servicio no esta corriendo o no acepta la
+#   conexion en CONNECT_TIMEOUT segundos, y socket.timeout si la respuesta
+#   no llega en timeout segundos (RequestTimeout por omision)
+def Request(request, socketPath=None, timeout=None) :
+
+    if not hasattr(socket, "AF_UNIX") :
+        raise ConnectionError("Este sistema no tiene Unix sockets")
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try :
+        client.settimeout(CONNECT_TIMEOUT)
+        try :
+            client.connect(socketPath or SocketPath())
+        except (FileNotFoundError, ConnectionRefusedError) as error :
+            raise ConnectionError("El servicio no esta corriendo: " + str(error))
+        except (socket.timeout, BlockingIOError) :
+            # Con timeout, un Unix socket con la cola llena falla de inmediato
+            raise ConnectionError("El servicio no acepto la conexion en " + str(CONNECT_TIMEOUT) + " s")
+
+        client.settimeout(RequestTimeout() if timeout is None else timeout)
+        client.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with client.makefile("r", encoding="utf-8") as stream :
+            line = stream.readline()
+    finally :
+        client.close()
+
+    if not line :
+        raise ConnectionError("El servicio cerro la conexion sin responder")
+
+    return json.loads(line)
+
+# Correr un documento en el servicio (ver codigos de salida arriba)
+def RunRemote(fileName, socketPath=None) :
+
+    try :
+        response = Request({"Command" : "run", "Model" : os.path.abspath(fileName)}, socketPath)
+    except ConnectionError :
+        return EXIT_UNAVAILABLE
+    except socket.timeout :
+        sys.stderr.write("El servicio no respondio en " + str(RequestTimeout()) + " s (TALLER_TIMEOUT)\n")
+        return EXIT_FAILED
+
+    if response["Status"] != "OK" :
+        sys.stderr.write(response.get("Error", "Error desconocido") + "\n")
+        return EXIT_FAILED
+
+    return EXIT_OK
+
+# Funcion Serve
+#   Atiende peticiones, una a la vez, hasta recibir "stop"
+def Serve(socketPath=None) :
+
+    import socketserver
+    import traceback
+
+    import main
+
+    # NumPy y el pipeline se cargan una sola vez
+    main.LoadPipeline()
+
+    # Los modulos de SciPy se importan al primer uso dentro del pipeline;
+    # se cargan aqui para que la primera peticion no pague ese costo
+    try :
+        import scipy.linalg
+        import scipy.sparse.csgraph
+        import scipy.sparse.linalg
+    except ImportError :
+        pass
+
+    socketPath = socketPath or SocketPath()
+
+    # Un socket viejo de un servicio que ya no corre se puede reemplazar
+    if os.path.exists(socketPath) :
+        try :
+            Request({"Command" : "ping"}, socketPath, CONNECT_TIMEOUT)
+            raise RuntimeError("Ya hay un servicio corriendo en " + socketPath)
+        except socket.timeout :
+            raise RuntimeError("Ya hay un servicio corriendo (ocupado) en " + socketPath)
+        except ConnectionError :
+            os.remove(socketPath)
+
+    class Handler(socketserver.StreamRequestHandler) :
+
+        def handle(self) :
+
+            line = self.rfile.readline().decode("utf-8")
+            if not line :
+                return
+            request = json.loads(line)
+            command = request.get("Command")
+
+            response = {"Status" : "OK"}
+            if command == "run" :
+                try :
+                    summary = main.RunModel(request["Model"], incremental=True)
+                    response["WallTime"] = summary["WallTime"]
+                    response["Reanalysis"] = summary["Reanalysis"]["Path"]
+                except Exception :
+                    response = {"Status" : "ERROR",
+                                "Error"  : traceback.format_exc()}
+            elif command == "ping" :
+                response["PID"] = os.getpid()
+            elif command == "stop" :
+                self.server.stopping = True
+            else :
+                response = {"Status" : "ERROR",
+                            "Error"  : "Comando desconocido: " + str(command)}
+
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+    # El socket se crea ya con permisos 0600 (solo el usuario): con chmod
+    # despues de bind quedaba un momento en que otro usuario podia conectarse
+    umask = os.umask(0o177)
+    try :
+        server = socketserver.UnixStreamServer(socketPath, Handler)
+    finally :
+        os.umask(umask)
+    server.stopping = False
+    print("Servicio en " + socketPath + " (PID " + str(os.getpid()) + ")")
+    sys.stdout.flush()
+
+    try :
+        while not server.stopping :
+            server.handle_request()
+    finally :
+        server.server_close()
+        if os.path.exists(socketPath) :
+            os.remove(socketPath)
+
+    return
+
+if __name__ == "__main__" :
+
+    arguments = sys.argv[1:]
+    socketPath = None
+    if "--socket" in arguments :
+        position = arguments.index("--socket")
+        socketPath = arguments[position + 1]
+        del arguments[position:position + 2]
+
+    command = arguments[0] if arguments else ""
+
+    if command == "start" :
+        Serve(socketPath)
+
+    elif command == "run" and len(arguments) > 1 :
+        sys.exit(RunRemote(arguments[1], socketPath))
+
+    elif command in ["stop", "status"] :
+        try :
+            response = Request({"Command" : "stop" if command == "stop" else "ping"}, socketPath)
+        except ConnectionError as error :
+            print(error)
+            sys.exit(EXIT_UNAVAILABLE)
+        except socket.timeout :
+            print("El servicio no respondio en " + str(RequestTimeout()) + " s")
+            sys.exit(EXIT_FAILED)
+        print("Servicio detenido" if command == "stop" else "Servicio corriendo (PID " + str(response["PID"]) + ")")
+
+    else :
+        print("Uso: python Daemon.py start|stop|status [--socket ruta]")
+        print("     python Daemon.py run documento [--socket ruta]")
+        sys.exit(1)
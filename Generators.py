@@ -0,0 +1,275 @@
+import numpy as np
+import ModelData as md
+
+# Generadores de modelos sinteticos
+#
+#   Cada generador regresa el diccionario del modelo (ver ModelData) listo
+#   para usarse en el pipeline o para escribirse con IOFiles.WriteDataFile.
+#   Unidades como en el archivo .dat: m, kN, GPa, mm2, E06 mm4.
+
+# Materiales y secciones comunes a todos los generadores
+def _Tables() :
+
+    return {"MaterialIDs"   : np.array([1], dtype=np.int64),
+            "MaterialNames" : ["STEEL_A992"],
+            "E"             : np.array([200.0]),
+            "nu"            : np.array([0.3]),
+            "Density"       : np.array([7850.0]),
+            "PropertyIDs"   : np.array([1, 2, 3], dtype=np.int64),
+            "PropertyNames" : ["COLUMN", "BEAM", "BRACE"],
+            "A"             : np.array([12000.0, 9000.0, 2500.0]),
+            "I"             : np.array([400.0, 600.0, 25.0])}
+
+# Funcion _Shuffle
+#   Revuelve el orden de los renglones de nodos y de barras (como llegan
+#   algunas mallas de GiD) y renumera nodos y barras de 1 en adelante en el
+#   nuevo orden del archivo, de modo que la numeracion natural de GDL ya no
+#   sigue la geometria de la malla
+#
+#   Entradas:
+#       arrays          Arreglos del modelo en el orden de la malla, con
+#                       nodos y barras numerados 1..n
+#       caseArrays      Arreglos de los casos de carga
+#       seed            Semilla del orden aleatorio
+#
+#   Salidas:
+#       arrays, caseArrays con los renglones permutados y renumerados
+def _Shuffle(arrays, caseArrays, seed) :
+
+    rng = np.random.default_rng(seed)
+    nodeCount = arrays["NodeNumbers"].shape[0]
+    barCount = arrays["BarIDs"].shape[0]
+
+    # nodeOrder[k] = renglon de la malla que queda en el renglon k del archivo;
+    # newNode[numero anterior - 1] = numero nuevo
+    nodeOrder = rng.permutation(nodeCount)
+    newNode = np.empty(nodeCount, dtype=np.int64)
+    newNode[nodeOrder] = np.arange(1, nodeCount + 1)
+
+    barOrder = rng.permutation(barCount)
+    newBar = np.empty(barCount, dtype=np.int64)
+    newBar[barOrder] = np.arange(1, barCount + 1)
+
+    arrays = dict(arrays)
+    arrays.update({"NodeNumbers"     : np.arange(1, nodeCount + 1, dtype=np.int64),
+                   "Coords"          : arrays["Coords"][nodeOrder],
+                   "BarIDs"          : np.arange(1, barCount + 1, dtype=np.int64),
+                   "BarNodes"        : newNode[arrays["BarNodes"][barOrder] - 1],
+                   "BarTypes"        : arrays["BarTypes"][barOrder],
+                   "BarPropertyIDs"  : arrays["BarPropertyIDs"][barOrder],
+                   "BarMaterialIDs"  : arrays["BarMaterialIDs"][barOrder],
+                   "RestrictedNodes" : newNode[arrays["RestrictedNodes"] - 1]})
+
+    caseArrays = [dict(case, NodeID=newNode[case["NodeID"] - 1], BarID=newBar[case["BarID"] - 1])
+                  for case in caseArrays]
+
+    return arrays, caseArrays
+
+# Funcion GridFrame
+#   Marco de varios niveles y crujias, columnas empotradas en la base,
+#   carga lateral en cada nivel y carga uniforme en todas las vigas
+#
+#   Entradas:
+#       bays, storeys   Numero de crujias y de niveles
+#       bayWidth        Ancho de crujia (m)
+#       storeyHeight    Altura de entrepiso (m)
+#       shuffle         Escribir nodos y barras en orden aleatorio (como
+#                       llegan algunas mallas de GiD), ver _Shuffle
+#       seed            Semilla del orden aleatorio
+#
+#   Salidas:
+#       model           Diccionario del modelo
+def GridFrame(bays, storeys, bayWidth=6.0, storeyHeight=3.5, shuffle=False, seed=0) :
+
+    columns = bays + 1
+    nodeCount = columns * (storeys + 1)
+
+    # Nodo (i, j) -> renglon j * columns + i
+    i, j = np.meshgrid(np.arange(columns), np.arange(storeys + 1))
+    coords = np.stack((i.ravel() * bayWidth, j.ravel() * storeyHeight), axis=1)
+
+    nodeNumbers = np.arange(1, nodeCount + 1, dtype=np.int64)
+
+    rows = np.arange(nodeCount).reshape(storeys + 1, columns)
+    columnBars = np.stack((rows[:-1,:].ravel(), rows[1:,:].ravel()), axis=1)
+    beamBars = np.stack((rows[1:,:-1].ravel(), rows[1:,1:].ravel()), axis=1)
+
+    barNodes = nodeNumbers[np.concatenate((columnBars, beamBars))]
+    barCount = barNodes.shape[0]
+    isBeam = np.arange(barCount) >= columnBars.shape[0]
+
+    arrays = _Tables()
+    arrays.update({"NodeNumbers"      : nodeNumbers,
+                   "Coords"           : coords,
+                   "BarIDs"           : np.arange(1, barCount + 1, dtype=np.int64),
+                   "BarNodes"         : barNodes,
+                   "BarTypes"         : np.full(barCount, "FRAME"),
+                   "BarPropertyIDs"   : np.where(isBeam, 2, 1).astype(np.int64),
+                   "BarMaterialIDs"   : np.ones(barCount, dtype=np.int64),
+                   "RestrictedNodes"  : nodeNumbers[rows[0,:]],
+                   "RestrictionFlags" : np.ones((columns,3), dtype=np.int8)})
+
+    # Carga lateral en el nodo izquierdo de cada nivel y
+    # carga uniforme en toda la longitud de las vigas (a = b = 0)
+    loadedNodes = nodeNumbers[rows[1:,0]]
+    beamIDs = arrays["BarIDs"][isBeam]
+    caseArrays = [{"Name"        : "Base",
+                   "NodeID"      : loadedNodes,
+                   "NodalForces" : np.tile([10.0, 0.0, 0.0], (loadedNodes.shape[0],1)),
+                   "BarID"       : beamIDs,
+                   "BarLoads"    : np.tile([0.0, -15.0, 0.0, -15.0], (beamIDs.shape[0],1))}]
+
+    if shuffle :
+        arrays, caseArrays = _Shuffle(arrays, caseArrays, seed)
+
+    return md.ModelFromArrays(arrays, caseArrays)
+
+# Funcion LongTruss
+#   Armadura Pratt continua de cuerdas paralelas, apoyo fijo en el primer
+#   nodo y deslizantes cada spanPanels tableros, carga vertical en los
+#   nodos de la cuerda inferior
+#
+#   Todas las barras son TRUSS, por lo que los giros de todos los nodos se
+#   restringen (como se hace en GiD para armaduras)
+#
+#   Entradas:
+#       panels          Numero de tableros
+#       panelLength     Longitud de tablero (m)
+#       height          Peralte de la armadura (m)
+#       spanPanels      Tableros por claro entre apoyos
+#       shuffle         Escribir nodos y barras en orden aleatorio
+#       seed            Semilla del orden aleatorio
+#
+#   Salidas:
+#       model           Diccionario del modelo
+def LongTruss(panels, panelLength=4.0, height=3.0, spanPanels=20, shuffle=False, seed=0) :
+
+    columns = panels + 1
+    nodeCount = 2 * columns
+
+    # Nodo inferior i -> renglon i, nodo superior i -> renglon columns + i
+    x = np.arange(columns) * panelLength
+    coords = np.concatenate((np.stack((x, np.zeros(columns)), axis=1),
+                             np.stack((x, np.full(columns, height)), axis=1)))
+
+    nodeNumbers = np.arange(1, nodeCount + 1, dtype=np.int64)
+
+    bottom = np.arange(columns)
+    top = columns + bottom
+
+    # Diagonales Pratt: bajan hacia el centro de cada claro
+    left = (bottom[:-1] % spanPanels) < spanPanels // 2
+    diagonals = np.stack((np.where(left, top[:-1], bottom[:-1]),
+                          np.where(left, bottom[1:], top[1:])), axis=1)
+
+    chordBars = np.concatenate((np.stack((bottom[:-1], bottom[1:]), axis=1),
+                                np.stack((top[:-1], top[1:]), axis=1)))
+    verticalBars = np.stack((bottom, top), axis=1)
+    barRows = np.concatenate((chordBars, verticalBars, diagonals))
+
+    barNodes = nodeNumbers[barRows]
+    barCount = barNodes.shape[0]
+    propertyIDs = np.concatenate((np.full(chordBars.shape[0], 1), np.full(barCount - chordBars.shape[0], 3)))
+
+    # Giros restringidos en todos los nodos; apoyo fijo y deslizantes
+    flags = np.zeros((nodeCount,3), dtype=np.int8)
+    flags[:,2] = 1
+    flags[bottom[::spanPanels],1] = 1
+    flags[bottom[-1],1] = 1
+    flags[bottom[0],0] = 1
+
+    arrays = _Tables()
+    arrays.update({"NodeNumbers"      : nodeNumbers,
+                   "Coords"           : coords,
+                   "BarIDs"           : np.arange(1, barCount + 1, dtype=np.int64),
+                   "BarNodes"         : barNodes,
+                   "BarTypes"         : np.full(barCount, "TRUSS"),
+                   "BarPropertyIDs"   : propertyIDs.astype(np.int64),
+                   "BarMaterialIDs"   : np.ones(barCount, dtype=np.int64),
+                   "RestrictedNodes"  : nodeNumbers,
+                   "RestrictionFlags" : flags})
+
+    loadedNodes = nodeNumbers[bottom[flags[bottom,1] == 0]]
+    caseArrays = [{"Name"        : "Base",
+                   "NodeID"      : loadedNodes,
+                   "NodalForces" : np.tile([0.0, -50.0, 0.0], (loadedNodes.shape[0],1)),
+                   "BarID"       : np.zeros(0, dtype=np.int64),
+                   "BarLoads"    : np.zeros((0,4))}]
+
+    if shuffle :
+        arrays, caseArrays = _Shuffle(arrays, caseArrays, seed)
+
+    return md.ModelFromArrays(arrays, caseArrays)
+
+# Funcion BracedFrame
+#   Marco de GridFrame con contraventeo en X (barras TRUSS) en una fraccion
+#   de los tableros elegidos al azar
+#
+#   Entradas:
+#       bays, storeys   Numero de crujias y de niveles
+#       fraction        Fraccion de tableros contraventeados (0 a 1)
+#       shuffle         Escribir nodos y barras en orden aleatorio
+#       seed            Semilla de la seleccion de tableros y del orden
+#
+#   Salidas:
+#       model           Diccionario del modelo
+def BracedFrame(bays, storeys, fraction=0.3, bayWidth=6.0, storeyHeight=3.5, shuffle=False, seed=0) :
+
+    frame = GridFrame(bays, storeys, bayWidth, storeyHeight)
+    arrays = dict(frame["Arrays"])
+
+    columns = bays + 1
+    rows = np.arange(columns * (storeys + 1)).reshape(storeys + 1, columns)
+    braced = np.random.default_rng(seed + 1).random((storeys, bays)) < fraction
+
+    # Tablero (j, i): esquinas inferiores rows[j,i], rows[j,i+1]
+    # y superiores rows[j+1,i], rows[j+1,i+1]
+    j, i = np.nonzero(braced)
+    braces = np.concatenate((np.stack((rows[j,i], rows[j+1,i+1]), axis=1),
+                             np.stack((rows[j,i+1], rows[j+1,i]), axis=1)))
+
+    nodeNumbers = arrays["NodeNumbers"]
+    braceCount = braces.shape[0]
+    frameCount = arrays["BarIDs"].shape[0]
+
+    arrays.update({"BarIDs"         : np.arange(1, frameCount + braceCount + 1, dtype=np.int64),
+                   "BarNodes"       : np.concatenate((nodeNumbers[arrays["Connectivity"]], nodeNumbers[braces])),
+                   "BarTypes"       : np.concatenate((np.full(frameCount, "FRAME"), np.full(braceCount, "TRUSS"))),
+                   "BarPropertyIDs" : np.concatenate((arrays["PropertyIDs"][arrays["PropertyRow"]], np.full(braceCount, 3))).astype(np.int64),
+                   "BarMaterialIDs" : np.ones(frameCount + braceCount, dtype=np.int64)})
+
+    loadCase = frame["LoadCases"][0]
+    caseArrays = [dict(loadCase["Arrays"], Name=loadCase["Name"])]
+
+    if shuffle :
+        arrays, caseArrays = _Shuffle(arrays, caseArrays, seed)
+
+    return md.ModelFromArrays(arrays, caseArrays)
+
+GENERATORS = ["frame", "truss", "braced"]
+
+# Funcion ModelForDOFs
+#   Modelo del generador kind con aproximadamente dofCount GDL
+#
+#   Entradas:
+#       kind            "frame", "truss" o "braced"
+#       dofCount        Numero de GDL deseado (3 por nodo)
+#
+#   Salidas:
+#       model           Diccionario del modelo
+def ModelForDOFs(kind, dofCount, shuffle=False, seed=0) :
+
+    nodeCount = max(4, dofCount // 3)
+
+    if kind == "frame" or kind == "braced" :
+        # (b + 1)^2 nodos en un marco cuadrado
+        bays = max(1, int(round(nodeCount ** 0.5)) - 1)
+        if kind == "frame" :
+            return GridFrame(bays, bays, shuffle=shuffle, seed=seed)
+        return BracedFrame(bays, bays, shuffle=shuffle, seed=seed)
+
+    if kind == "truss" :
+        # 2 (p + 1) nodos
+        return LongTruss(max(2, nodeCount // 2 - 1), shuffle=shuffle, seed=seed)
+
+    raise ValueError("Generador desconocido: " + str(kind) + " (opciones: " + ", ".join(GENERATORS) + ")")
@@ -1,4 +1,13 @@
 import numpy as np
+import ModelData as md
+import hashlib
+import io
+import mmap
+import os
+import queue
+import threading
+import traceback
+import zipfile
 
 # Funcion ReadDataFile
 #   Funcion que lee un archivo de texto la informacion del modelo
@@ -6,6 +15,8 @@ import numpy as np
 #
 #   Entradas:
 #       dataFileName    String, que inlcuye el nombre del documento a leer
+#       memoryMap       Leer el archivo mediante mmap en lugar de cargarlo
+#                       completo en memoria
 #
 #   Salidas:
 #       model           Diccionario con la informacion del modelo con los keys
@@ -16,8 +27,207 @@ import numpy as np
 #                       "Restrictions"
 #                       "NodalForces"
 #                       "BarForces"
+#                       "BarIndex"      Diccionarios ID -> posicion en "Bars",
+#                       "MaterialIndex" "Materials" y "Properties"
+#                       "PropertyIndex"
+#                       "Arrays"        Arreglos del modelo (ver ModelData)
+#                       "LoadCases"     Lista de casos de carga, cada uno con
+#                                       "Name", "NodalForces" y "BarForces".
+#                                       El primero ("Base") es el de las
+#                                       secciones "NodalForces"/"BarForces"
+#
+#   Casos de carga adicionales (opcionales, al final del archivo):
+#
+#       # Load Case
+#       # Name
+#       # CaseName
+#       LIVE
+#       <seccion de fuerzas nodales, mismo formato que la del caso base>
+#       <seccion de fuerzas en barras, mismo formato que la del caso base>
+
+def ReadDataFile(dataFileName, memoryMap=False) :
+
+    with open(dataFileName,"rb") as inputFile :
+
+        if memoryMap and os.fstat(inputFile.fileno()).st_size > 0 :
+            data = mmap.mmap(inputFile.fileno(), 0, access=mmap.ACCESS_READ)
+        else :
+            data = inputFile.read()
+
+        try :
+            reader = DataReader(dataFileName, data)
+
+            nodes        = reader.ReadSection(NODE_COLUMNS)
+            bars         = reader.ReadSection(BAR_COLUMNS)
+            materials    = reader.ReadSection(MATERIAL_COLUMNS)
+            properties   = reader.ReadSection(PROPERTY_COLUMNS)
+            restrictions = reader.ReadSection(RESTRICTION_COLUMNS)
+
+            # Caso de carga base
+            caseArrays = [reader.ReadLoadCase("Base")]
+
+            # Secciones opcionales al final del archivo
+            header = reader.NextHeader()
+            while header is not None :
+                if header.startswith("load case") :
+                    reader.SkipLines(2)
+                    name = reader.ReadName()
+                    caseArrays.append(reader.ReadLoadCase(name))
+                else :
+                    reader.Error("Seccion desconocida: " + header)
+                header = reader.NextHeader()
+        finally :
+            if isinstance(data, mmap.mmap) :
+                data.close()
+
+    arrays = {"NodeNumbers"      : nodes["Number"],
+              "Coords"           : np.stack((nodes["X"], nodes["Y"]), axis=1),
+              "BarIDs"           : bars["ID"],
+              "BarNodes"         : np.stack((bars["Node1"], bars["Node2"]), axis=1),
+              "BarTypes"         : bars["Type"],
+              "BarPropertyIDs"   : bars["PropertyID"],
+              "BarMaterialIDs"   : bars["MaterialID"],
+              "MaterialIDs"      : materials["ID"],
+              "MaterialNames"    : materials["Name"].tolist(),
+              "E"                : materials["E"],
+              "nu"               : materials["nu"],
+              "Density"          : materials["Density"],
+              "PropertyIDs"      : properties["ID"],
+              "PropertyNames"    : properties["Name"].tolist(),
+              "A"                : properties["A"],
+              "I"                : properties["I"],
+              "RestrictedNodes"  : restrictions["Node"],
+              "RestrictionFlags" : np.stack((restrictions["TX"], restrictions["TY"], restrictions["RZ"]), axis=1).astype(np.int8)}
+
+    # Diccionario con todo el modelo, guardado en arreglos
+    return md.ModelFromArrays(arrays, caseArrays)
+
+# Columnas de cada seccion del archivo .dat
+NODE_COLUMNS        = [("Number", np.int64), ("X", np.float64), ("Y", np.float64)]
+BAR_COLUMNS         = [("ID", np.int64), ("Node1", np.int64), ("Node2", np.int64), ("Type", "U16"),
+                       ("PropertyID", np.int64), ("MaterialID", np.int64)]
+MATERIAL_COLUMNS    = [("ID", np.int64), ("Name", "U256"), ("E", np.float64), ("nu", np.float64), ("Density", np.float64)]
+PROPERTY_COLUMNS    = [("ID", np.int64), ("Name", "U256"), ("A", np.float64), ("I", np.float64)]
+RESTRICTION_COLUMNS = [("Node", np.int64), ("TX", np.int64), ("TY", np.int64), ("RZ", np.int64)]
+NODAL_FORCE_COLUMNS = [("NodeID", np.int64), ("FX", np.float64), ("FY", np.float64), ("MZ", np.float64)]
+BAR_FORCE_COLUMNS   = [("BarID", np.int64), ("a", np.float64), ("wa", np.float64), ("b", np.float64), ("wb", np.float64)]
+
+# Lector por secciones del archivo .dat
+#
+#   Ubica todos los fines de renglon del archivo en una sola pasada y
+#   convierte cada seccion completa a arreglos con np.loadtxt. Los errores
+#   indican el numero de renglon del archivo.
+class DataReader :
+
+    def __init__(self, fileName, data) :
+
+        self.fileName = fileName
+        self.data = data
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        ends = np.flatnonzero(buffer == 10)
+        if buffer.shape[0] > 0 and buffer[-1] != 10 :
+            ends = np.append(ends, buffer.shape[0])
+        self.lineEnds = ends
+        self.line = 0
+
+    def Error(self, message, line=None) :
+        if line is None :
+            line = self.line
+        raise ValueError(self.fileName + ", renglon " + str(line + 1) + ": " + message)
+
+    # Texto del renglon (sin fin de renglon)
+    def Line(self, line) :
+        if line >= self.lineEnds.shape[0] :
+            self.Error("fin de archivo inesperado", line)
+        start = 0 if line == 0 else int(self.lineEnds[line - 1]) + 1
+        return bytes(self.data[start : int(self.lineEnds[line])]).decode().rstrip("\r")
+
+    def SkipLines(self, count) :
+        if self.line + count > self.lineEnds.shape[0] :
+            self.Error("fin de archivo inesperado", self.lineEnds.shape[0])
+        self.line += count
+
+    def ReadName(self) :
+        tokens = self.Line(self.line).split()
+        if len(tokens) == 0 :
+            self.Error("se esperaba un nombre")
+        self.line += 1
+        return tokens[0]
+
+    def ReadCount(self) :
+        tokens = self.Line(self.line).split()
+        try :
+            count = int(tokens[0])
+        except (IndexError, ValueError) :
+            self.Error("se esperaba el numero de renglones de la seccion")
+        if count < 0 :
+            self.Error("numero de renglones negativo")
+        self.line += 1
+        return count
+
+    # Primer renglon del siguiente encabezado opcional, sin "#" y en minusculas
+    # (None al final del archivo)
+    def NextHeader(self) :
+        while self.line < self.lineEnds.shape[0] :
+            header = self.Line(self.line).strip()
+            self.line += 1
+            if header != "" :
+                return header.lstrip("#").strip().lower()
+        return None
+
+    # Leer 3 lineas de info, el numero de renglones y los renglones
+    def ReadSection(self, columns) :
+
+        self.SkipLines(3)
+        count = self.ReadCount()
+        first = self.line
+        self.SkipLines(count)
+
+        dtype = np.dtype(columns)
+        if count == 0 :
+            return np.zeros(0, dtype=dtype)
+
+        start = 0 if first == 0 else int(self.lineEnds[first - 1]) + 1
+        end = int(self.lineEnds[first + count - 1])
+        text = bytes(self.data[start : end]).decode()
+
+        try :
+            return np.loadtxt(io.StringIO(text), dtype=dtype, comments=None, ndmin=1,
+                              usecols=range(len(columns)))
+        except ValueError :
+            self.FindBadRow(first, count, columns)
+            raise
+
+    # Buscar el renglon que no se puede convertir (solo si hubo error)
+    def FindBadRow(self, first, count, columns) :
+        for line in range(first, first + count) :
+            tokens = self.Line(line).split()
+            if len(tokens) < len(columns) :
+                self.Error("se esperaban " + str(len(columns)) + " columnas y hay " + str(len(tokens)), line)
+            for column in range(len(columns)) :
+                name, dtype = columns[column]
+                try :
+                    np.array(tokens[column]).astype(dtype)
+                except ValueError :
+                    self.Error("valor invalido en la columna " + name + ": " + tokens[column], line)
 
-def ReadDataFile(dataFileName) :
+    def ReadLoadCase(self, name) :
+
+        nodalForces = self.ReadSection(NODAL_FORCE_COLUMNS)
+        barForces = self.ReadSection(BAR_FORCE_COLUMNS)
+
+        return {"Name"        : name,
+                "NodeID"      : nodalForces["NodeID"],
+                "NodalForces" : np.stack((nodalForces["FX"], nodalForces["FY"], nodalForces["MZ"]), axis=1),
+                "BarID"       : barForces["BarID"],
+                "BarLoads"    : np.stack((barForces["a"], barForces["wa"], barForces["b"], barForces["wb"]), axis=1)}
+
+# Funcion ReadDataFileByLines
+#   Lector original, renglon por renglon con un diccionario por renglon.
+#   Regresa el mismo modelo que ReadDataFile; se conserva como referencia
+#   para comparar resultados y tiempos (ver Benchmark.py)
+
+def ReadDataFileByLines(dataFileName) :
 
     with open(dataFileName,"r") as inputFile:
 
@@ -109,52 +319,391 @@ def ReadDataFile(dataFileName) :
                            "RZ"    : int(aLine[3])}
             restrictions.append(restriction)
 
-        # Lectura de fuerzas nodales
-        nodalForces = []
+        # Caso de carga base
+        nodalForces = ReadNodalForces(inputFile)
+        barForces = ReadBarForces(inputFile)
+        loadCases = [{"Name"        : "Base",
+                      "NodalForces" : nodalForces,
+                      "BarForces"   : barForces}]
 
-        #Leer 3 lineas de info
-        for _ in range(0,3) :
-            spare = inputFile.readline()
+        # Secciones opcionales al final del archivo
+        for header in IterateSectionHeaders(inputFile) :
+            if header.startswith("load case") :
+                loadCases.append(ReadLoadCase(inputFile))
+            else :
+                raise ValueError("Seccion desconocida en " + dataFileName + ": " + header)
 
-        nodalForceCount = int(inputFile.readline().split()[0])
-        # NodeNumber    FX(kN)  FY(kN)  MZ(kN-m)
-        for _ in range(nodalForceCount) :
-            aLine = inputFile.readline().split()
-            nodalForce = {"NodeID" : int(aLine[0]),
-                          "FX"     : float(aLine[1]),
-                          "FY"     : float(aLine[2]),
-                          "MZ"     : float(aLine[3])}
-            nodalForces.append(nodalForce)
+        # Diccionario con todo el modelo, guardado en arreglos
+        model = md.ModelFromRecords(nodes, bars, materials, properties,
+                                    restrictions, loadCases)
 
-        # Lectura de fuerzas en barras
-        barForces = []
+    return model
 
-        #Leer 3 lineas de info
-        for _ in range(0,3) :
-            spare = inputFile.readline()
+# Lectura de una seccion de fuerzas nodales
+def ReadNodalForces(inputFile) :
 
-        barForceCount = int(inputFile.readline().split()[0])
-        # BarNumber a(m)    Fa(kN/m)    b(m)    Fb(kN/m)
-        for _ in range(barForceCount) :
-            aLine = inputFile.readline().split()
-            barForce = {"BarID"  : int(aLine[0]),
-                        "a"      : float(aLine[1]),
-                        "wa"     : float(aLine[2]),
-                        "b"      : float(aLine[3]),
-                        "wb"     : float(aLine[4])} 
-            barForces.append(barForce)  
-
-        # Diccionario con todo el modelo
-        model = {"Nodes"        : nodes,
-                 "Bars"         : bars,
-                 "Materials"    : materials,
-                 "Properties"   : properties,
-                 "Restrictions" : restrictions,
-                 "NodalForces"  : nodalForces,
-                 "BarForces"    : barForces}
+    nodalForces = []
+
+    #Leer 3 lineas de info
+    for _ in range(0,3) :
+        spare = inputFile.readline()
+
+    nodalForceCount = int(inputFile.readline().split()[0])
+    # NodeNumber    FX(kN)  FY(kN)  MZ(kN-m)
+    for _ in range(nodalForceCount) :
+        aLine = inputFile.readline().split()
+        nodalForce = {"NodeID" : int(aLine[0]),
+                      "FX"     : float(aLine[1]),
+                      "FY"     : float(aLine[2]),
+                      "MZ"     : float(aLine[3])}
+        nodalForces.append(nodalForce)
+
+    return nodalForces
+
+# Lectura de una seccion de fuerzas en barras
+def ReadBarForces(inputFile) :
+
+    barForces = []
+
+    #Leer 3 lineas de info
+    for _ in range(0,3) :
+        spare = inputFile.readline()
+
+    barForceCount = int(inputFile.readline().split()[0])
+    # BarNumber a(m)    Fa(kN/m)    b(m)    Fb(kN/m)
+    for _ in range(barForceCount) :
+        aLine = inputFile.readline().split()
+        barForce = {"BarID"  : int(aLine[0]),
+                    "a"      : float(aLine[1]),
+                    "wa"     : float(aLine[2]),
+                    "b"      : float(aLine[3]),
+                    "wb"     : float(aLine[4])} 
+        barForces.append(barForce)
+
+    return barForces
+
+# Lectura de un caso de carga adicional
+# (el primer renglon de encabezado ya fue leido)
+def ReadLoadCase(inputFile) :
+
+    #Leer 2 lineas de info
+    for _ in range(0,2) :
+        spare = inputFile.readline()
+
+    name = inputFile.readline().split()[0]
+
+    loadCase = {"Name"        : name,
+                "NodalForces" : ReadNodalForces(inputFile),
+                "BarForces"   : ReadBarForces(inputFile)}
+
+    return loadCase
+
+# Recorre los encabezados de las secciones opcionales al final del archivo
+# y regresa el primer renglon de cada uno, sin "#" y en minusculas
+def IterateSectionHeaders(inputFile) :
+
+    for aLine in inputFile :
+        header = aLine.strip()
+        if header == "" :
+            continue
+        yield header.lstrip("#").strip().lower()
+
+    return
+
+# Cache binario del modelo
+#
+#   Junto al archivo .dat se guarda un .cache.npz con los arreglos del
+#   modelo ya leido y, opcionalmente, la numeracion de GDL y las matrices
+#   elementales. El cache se identifica con el hash del contenido del .dat
+#   y se descarta automaticamente cuando el archivo cambia.
+CACHE_VERSION = 1
+
+# Arreglos por barra que se pueden guardar en el cache
+CACHE_ELEMENT_KEYS = ["BarDOF", "Length", "k", "T", "Ke"]
+
+# Arreglos de dofData que se guardan en el cache
+CACHE_DOF_KEYS = ["DOFArray", "NodeOrder"]
+CACHE_DOF_VALUES = ["DOFCount", "UnknownDOFCount", "BandwidthBefore", "ProfileBefore", "Bandwidth", "Profile"]
+
+def CacheFileName(dataFileName) :
+    return os.path.splitext(dataFileName)[0] + ".cache.npz"
+
+# Hash del contenido de un archivo
+def FileHash(fileName) :
+
+    digest = hashlib.blake2b(digest_size=20)
+    with open(fileName, "rb") as inputFile :
+        for block in iter(lambda : inputFile.read(1 << 20), b"") :
+            digest.update(block)
+
+    return digest.hexdigest()
+
+# Funcion ReadModel
+#   Lee el modelo del cache si corresponde al contenido actual del .dat,
+#   si no, lo lee con ReadDataFile y crea el cache (saveCache = False
+#   deja la escritura al llamador, p. ej. para incluir dofData con SaveCache)
+#
+#   Salidas:
+#       model   Diccionario del modelo, con model["Cache"]:
+#               "FileName" : Nombre del archivo de cache
+#               "Hash"     : Hash del .dat
+#               "Hit"      : True si el modelo se leyo del cache
+#               "DOFData"  : Numeracion de GDL guardada (o None)
+def ReadModel(dataFileName, useCache=True, memoryMap=False, saveCache=True) :
+
+    if not useCache :
+        model = ReadDataFile(dataFileName, memoryMap)
+        model["Cache"] = {"FileName" : None,
+                          "Hash"     : None,
+                          "Hit"      : False,
+                          "DOFData"  : None}
+        return model
+
+    cacheFileName = CacheFileName(dataFileName)
+    sourceHash = FileHash(dataFileName)
+
+    model = LoadCache(cacheFileName, sourceHash)
+    if model is None :
+        model = ReadDataFile(dataFileName, memoryMap)
+        model["Cache"] = {"FileName" : cacheFileName,
+                          "Hash"     : sourceHash,
+                          "Hit"      : False,
+                          "DOFData"  : None}
+        if saveCache :
+            SaveCache(model)
+
+    return model
+
+# Guarda el modelo (y opcionalmente dofData y las matrices elementales
+# que ya esten en model["Arrays"]) en el cache del modelo
+def SaveCache(model, dofData=None, elementMatrices=False) :
+
+    cache = model.get("Cache")
+    if cache is None or cache["FileName"] is None :
+        return
+
+    arrays = model["Arrays"]
+    data = {"CacheVersion" : np.array(CACHE_VERSION),
+            "SourceHash"   : np.array(cache["Hash"]),
+            "CaseNames"    : np.array([loadCase["Name"] for loadCase in model["LoadCases"]])}
+
+    for key in MODEL_CACHE_KEYS :
+        data["Model/" + key] = np.asarray(arrays[key])
+
+    for case in range(len(model["LoadCases"])) :
+        caseData = model["LoadCases"][case]["Arrays"]
+        for key in md.CASE_ARRAY_KEYS :
+            data["Case" + str(case) + "/" + key] = caseData[key]
+
+    if elementMatrices :
+        for key in CACHE_ELEMENT_KEYS :
+            if arrays.get(key) is not None :
+                data["Element/" + key] = arrays[key]
+
+    if dofData is not None :
+        data["DOF/Reordering"] = np.array(dofData["Reordering"])
+        for key in CACHE_DOF_KEYS :
+            data["DOF/" + key] = dofData[key]
+        for key in CACHE_DOF_VALUES :
+            data["DOF/" + key] = np.array(dofData[key])
+
+    # Escribir en un temporal y reemplazar, para no dejar un cache a medias
+    temporaryName = cache["FileName"] + ".tmp"
+    try :
+        with open(temporaryName, "wb") as cacheFile :
+            np.savez(cacheFile, **data)
+        os.replace(temporaryName, cache["FileName"])
+    except OSError :
+        if os.path.exists(temporaryName) :
+            os.remove(temporaryName)
+
+    return
+
+# Arreglos del modelo que se guardan en el cache
+MODEL_CACHE_KEYS = ["NodeNumbers", "Coords", "BarIDs", "Connectivity", "TypeCode",
+                    "PropertyRow", "MaterialRow", "MaterialIDs", "MaterialNames",
+                    "E", "nu", "Density", "PropertyIDs", "PropertyNames", "A", "I",
+                    "RestrictedNodes", "RestrictionFlags"]
+
+# Lee el cache si existe y corresponde a sourceHash (si no, regresa None)
+def LoadCache(cacheFileName, sourceHash) :
+
+    try :
+        with np.load(cacheFileName, allow_pickle=False) as data :
+            if int(data["CacheVersion"]) != CACHE_VERSION or str(data["SourceHash"]) != sourceHash :
+                return None
+            names = data.files
+
+            arrays = {}
+            for key in MODEL_CACHE_KEYS :
+                arrays[key] = data["Model/" + key]
+            arrays["MaterialNames"] = arrays["MaterialNames"].tolist()
+            arrays["PropertyNames"] = arrays["PropertyNames"].tolist()
+
+            caseArrays = []
+            caseNames = data["CaseNames"].tolist()
+            for case in range(len(caseNames)) :
+                caseData = {"Name" : caseNames[case]}
+                for key in md.CASE_ARRAY_KEYS :
+                    caseData[key] = data["Case" + str(case) + "/" + key]
+                caseArrays.append(caseData)
+
+            for key in CACHE_ELEMENT_KEYS :
+                if "Element/" + key in names :
+                    arrays[key] = data["Element/" + key]
+
+            dofData = None
+            if "DOF/Reordering" in names :
+                dofData = {"Reordering" : str(data["DOF/Reordering"])}
+                for key in CACHE_DOF_KEYS :
+                    dofData[key] = data["DOF/" + key]
+                for key in CACHE_DOF_VALUES :
+                    dofData[key] = int(data["DOF/" + key])
+                dofData["NodeNumberList"] = arrays["NodeNumbers"].tolist()
+                dofData["NodeIndex"] = dict(zip(dofData["NodeNumberList"], range(len(dofData["NodeNumberList"]))))
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) :
+        return None
+
+    model = md.BuildModel(arrays, caseArrays)
+    model["Cache"] = {"FileName" : cacheFileName,
+                      "Hash"     : sourceHash,
+                      "Hit"      : True,
+                      "DOFData"  : dofData}
 
     return model
 
+# Resultados de los casos de carga (documento.results.npz)
+#
+#   D, R y qe de todos los casos, con la numeracion de GDL con que se
+#   calcularon y el hash del .dat, para combinarlos despues sin volver a
+#   resolver (Combinations.py). main.py los guarda con --save-results
+RESULTS_VERSION = 1
+
+# Arreglos de dofData que se guardan con los resultados
+RESULTS_DOF_KEYS = ["DOFArray"]
+RESULTS_DOF_VALUES = ["DOFCount", "UnknownDOFCount"]
+
+def ResultsCacheFileName(dataFileName) :
+    return os.path.splitext(dataFileName)[0] + ".results.npz"
+
+# Guarda los resultados de los casos junto al .dat del modelo (el modelo
+# debe venir de ReadModel con cache para tener el hash del .dat)
+def SaveCaseResults(resultsCacheFileName, model, dofData, D, R) :
+
+    cache = model.get("Cache")
+    if cache is None or cache["Hash"] is None :
+        return
+
+    data = {"ResultsVersion" : np.array(RESULTS_VERSION),
+            "SourceHash"     : np.array(cache["Hash"]),
+            "CaseNames"      : np.array([loadCase["Name"] for loadCase in model["LoadCases"]]),
+            "Du"             : D["Du"],
+            "Dk"             : D["Dk"],
+            "R"              : R,
+            "qe"             : model["Arrays"]["qe"]}
+    for key in RESULTS_DOF_KEYS :
+        data["DOF/" + key] = dofData[key]
+    for key in RESULTS_DOF_VALUES :
+        data["DOF/" + key] = np.array(dofData[key])
+
+    temporaryName = resultsCacheFileName + ".tmp"
+    try :
+        with open(temporaryName, "wb") as resultsFile :
+            np.savez(resultsFile, **data)
+        os.replace(temporaryName, resultsCacheFileName)
+    except OSError :
+        if os.path.exists(temporaryName) :
+            os.remove(temporaryName)
+
+    return
+
+# Lee los resultados guardados si corresponden a sourceHash (si no, None)
+#
+#   Salidas:
+#       results     {"CaseNames", "Du", "Dk", "R", "qe",
+#                    "DOFData" : {"DOFArray", "DOFCount", "UnknownDOFCount"}}
+def LoadCaseResults(resultsCacheFileName, sourceHash) :
+
+    try :
+        with np.load(resultsCacheFileName, allow_pickle=False) as data :
+            if int(data["ResultsVersion"]) != RESULTS_VERSION or str(data["SourceHash"]) != sourceHash :
+                return None
+            results = {"CaseNames" : data["CaseNames"].tolist()}
+            for key in ["Du", "Dk", "R", "qe"] :
+                results[key] = data[key]
+            dofData = {}
+            for key in RESULTS_DOF_KEYS :
+                dofData[key] = data["DOF/" + key]
+            for key in RESULTS_DOF_VALUES :
+                dofData[key] = int(data["DOF/" + key])
+            results["DOFData"] = dofData
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) :
+        return None
+
+    return results
+
+# Funcion WriteDataFile
+#   Escribe un modelo en el formato .dat que lee ReadDataFile
+#   (incluyendo los casos de carga adicionales)
+
+def WriteDataFile(dataFileName, model) :
+
+    arrays = model["Arrays"]
+    nodeNumbers = arrays["NodeNumbers"]
+
+    def section(title, columns, rowFormat, rows) :
+        text = "# " + title + "\n# Qty\n# " + columns + "\n" + str(len(rows)) + "\n"
+        return text + "".join([rowFormat % row for row in rows])
+
+    def floats(array) :
+        return np.asarray(array, dtype=float).tolist()
+
+    coords = arrays["Coords"]
+    nodes = list(zip(nodeNumbers.tolist(), floats(coords[:,0]), floats(coords[:,1])))
+
+    connectivity = arrays["Connectivity"]
+    bars = list(zip(arrays["BarIDs"].tolist(),
+                    nodeNumbers[connectivity[:,0]].tolist(),
+                    nodeNumbers[connectivity[:,1]].tolist(),
+                    [md.TYPE_NAMES[code] for code in arrays["TypeCode"].tolist()],
+                    arrays["PropertyIDs"][arrays["PropertyRow"]].tolist(),
+                    arrays["MaterialIDs"][arrays["MaterialRow"]].tolist()))
+
+    materials = list(zip(arrays["MaterialIDs"].tolist(), arrays["MaterialNames"],
+                         floats(arrays["E"]), floats(arrays["nu"]), floats(arrays["Density"])))
+
+    properties = list(zip(arrays["PropertyIDs"].tolist(), arrays["PropertyNames"],
+                          floats(arrays["A"]), floats(arrays["I"])))
+
+    flags = arrays["RestrictionFlags"].astype(int)
+    restrictions = list(zip(arrays["RestrictedNodes"].tolist(), flags[:,0].tolist(),
+                            flags[:,1].tolist(), flags[:,2].tolist()))
+
+    def loadSections(caseData) :
+        forces = caseData["NodalForces"]
+        loads = caseData["BarLoads"]
+        nodalForces = list(zip(caseData["NodeID"].tolist(), floats(forces[:,0]),
+                               floats(forces[:,1]), floats(forces[:,2])))
+        barForces = list(zip(caseData["BarID"].tolist(), floats(loads[:,0]), floats(loads[:,1]),
+                             floats(loads[:,2]), floats(loads[:,3])))
+        return (section("Loads - Nodal", "NodeNumber    FX(kN)  FY(kN)  MZ(kN-m)", "%d\t%r\t%r\t%r\n", nodalForces) +
+                section("Load - Member", "BarNumber a(m)    Fa(kN/m)    b(m)    Fb(kN/m)", "%d\t%r\t%r\t%r\t%r\n", barForces))
+
+    loadCases = model["LoadCases"]
+
+    with open(dataFileName, "w") as outputFile :
+        outputFile.write(section("Nodes", "NodeNumber CoordX(m) CoordY(m)", "%d\t%r\t%r\n", nodes))
+        outputFile.write(section("Barras", "BarNumber Node1 Node2 Type Property Material", "%d\t%d\t%d\t%s\t%d\t%d\n", bars))
+        outputFile.write(section("Materiales", "MatNumber Name E(GPa) Poiss Densidad(kg/m3)", "%d\t%s\t%r\t%r\t%r\n", materials))
+        outputFile.write(section("Propiedades", "PropNumber Name A(mm2) I(E06 mm4)", "%d\t%s\t%r\t%r\n", properties))
+        outputFile.write(section("Supports", "NodeNumber    TX(1 or 0)  TY(1 or 0)  RZ(1 or 0)", "%d\t%d\t%d\t%d\n", restrictions))
+        outputFile.write(loadSections(loadCases[0]["Arrays"]))
+        for loadCase in loadCases[1:] :
+            outputFile.write("# Load Case\n# Name\n# CaseName\n" + loadCase["Name"] + "\n")
+            outputFile.write(loadSections(loadCase["Arrays"]))
+
+    return
+
 def reportMessage(outputFileName, message, GiD, flag="a"):
     if GiD :
         with open(outputFileName,flag) as outputFile:
@@ -164,14 +713,340 @@ def reportMessage(outputFileName, message, GiD, flag="a"):
 
     return
 
-def ExportResultsFile(resultsFileName,model,D,R,dofData) :
+# Funcion ExportResultsFile
+#   Escribe el archivo de resultados de GiD (.post.res), un paso
+#   de resultados ("Lineal" 1, 2, ...) por cada caso de carga
+#
+#   Cada bloque de resultados se arma completo a partir de los arreglos
+#   del modelo y se escribe con un solo write
+
+# Tamaño del buffer del archivo de resultados
+RESULTS_BUFFER_SIZE = 1 << 22
+
+def ExportResultsFile(resultsFileName,model,D,R,dofData,stations=False) :
+
+    loadCases = model["LoadCases"]
+    disp = np.concatenate((D["Du"],D["Dk"]))
+
+    with open(resultsFileName,"w",buffering=RESULTS_BUFFER_SIZE) as resultsFile :
+
+        # Encabezados
+        resultsFile.write("GiD Post Results File 1.0\n\n")
+
+        for case in range(len(loadCases)) :
+
+            if len(loadCases) > 1 :
+                resultsFile.write("# Caso de carga " + str(case + 1) + ": " + loadCases[case]["Name"] + "\n\n")
+
+            resultsFile.write(FormatDisplacementsBlock(model,disp,dofData,case))
+            resultsFile.write(FormatReactionsBlock(model,R,dofData,case))
+
+            # Encabezados de los puntos de Gauss (una sola vez)
+            if case == 0 :
+                resultsFile.write(FormatGaussPointsBlock())
+                if stations :
+                    resultsFile.write(FormatStationPointsBlock(model["Arrays"]["StationX"].shape[1]))
+
+            for block in FormatBarForcesBlocks(model,case) :
+                resultsFile.write(block)
+
+            # Fuerzas internas y deflexion en las estaciones (Stations.py)
+            if stations :
+                for block in FormatStationBlocks(model,case) :
+                    resultsFile.write(block)
+
+    return
+
+# Orden de los bloques en el archivo de resultados
+#
+#   Lista de keys ("Header"), ("Case", c), ("Displacements", c),
+#   ("Reactions", c), ("GaussPoints"), ("BarForces", c) en el orden en que
+#   ExportResultsFile los escribe; con stations, tambien ("StationPoints")
+#   y ("Stations", c)
+def ResultsBlockOrder(caseCount, stations=False) :
+
+    order = [("Header",)]
+    for case in range(caseCount) :
+        if caseCount > 1 :
+            order.append(("Case", case))
+        order.append(("Displacements", case))
+        order.append(("Reactions", case))
+        if case == 0 :
+            order.append(("GaussPoints",))
+            if stations :
+                order.append(("StationPoints",))
+        order.append(("BarForces", case))
+        if stations :
+            order.append(("Stations", case))
+
+    return order
+
+# Clase ResultsWriter
+#   Escritor de resultados en un hilo de fondo
+#
+#   Los bloques se entregan con Submit* en cuanto se calculan; el hilo los
+#   formatea y los escribe en el orden de ResultsBlockOrder (un bloque que
+#   llega antes de tiempo espera en memoria a los anteriores). Asi la
+#   escritura de los desplazamientos se traslapa con el calculo de
+#   reacciones y fuerzas elementales. El archivo resultante es identico al
+#   de ExportResultsFile.
+#
+#   Close() espera al hilo y regresa el error del escritor (o None)
+#
+#   Con stationCount > 0 el archivo lleva tambien los resultados en las
+#   estaciones de las barras, que se entregan con SubmitStations
+#
+#   Submit entrega un bloque cualquiera con su funcion de formato. Con
+#   queueSize > 0 Submit espera cuando hay queueSize bloques sin formatear,
+#   para que quien genera los resultados por partes no se adelante al
+#   escritor y acumule todo en memoria
+class ResultsWriter :
+
+    def __init__(self, resultsFileName, model, stationCount=0, queueSize=0) :
+
+        loadCases = model["LoadCases"]
+        self.model = model
+        self.caseCount = len(loadCases)
+        self.order = ResultsBlockOrder(self.caseCount, stationCount > 0)
+        self.pending = {("Header",) : "GiD Post Results File 1.0\n\n",
+                        ("GaussPoints",) : FormatGaussPointsBlock()}
+        if stationCount > 0 :
+            self.pending[("StationPoints",)] = FormatStationPointsBlock(stationCount)
+        for case in range(self.caseCount) :
+            self.pending[("Case", case)] = "# Caso de carga " + str(case + 1) + ": " + loadCases[case]["Name"] + "\n\n"
+        self.written = 0
+        self.error = None
+
+        self.resultsFile = open(resultsFileName, "w", buffering=RESULTS_BUFFER_SIZE)
+        self.queue = queue.Queue(queueSize)
+        self.thread = threading.Thread(target=self._Run, name="ResultsWriter", daemon=True)
+        self.thread.start()
+
+    def Submit(self, key, function, *args) :
+        self.queue.put((key, function, args))
+
+    def SubmitDisplacements(self, D, dofData) :
+        for case in range(self.caseCount) :
+            self.queue.put((("Displacements", case), _FormatDisplacements, (self.model, D, dofData, case)))
+
+    def SubmitReactions(self, R, dofData) :
+        for case in range(self.caseCount) :
+            self.queue.put((("Reactions", case), FormatReactionsBlock, (self.model, R, dofData, case)))
+
+    def SubmitBarForces(self) :
+        for case in range(self.caseCount) :
+            self.queue.put((("BarForces", case), _FormatBarForces, (self.model, case)))
+
+    def SubmitStations(self) :
+        for case in range(self.caseCount) :
+            self.queue.put((("Stations", case), _FormatStations, (self.model, case)))
+
+    def Close(self) :
+
+        self.queue.put(None)
+        self.thread.join()
+        self.resultsFile.close()
+
+        if self.error is None and self.written < len(self.order) :
+            missing = [str(key) for key in self.order[self.written:]]
+            self.error = "Bloques de resultados sin escribir: " + ", ".join(missing)
+
+        return self.error
+
+    def _Run(self) :
+
+        while True :
+            item = self.queue.get()
+            if item is None :
+                break
+            if self.error is not None :
+                continue
+            key, function, args = item
+            try :
+                self.pending[key] = function(*args)
+                while self.written < len(self.order) and self.order[self.written] in self.pending :
+                    self.resultsFile.write(self.pending.pop(self.order[self.written]))
+                    self.written += 1
+            except Exception :
+                self.error = traceback.format_exc()
+
+        return
+
+def _FormatDisplacements(model,D,dofData,case) :
+    return FormatDisplacementsBlock(model,np.concatenate((D["Du"],D["Dk"])),dofData,case)
+
+def _FormatBarForces(model,case) :
+    return "".join(FormatBarForcesBlocks(model,case))
+
+def _FormatStations(model,case) :
+    return "".join(FormatStationBlocks(model,case))
+
+# Formatear renglones de valores en bloque
+#
+#   rowFormat: formato de un renglon, p. ej. "\t%d\t%r\n"
+#   columns:   arreglos con una entrada por renglon, en el orden del formato
+#
+#   Los valores se formatean como Python float (%r), igual que str()
+#   en el escritor original; un cero negativo se escribe "-0.0" en ambos
+#   (p. ej. el momento -qe de un extremo con qe = 0.0 exacto)
+def FormatRows(rowFormat, columns) :
+
+    count = len(columns[0])
+    if count == 0 :
+        return ""
+
+    values = [column.tolist() for column in columns]
+    flat = [value for row in zip(*values) for value in row]
+
+    return (rowFormat * count) % tuple(flat)
+
+def _ResultHeader(name, step, kind, location, components, unit) :
+    return ("Result \"" + name + "\" \"Lineal\" " + str(step) + " " + kind + " " + location + "\n" +
+            "ComponentNames " + components + "\n" +
+            "Unit " + unit + "\n" +
+            "Values\n")
+
+# Bloque de desplazamientos nodales del caso de carga case
+#
+#   En los Format*Block, step es el numero de paso de GiD (por omision
+#   case + 1) cuando la columna case no corresponde al paso, p. ej. en las
+#   combinaciones que se escriben por bloques (Combinations.py)
+def FormatDisplacementsBlock(model,disp,dofData,case,step=None) :
+
+    arrays = model["Arrays"]
+    dofArray = dofData["DOFArray"]
+
+    values = disp[dofArray[:,0:2],case]
+    rows = FormatRows("\t%d\t%r\t%r\t%r\n", [arrays["NodeNumbers"], values[:,0], values[:,1],
+                                                np.zeros(values.shape[0])])
+
+    return (_ResultHeader("Displacements", case + 1 if step is None else step, "Vector", "OnNodes", "\"X\", \"Y\", \"Z\"", "m") +
+            rows + "End Values\n\n")
+
+# Bloque de reacciones del caso de carga case
+def FormatReactionsBlock(model,R,dofData,case,step=None) :
+
+    arrays = model["Arrays"]
+    dofArray = dofData["DOFArray"]
+    dofU = dofData["UnknownDOFCount"]
+
+    # Si hay reaccion en este nodo para este DOF
+    known = dofArray >= dofU
+    reactions = np.zeros(dofArray.shape)
+    reactions[known] = R[dofArray[known] - dofU, case]
+
+    rows = FormatRows("\t%d\t%r\t%r\t%r\n", [arrays["NodeNumbers"], reactions[:,0], reactions[:,1],
+                                                reactions[:,2]])
+
+    return (_ResultHeader("Reactions", case + 1 if step is None else step, "Vector", "OnNodes", "\"RX\", \"RY\", \"MZ\"", "kN,kN-m") +
+            rows + "End Values\n\n")
+
+# Definicion de los puntos de Gauss de las barras (los 2 extremos)
+def FormatGaussPointsBlock() :
+    return ("GaussPoints \"L2\" ElemType Linear\n" +
+            "\tNumber of Gauss Points: 2\n" +
+            "\tNodes included\n" +
+            "\tNatural Coordinates: Internal\n" +
+            "End GaussPoints\n\n")
+
+# Fuerzas en los extremos de las barras (N, V, M) del caso de carga case
+#
+#   Regresa los extremos 0 y 1 de cada componente, cada uno (m), o (m x N)
+#   si case es un slice de casos
+def BarEndForces(model,case) :
+
+    arrays = model["Arrays"]
+    qe = arrays["qe"][:,:,case]
+    truss = (arrays["TypeCode"] == md.TYPE_TRUSS).reshape((-1,) + (1,) * (qe.ndim - 2))
+
+    axial = (-qe[:,0], np.where(truss, qe[:,2], qe[:,3]))
+    shear = (qe[:,1], np.where(truss, -qe[:,3], -qe[:,4]))
+    moment = (np.where(truss, 0.0, -qe[:,2]), np.where(truss, 0.0, qe[:,5]))
+
+    return {"Axial"  : axial,
+            "Shear"  : shear,
+            "Moment" : moment}
+
+# Bloques de fuerzas axiales, cortantes y momentos del caso de carga case
+def FormatBarForcesBlocks(model,case,step=None) :
+    return FormatEndForcesBlocks(model["Arrays"]["BarIDs"], BarEndForces(model,case), case + 1 if step is None else step)
+
+# Bloques de N, V y M a partir de las fuerzas en los extremos (con la
+# forma de BarEndForces, un valor por barra)
+def FormatEndForcesBlocks(barIDs,endForces,step) :
+
+    blocks = []
+    results = [("Axial",            "\"N\"", endForces["Axial"]),
+               ("Shear",            "\"V\"", endForces["Shear"]),
+               ("Flexural Moments", "\"M\"", endForces["Moment"])]
+    for name, component, (end0, end1) in results :
+        rows = FormatRows("\t%d\t%r\n\t\t%r\n", [barIDs, end0, end1])
+        blocks.append(_ResultHeader(name, step, "Scalar", "OnGaussPoints \"L2\"", component, "kN") +
+                      rows + "End Values\n\n")
+
+    return blocks
+
+# Definicion de las estaciones de las barras (k puntos equidistantes con
+# los extremos, como las evalua Stations.SampleStations)
+def FormatStationPointsBlock(stationCount) :
+    return ("GaussPoints \"Stations\" ElemType Linear\n" +
+            "\tNumber of Gauss Points: " + str(stationCount) + "\n" +
+            "\tNodes included\n" +
+            "\tNatural Coordinates: Internal\n" +
+            "End GaussPoints\n\n")
+
+# Bloques de N, V, M y deflexion local en las estaciones del caso case
+def FormatStationBlocks(model,case) :
+
+    arrays = model["Arrays"]
+    barIDs = arrays["BarIDs"]
+    stationCount = arrays["StationX"].shape[1]
+    rowFormat = "\t%d" + "\t%r\n" + "\t\t%r\n" * (stationCount - 1)
+
+    blocks = []
+    results = [("Axial (Stations)",            "\"N\"", "kN",   arrays["StationN"]),
+               ("Shear (Stations)",            "\"V\"", "kN",   arrays["StationV"]),
+               ("Flexural Moments (Stations)", "\"M\"", "kN-m", arrays["StationM"]),
+               ("Deflection (Stations)",       "\"v\"", "m",    arrays["StationDeflection"])]
+    for name, component, unit, values in results :
+        columns = [barIDs] + [values[:,station,case] for station in range(stationCount)]
+        blocks.append(_ResultHeader(name, case + 1, "Scalar", "OnGaussPoints \"Stations\"", component, unit) +
+                      FormatRows(rowFormat, columns) + "End Values\n\n")
+
+    return blocks
+
+# Funcion ExportExtremaFile
+#   Tabla CSV con los extremos por barra y caso de carga (ver
+#   Stations.BarExtrema), un renglon por barra y caso
+def ExportExtremaFile(extremaFileName, model, extrema) :
+
+    arrays = model["Arrays"]
+    barIDs = arrays["BarIDs"]
+    keys = ["Axial", "MaxMoment", "MaxMomentX", "MinMoment", "MinMomentX",
+            "MaxShear", "MaxShearX", "MaxDeflection", "MaxDeflectionX"]
+
+    with open(extremaFileName, "w") as extremaFile :
+        extremaFile.write("Bar,Case," + ",".join(keys) + "\n")
+        for case in range(len(model["LoadCases"])) :
+            columns = [barIDs, np.full(barIDs.shape[0], case + 1)] + [extrema[key][:,case] for key in keys]
+            extremaFile.write(FormatRows("%d,%d" + ",%r" * len(keys) + "\n", columns))
+
+    return
+
+# Funcion ExportResultsFileByLines
+#   Escritor original, un write por valor. Produce el mismo archivo que
+#   ExportResultsFile; se conserva como referencia para comparar
+#   resultados y tiempos (ver Benchmark.py)
+
+def ExportResultsFileByLines(resultsFileName,model,D,R,dofData) :
 
     #extraer la informacion del modelo
     nodes = model["Nodes"]
     bars  = model["Bars"]
+    loadCases = model["LoadCases"]
 
     dofArray       = dofData["DOFArray"]
-    nodeNumberList = dofData["NodeNumberList"]
+    nodeIndex      = dofData["NodeIndex"]
     dofU           = dofData["UnknownDOFCount"]
 
     Du = D["Du"]
@@ -183,124 +1058,132 @@ def ExportResultsFile(resultsFileName,model,D,R,dofData) :
         # Encabezados
         resultsFile.write("GiD Post Results File 1.0\n\n")
 
-        # Exportar desplazamientos
-        # Encabezado
-        resultsFile.write("Result \"Displacements\" \"Lineal\" 1 Vector OnNodes\n")
-        resultsFile.write("ComponentNames \"X\", \"Y\", \"Z\"\n")
-        resultsFile.write("Unit m\n")
-        resultsFile.write("Values\n")
-
-        # Datos
-        for node in nodes:
-            nodeNumber = node["Number"]
-            index = nodeNumberList.index(nodeNumber)
-            nodeDisp = []
-            for j in range(2) :
-                dxy = 0.0
-                dof = dofArray[index,j]
-                dxy = disp[dof,0]
-                nodeDisp.append(dxy)
-            nodeDisp.append(float(0.0))
-            resultsFile.write("\t"+str(nodeNumber)+"\t"+str(nodeDisp[0])+"\t"+str(nodeDisp[1])+"\t"+str(nodeDisp[2])+"\n")
-
-        # Cerrar
-        resultsFile.write("End Values\n\n")
-
-        # Exportar reacciones
-        resultsFile.write("Result \"Reactions\" \"Lineal\" 1 Vector OnNodes\n")
-        resultsFile.write("ComponentNames \"RX\", \"RY\", \"MZ\"\n")
-        resultsFile.write("Unit kN,kN-m\n") 
-        resultsFile.write("Values\n")
-        for node in nodes :
-            nodeNumber = node["Number"]
-            index = nodeNumberList.index(nodeNumber)
-            reactions = []
-            for j in range(3) :
-                r_xyz = 0.0
-                dof = dofArray[index,j]
-                if dof >= dofU : #Si hay reaccion en este nodo para este DOF
-                    r_xyz = R[dof-dofU,0]
-                reactions.append(r_xyz)
-            resultsFile.write("\t" + str(nodeNumber) + "\t" + str(reactions[0]) + "\t" + str(reactions[1])+ "\t" + str(reactions[2]) + "\n" )
-
-        # Cerrar
-        resultsFile.write("End Values\n\n")
-
-        # Resultados de fuerzas en las barras
-        # Encabezados
-        resultsFile.write("GaussPoints \"L2\" ElemType Linear\n")
-        resultsFile.write("\tNumber of Gauss Points: 2\n")
-        resultsFile.write("\tNodes included\n")
-        resultsFile.write("\tNatural Coordinates: Internal\n")
-        resultsFile.write("End GaussPoints\n\n")
-
-        # Axiales
-        resultsFile.write("Result \"Axial\" \"Lineal\" 1 Scalar OnGaussPoints \"L2\"\n")
-        resultsFile.write("ComponentNames \"N\"\n")
-        resultsFile.write("Unit kN\n")  
-        resultsFile.write("Values\n")
-        for bar in bars:
-            qe = bar["qe"]
-            barNumber = bar["ID"]
-            valueEnd0 = 0.0
-            valueEnd1 = 0.0
-            if bar["Type"] == "TRUSS":
-                valueEnd0 = -qe[0,0]
-                valueEnd1 =  qe[2,0]
-            elif bar["Type"] == "FRAME":
-                valueEnd0 = -qe[0,0]
-                valueEnd1 =  qe[3,0]
-
-            resultsFile.write("\t" + str(barNumber) + "\t" + str(valueEnd0) + "\n")
-            resultsFile.write("\t\t" + str(valueEnd1) + "\n")
-
-        # Cerrar
-        resultsFile.write("End Values\n\n")
-
-        # Cortantes
-        resultsFile.write("Result \"Shear\" \"Lineal\" 1 Scalar OnGaussPoints \"L2\"\n")
-        resultsFile.write("ComponentNames \"V\"\n")
-        resultsFile.write("Unit kN\n")  
-        resultsFile.write("Values\n")
-        for bar in bars:
-            qe = bar["qe"]
-            barNumber = bar["ID"]
-            valueEnd0 = 0.0
-            valueEnd1 = 0.0
-            if bar["Type"] == "TRUSS":
-                valueEnd0 =  qe[1,0]
-                valueEnd1 = -qe[3,0]
-            elif bar["Type"] == "FRAME":
-                valueEnd0 =  qe[1,0]
-                valueEnd1 = -qe[4,0]
-
-            resultsFile.write("\t" + str(barNumber) + "\t" + str(valueEnd0) + "\n")
-            resultsFile.write("\t\t" + str(valueEnd1) + "\n")
-            
-        # Cerrar
-        resultsFile.write("End Values\n\n")
-
-        # Momento Flector
-        resultsFile.write("Result \"Flexural Moments\" \"Lineal\" 1 Scalar OnGaussPoints \"L2\"\n")
-        resultsFile.write("ComponentNames \"M\"\n")
-        resultsFile.write("Unit kN\n")  
-        resultsFile.write("Values\n")
-        for bar in bars:
-            qe = bar["qe"]
-            barNumber = bar["ID"]
-            valueEnd0 = 0.0
-            valueEnd1 = 0.0
-            if bar["Type"] == "TRUSS":
+        for case in range(len(loadCases)) :
+
+            step = str(case + 1)
+
+            if len(loadCases) > 1 :
+                resultsFile.write("# Caso de carga " + step + ": " + loadCases[case]["Name"] + "\n\n")
+
+            # Exportar desplazamientos
+            # Encabezado
+            resultsFile.write("Result \"Displacements\" \"Lineal\" " + step + " Vector OnNodes\n")
+            resultsFile.write("ComponentNames \"X\", \"Y\", \"Z\"\n")
+            resultsFile.write("Unit m\n")
+            resultsFile.write("Values\n")
+
+            # Datos
+            for node in nodes:
+                nodeNumber = node["Number"]
+                index = nodeIndex[nodeNumber]
+                nodeDisp = []
+                for j in range(2) :
+                    dxy = 0.0
+                    dof = dofArray[index,j]
+                    dxy = disp[dof,case]
+                    nodeDisp.append(dxy)
+                nodeDisp.append(float(0.0))
+                resultsFile.write("\t"+str(nodeNumber)+"\t"+str(nodeDisp[0])+"\t"+str(nodeDisp[1])+"\t"+str(nodeDisp[2])+"\n")
+
+            # Cerrar
+            resultsFile.write("End Values\n\n")
+
+            # Exportar reacciones
+            resultsFile.write("Result \"Reactions\" \"Lineal\" " + step + " Vector OnNodes\n")
+            resultsFile.write("ComponentNames \"RX\", \"RY\", \"MZ\"\n")
+            resultsFile.write("Unit kN,kN-m\n") 
+            resultsFile.write("Values\n")
+            for node in nodes :
+                nodeNumber = node["Number"]
+                index = nodeIndex[nodeNumber]
+                reactions = []
+                for j in range(3) :
+                    r_xyz = 0.0
+                    dof = dofArray[index,j]
+                    if dof >= dofU : #Si hay reaccion en este nodo para este DOF
+                        r_xyz = R[dof-dofU,case]
+                    reactions.append(r_xyz)
+                resultsFile.write("\t" + str(nodeNumber) + "\t" + str(reactions[0]) + "\t" + str(reactions[1])+ "\t" + str(reactions[2]) + "\n" )
+
+            # Cerrar
+            resultsFile.write("End Values\n\n")
+
+            # Resultados de fuerzas en las barras
+            # Encabezados (una sola vez)
+            if case == 0 :
+                resultsFile.write("GaussPoints \"L2\" ElemType Linear\n")
+                resultsFile.write("\tNumber of Gauss Points: 2\n")
+                resultsFile.write("\tNodes included\n")
+                resultsFile.write("\tNatural Coordinates: Internal\n")
+                resultsFile.write("End GaussPoints\n\n")
+
+            # Axiales
+            resultsFile.write("Result \"Axial\" \"Lineal\" " + step + " Scalar OnGaussPoints \"L2\"\n")
+            resultsFile.write("ComponentNames \"N\"\n")
+            resultsFile.write("Unit kN\n")  
+            resultsFile.write("Values\n")
+            for bar in bars:
+                qe = bar["qe"]
+                barNumber = bar["ID"]
+                valueEnd0 = 0.0
+                valueEnd1 = 0.0
+                if bar["Type"] == "TRUSS":
+                    valueEnd0 = -qe[0,case]
+                    valueEnd1 =  qe[2,case]
+                elif bar["Type"] == "FRAME":
+                    valueEnd0 = -qe[0,case]
+                    valueEnd1 =  qe[3,case]
+
+                resultsFile.write("\t" + str(barNumber) + "\t" + str(valueEnd0) + "\n")
+                resultsFile.write("\t\t" + str(valueEnd1) + "\n")
+
+            # Cerrar
+            resultsFile.write("End Values\n\n")
+
+            # Cortantes
+            resultsFile.write("Result \"Shear\" \"Lineal\" " + step + " Scalar OnGaussPoints \"L2\"\n")
+            resultsFile.write("ComponentNames \"V\"\n")
+            resultsFile.write("Unit kN\n")  
+            resultsFile.write("Values\n")
+            for bar in bars:
+                qe = bar["qe"]
+                barNumber = bar["ID"]
                 valueEnd0 = 0.0
                 valueEnd1 = 0.0
-            elif bar["Type"] == "FRAME":
-                valueEnd0 = -qe[2,0]
-                valueEnd1 =  qe[5,0]
+                if bar["Type"] == "TRUSS":
+                    valueEnd0 =  qe[1,case]
+                    valueEnd1 = -qe[3,case]
+                elif bar["Type"] == "FRAME":
+                    valueEnd0 =  qe[1,case]
+                    valueEnd1 = -qe[4,case]
 
-            resultsFile.write("\t" + str(barNumber) + "\t" + str(valueEnd0) + "\n")
-            resultsFile.write("\t\t" + str(valueEnd1) + "\n")
-            
-        # Cerrar
-        resultsFile.write("End Values\n\n")
+                resultsFile.write("\t" + str(barNumber) + "\t" + str(valueEnd0) + "\n")
+                resultsFile.write("\t\t" + str(valueEnd1) + "\n")
+                
+            # Cerrar
+            resultsFile.write("End Values\n\n")
 
-    return
\ No newline at end of file
+            # Momento Flector
+            resultsFile.write("Result \"Flexural Moments\" \"Lineal\" " + step + " Scalar OnGaussPoints \"L2\"\n")
+            resultsFile.write("ComponentNames \"M\"\n")
+            resultsFile.write("Unit kN\n")  
+            resultsFile.write("Values\n")
+            for bar in bars:
+                qe = bar["qe"]
+                barNumber = bar["ID"]
+                valueEnd0 = 0.0
+                valueEnd1 = 0.0
+                if bar["Type"] == "TRUSS":
+                    valueEnd0 = 0.0
+                    valueEnd1 = 0.0
+                elif bar["Type"] == "FRAME":
+                    valueEnd0 = -qe[2,case]
+                    valueEnd1 =  qe[5,case]
+
+                resultsFile.write("\t" + str(barNumber) + "\t" + str(valueEnd0) + "\n")
+                resultsFile.write("\t\t" + str(valueEnd1) + "\n")
+                
+            # Cerrar
+            resultsFile.write("End Values\n\n")
+
+    return
@@ -0,0 +1,280 @@
+import IOFiles as io
+import Instrumentation as ins
+import ModelData as md
+import Routines as rt
+import Solver as sl
+
+import numpy as np
+
+import sys
+
+# Lineas de influencia (carga movil)
+#
+#   python Influence.py documento --path barra barra ... [--step s]
+#                       [--members barra ...] [--method metodo]
+#
+#   Una carga unitaria (1 kN en -Y global) recorre la trayectoria formada
+#   por las barras de --path, en ese orden, a pasos de --step metros
+#   (INFLUENCE_STEP por omision), incluyendo el inicio y el final. Las
+#   barras consecutivas deben compartir un nodo; la primera se recorre
+#   desde el nodo que no comparte con la segunda.
+#
+#   Cada posicion es un caso de carga: sus fuerzas de empotramiento
+#   (Routines.BatchPointLoadForces) forman una columna de QF, todas las
+#   columnas se resuelven con una sola factorizacion de K11 y las
+#   reacciones y fuerzas en las barras se recuperan para todas las
+#   posiciones a la vez. La memoria crece con GDL x posiciones (Du) y
+#   barras x 6 x posiciones (qe).
+#
+#   Salidas junto al documento:
+#       documento.influence.csv       Una fila por posicion con las
+#                                     ordenadas de las reacciones de los
+#                                     apoyos y, para las barras de
+#                                     --members (todas por omision), N en
+#                                     las TRUSS y N, V, M1, M2 en las FRAME
+#       documento.influence.post.res  Desplazamientos, reacciones y
+#                                     fuerzas en las barras, un paso de GiD
+#                                     por posicion
+#       documento.influence.log       Mediciones de las etapas
+
+# Paso por omision entre posiciones de la carga (m)
+INFLUENCE_STEP = 0.5
+
+# Funcion LoadPath
+#   Posiciones de la carga unitaria sobre la trayectoria
+#
+#   Entradas:
+#       model       Modelo con "Length" (Routines.GenerateElementMatrices)
+#       pathBars    IDs de las barras de la trayectoria, en orden
+#       step        Distancia entre posiciones (m)
+#
+#   Salidas:
+#       positions   {"Row" : renglon de la barra,
+#                    "X"   : distancia al nodo inicial de la barra,
+#                    "S"   : distancia recorrida sobre la trayectoria},
+#                   arreglos de longitud P
+def LoadPath(model, pathBars, step=INFLUENCE_STEP) :
+
+    arrays = model["Arrays"]
+    if len(pathBars) == 0 :
+        raise ValueError("La trayectoria no tiene barras")
+    if step <= 0.0 :
+        raise ValueError("El paso debe ser positivo")
+
+    rows = md.LookupRows(md.IDLookup(arrays["BarIDs"], "Barra"), pathBars, "la barra", "La trayectoria")
+    nodes = arrays["Connectivity"][rows]
+    lengths = arrays["Length"][rows]
+
+    # Sentido de cada barra: True si se recorre del nodo inicial al final
+    forward = np.ones(rows.shape[0], dtype=bool)
+    if rows.shape[0] > 1 :
+        forward[0] = nodes[0,1] in nodes[1]
+    current = nodes[0,1] if forward[0] else nodes[0,0]
+    for bar in range(1, rows.shape[0]) :
+        if current not in nodes[bar] :
+            raise ValueError("Las barras " + str(pathBars[bar-1]) + " y " + str(pathBars[bar]) + " de la trayectoria no comparten un nodo")
+        forward[bar] = nodes[bar,0] == current
+        current = nodes[bar,1] if forward[bar] else nodes[bar,0]
+
+    # Posiciones sobre la trayectoria y la barra en la que cae cada una
+    start = np.concatenate(([0.0], np.cumsum(lengths)))
+    total = start[-1]
+    count = int(np.floor(total / step + 1.0E-9)) + 1
+    S = np.minimum(np.arange(count) * step, total)
+    if total - S[-1] > 1.0E-9 * total :
+        S = np.append(S, total)
+
+    bar = np.clip(np.searchsorted(start, S, side="right") - 1, 0, rows.shape[0] - 1)
+    t = np.clip(S - start[bar], 0.0, lengths[bar])
+    X = np.where(forward[bar], t, lengths[bar] - t)
+
+    return {"Row" : rows[bar],
+            "X"   : X,
+            "S"   : S}
+
+# Funcion InfluenceLines
+#
+#   Entradas:
+#       model       Modelo con matrices elementales
+#       dofData     Diccionario de GenerateDOF
+#       K           Diccionario de AssembleStiffnessMatrix (se le agrega
+#                   la factorizacion si no la tiene)
+#       positions   Salida de LoadPath
+#       method, options
+#                   Metodo de factorizacion (Solver.FactorizeStiffness)
+#
+#   Salidas:
+#       lines       {"Du", "Dk" : desplazamientos (GDL x P),
+#                    "R"        : reacciones (GDL conocidos x P),
+#                    "qe"       : fuerzas en las barras (m x 6 x P)}
+def InfluenceLines(model, dofData, K, positions, method="auto", options=None) :
+
+    arrays = model["Arrays"]
+    dofCount = dofData["DOFCount"]
+    dofU = dofData["UnknownDOFCount"]
+    rows = positions["Row"]
+    positionCount = rows.shape[0]
+    columns = np.arange(positionCount)
+
+    # Carga unitaria en -Y global, en ejes locales de cada barra
+    T = arrays["T"][rows]
+    C = T[:,0,0]
+    S = T[:,0,1]
+    qF = rt.BatchPointLoadForces(arrays["TypeCode"][rows], arrays["Length"][rows], positions["X"], -S, -C)
+
+    # QF: una columna por posicion, QFe = Te^T * qF
+    QFe = np.einsum("pji,pj->pi", T, qF)
+    barDOF = arrays["BarDOF"][rows]
+    used = barDOF >= 0
+    QF = np.zeros((dofCount, positionCount))
+    np.add.at(QF, (barDOF[used], np.broadcast_to(columns[:,None], barDOF.shape)[used]), QFe[used])
+
+    # Desplazamientos con una sola factorizacion de K11 (Q = 0, Dk = 0)
+    factorization = K.get("Factorization")
+    if factorization is None :
+        factorization = sl.FactorizeStiffness(K["K11"], method, options)
+        K["Factorization"] = factorization
+    Du = sl.SolveFactorized(factorization, -QF[:dofU])
+    Dk = np.zeros((dofCount - dofU, positionCount))
+
+    # Reacciones y fuerzas en las barras de todas las posiciones
+    R = K["K21"] @ Du + QF[dofU:]
+
+    Disp = np.concatenate((Du, Dk))
+    allUsed = arrays["BarDOF"] >= 0
+    De = Disp[np.where(allUsed, arrays["BarDOF"], 0)]
+    De[~allUsed] = 0.0
+    qe = np.matmul(arrays["k"], np.matmul(arrays["T"], De))
+    qe[rows,:,columns] += qF
+
+    return {"Du" : Du,
+            "Dk" : Dk,
+            "R"  : R,
+            "qe" : qe}
+
+# Modelo con un caso de carga por posicion, para escribir el .post.res
+# con IOFiles.ResultsWriter
+def InfluenceModel(model, positions, lines) :
+
+    barIDs = model["Arrays"]["BarIDs"]
+    loadCases = [{"Name" : "Carga en la barra %d, x = %.3f m (s = %.3f m)" % (barIDs[row], x, s)}
+                 for row, x, s in zip(positions["Row"].tolist(), positions["X"].tolist(), positions["S"].tolist())]
+
+    return dict(model, Arrays=dict(model["Arrays"], qe=lines["qe"]), LoadCases=loadCases)
+
+# Funcion ExportInfluenceTable
+#   Tabla CSV de ordenadas: una fila por posicion, una columna por reaccion
+#   de los apoyos y por fuerza en las barras de members
+def ExportInfluenceTable(tableFileName, model, dofData, positions, lines, members=None) :
+
+    arrays = model["Arrays"]
+    dofArray = dofData["DOFArray"]
+    dofU = dofData["UnknownDOFCount"]
+    nodeNumbers = arrays["NodeNumbers"]
+    barIDs = arrays["BarIDs"]
+
+    names = ["Position", "S", "Bar", "X"]
+    values = [np.arange(1, positions["S"].shape[0] + 1), positions["S"], barIDs[positions["Row"]], positions["X"]]
+    formats = ["%d", "%.6g", "%d", "%.6g"]
+
+    # Reacciones de los GDL conocidos, en el orden de los nodos
+    for node, direction in zip(*np.nonzero(dofArray >= dofU)) :
+        names.append(["RX", "RY", "MZ"][direction] + " " + str(nodeNumbers[node]))
+        values.append(lines["R"][dofArray[node,direction] - dofU])
+        formats.append("%.6e")
+
+    # Fuerzas en las barras (mismos signos que el .post.res)
+    if members is None :
+        memberRows = np.arange(barIDs.shape[0])
+    else :
+        memberRows = md.LookupRows(md.IDLookup(barIDs, "Barra"), members, "la barra", "Los miembros")
+    endForces = io.BarEndForces(dict(model, Arrays=dict(arrays, qe=lines["qe"])), slice(None))
+    for row in memberRows.tolist() :
+        results = [("N", endForces["Axial"][0])]
+        if arrays["TypeCode"][row] == md.TYPE_FRAME :
+            results += [("V", endForces["Shear"][0]), ("M1", endForces["Moment"][0]), ("M2", endForces["Moment"][1])]
+        for name, forces in results :
+            names.append(name + " " + str(barIDs[row]))
+            values.append(forces[row] + 0.0)
+            formats.append("%.6e")
+
+    with open(tableFileName, "w") as tableFile :
+        tableFile.write(",".join(names) + "\n")
+        tableFile.write(io.FormatRows(",".join(formats) + "\n", values))
+
+    return
+
+# Corrida completa sobre un documento (ver arriba)
+def RunInfluence(fileName, pathBars, step=INFLUENCE_STEP, members=None, method="auto", options=None) :
+
+    monitor = ins.PipelineMonitor()
+    log = ins.LogFile(fileName + ".influence.log", True)
+
+    try :
+        with monitor.Stage("Lectura") :
+            model = io.ReadModel(fileName + ".dat")
+
+        with monitor.Stage("Matrices elementales") :
+            dofData = rt.GenerateDOF(model)
+            rt.GenerateElementsDOF(model,dofData)
+            rt.GenerateElementMatrices(model,dofData)
+
+        with monitor.Stage("Ensamble") as stage :
+            K = sl.AssembleStiffnessMatrix(model,dofData)
+            stage.update(ins.MatrixInfo("K11", K["K11"]))
+
+        with monitor.Stage("Lineas de influencia") as stage :
+            positions = LoadPath(model, pathBars, step)
+            lines = InfluenceLines(model, dofData, K, positions, method, options)
+            stage["Posiciones"] = int(positions["S"].shape[0])
+            stage["Metodo"] = K["Factorization"]["Method"]
+
+        with monitor.Stage("Escritura de resultados") :
+            ExportInfluenceTable(fileName + ".influence.csv", model, dofData, positions, lines, members)
+            influenceModel = InfluenceModel(model, positions, lines)
+            writer = io.ResultsWriter(fileName + ".influence.post.res", influenceModel)
+            writer.SubmitDisplacements(lines, dofData)
+            writer.SubmitReactions(lines["R"], dofData)
+            writer.SubmitBarForces()
+            error = writer.Close()
+            if error is not None :
+                raise RuntimeError("No se pudo escribir " + fileName + ".influence.post.res\n" + error)
+
+        message = "Lineas de influencia sobre " + str(len(pathBars)) + " barras\n"
+        for name in ["Ensamble", "Lineas de influencia"] :
+            message = message + name + "\n" + monitor.StageMessage(name) + "\n"
+        message = message + monitor.SummaryMessage()
+        log.Write(message)
+    except Exception :
+        import traceback
+        log.Write("ERROR\n" + traceback.format_exc())
+        raise
+    finally :
+        log.Close()
+
+    return positions, lines
+
+if __name__ == "__main__" :
+
+    arguments = sys.argv[1:]
+    options = {"path" : [], "step" : [], "members" : [], "method" : []}
+    fileName = None
+    name = None
+    for argument in arguments :
+        if argument.startswith("--") and argument[2:] in options :
+            name = argument[2:]
+        elif name is not None :
+            options[name].append(argument)
+        elif fileName is None :
+            fileName = argument
+
+    if fileName is None or not options["path"] :
+        print("Uso: python Influence.py documento --path barra barra ... [--step s]")
+        print("                         [--members barra ...] [--method metodo]")
+        sys.exit(1)
+
+    RunInfluence(fileName,
+                 [int(bar) for bar in options["path"]],
+                 float(options["step"][0]) if options["step"] else INFLUENCE_STEP,
+                 [int(bar) for bar in options["members"]] or None,
+                 options["method"][0] if options["method"] else "auto")
@@ -0,0 +1,226 @@
+import json
+import sys
+import time
+
+try :
+    import resource
+except ImportError :    # Windows
+    resource = None
+
+# Instrumentacion del pipeline
+#
+#   Mide cada etapa de main.py (lectura, GDL, matrices elementales,
+#   ensamble, solucion, reacciones, fuerzas elementales y escritura):
+#   tiempo de reloj, tiempo de CPU del proceso y memoria, mas los datos que
+#   la etapa agregue (tamanos de matrices, no ceros, metodo).
+#
+#   La memoria residente pico (ru_maxrss) es la marca maxima de todo el
+#   proceso, no de la etapa: en Daemon y Batch incluye los modelos
+#   anteriores. Por eso de cada etapa se guarda cuanto subio esa marca
+#   durante la etapa ("RSSGrowthMB", 0 si la etapa no paso del pico que ya
+#   tenia el proceso) y, aparte, el pico del proceso ("ProcessPeakRSSMB").
+#   Si tracemalloc esta activo (Benchmark.py suite) tambien se guarda la
+#   memoria pico de Python y NumPy durante la etapa ("TracedPeakMB").
+#   Tambien tiene el archivo .log (LogFile). Solo usa la biblioteca estandar.
+#
+#       monitor = PipelineMonitor()
+#       with monitor.Stage("Ensamble") as stage :
+#           K = sl.AssembleStiffnessMatrix(model,dofData)
+#           stage.update(MatrixInfo("K11", K["K11"]))
+#       log.Write(monitor.StageMessage("Ensamble"))
+#       monitor.Save(jsonFileName)
+
+# Memoria residente pico del proceso en MB desde que arranco (None si no se
+# puede medir)
+def PeakRSS() :
+
+    if resource is not None :
+        # ru_maxrss esta en kB en Linux y en bytes en macOS
+        scale = 1.0 if sys.platform == "darwin" else 1024.0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1.0E6
+
+    if sys.platform == "win32" :
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure) :
+            _fields_ = [("cb", wintypes.DWORD),
+                        ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t),
+                        ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t),
+                        ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb) :
+            return counters.PeakWorkingSetSize / 1.0E6
+
+    return None
+
+# Tamano y no ceros de una matriz densa (numpy) o rala (scipy.sparse); de
+# un operador sin ensamblar (Solver.ElementOperator), tamano y memoria
+def MatrixInfo(name, matrix) :
+
+    if hasattr(matrix, "matvec") :
+        return {name + " tamano"         : " x ".join(str(size) for size in matrix.shape),
+                name + " almacenamiento" : "sin ensamblar",
+                name + " memoria (MB)"   : round(matrix.nbytes / 1.0E6, 3)}
+
+    if hasattr(matrix, "nnz") :
+        nonZeros = int(matrix.nnz)
+        storage = "rala"
+    else :
+        nonZeros = int((matrix != 0).sum())
+        storage = "densa"
+
+    return {name + " tamano"         : " x ".join(str(size) for size in matrix.shape),
+            name + " no ceros"       : nonZeros,
+            name + " almacenamiento" : storage}
+
+# Clase LogFile
+#   Archivo .log con un solo handle abierto y con buffer durante toda la
+#   corrida (reportMessage abre y cierra el archivo en cada mensaje). Cada
+#   Write se vacia al disco para que el avance se vea en GiD mientras corre.
+#   Sin GiD los mensajes se imprimen en pantalla.
+#
+#   Vive aqui y no en IOFiles para que el primer renglon del .log se pueda
+#   escribir antes de importar NumPy
+LOG_BUFFER_SIZE = 1 << 16
+
+class LogFile :
+
+    def __init__(self, logFileName, GiD) :
+        self.GiD = GiD
+        self.logFile = open(logFileName, "w", buffering=LOG_BUFFER_SIZE) if GiD else None
+
+    def Write(self, message) :
+        if self.logFile is not None :
+            self.logFile.write(message)
+            self.logFile.flush()
+        else :
+            print(message)
+
+    def Close(self) :
+        if self.logFile is not None :
+            self.logFile.close()
+            self.logFile = None
+
+# Clase PipelineMonitor
+#   Registro de las etapas en el orden en que se ejecutan
+class PipelineMonitor :
+
+    def __init__(self) :
+        self.stages = []
+        self.start = time.perf_counter()
+        self.cpuStart = time.process_time()
+        self.rssStart = PeakRSS()
+
+    # Contexto que mide una etapa; regresa el diccionario de datos extra
+    # de la etapa para que el codigo medido lo llene
+    def Stage(self, name) :
+        return _StageTimer(self, name)
+
+    def Find(self, name) :
+        for stage in self.stages :
+            if stage["Name"] == name :
+                return stage
+        return None
+
+    # Renglones de texto para el .log con las mediciones de una etapa
+    def StageMessage(self, name) :
+
+        stage = self.Find(name)
+        message = "Tiempo:             %.3f s (CPU %.3f s)\n" % (stage["WallTime"], stage["CPUTime"])
+        if stage["ProcessPeakRSSMB"] is not None :
+            message = message + "Aumento de memoria: %.1f MB (pico del proceso %.1f MB)\n" % (stage["RSSGrowthMB"], stage["ProcessPeakRSSMB"])
+
+        for key, value in stage["Info"].items() :
+            values = value if isinstance(value, list) else [value]
+            value = ", ".join(("%.4g" % item) if isinstance(item, float) else str(item) for item in values)
+            message = message + "%-20s%s\n" % (key + ":", value)
+
+        return message
+
+    # Tabla resumen de todas las etapas para el final del .log
+    def SummaryMessage(self) :
+
+        total = time.perf_counter() - self.start
+        message = "Resumen de tiempos\n"
+        message = message + "%-32s %10s %10s %10s\n" % ("Etapa", "Reloj(s)", "CPU(s)", "+RSS(MB)")
+        for stage in self.stages :
+            rss = "" if stage["RSSGrowthMB"] is None else "%.1f" % stage["RSSGrowthMB"]
+            message = message + "%-32s %10.3f %10.3f %10s\n" % (stage["Name"], stage["WallTime"], stage["CPUTime"], rss)
+        message = message + "%-32s %10.3f %10.3f\n" % ("Total", total, time.process_time() - self.cpuStart)
+
+        processPeak = PeakRSS()
+        if processPeak is not None :
+            message = message + "Memoria pico del proceso: %.1f MB\n" % processPeak
+
+        return message
+
+    def Report(self) :
+        processPeak = PeakRSS()
+        return {"Stages"           : self.stages,
+                "WallTime"         : time.perf_counter() - self.start,
+                "CPUTime"          : time.process_time() - self.cpuStart,
+                "RSSGrowthMB"      : _Growth(self.rssStart, processPeak),
+                "ProcessPeakRSSMB" : processPeak}
+
+    # Archivo JSON con las mediciones (complemento del .log)
+    def Save(self, jsonFileName, extra=None) :
+
+        report = self.Report()
+        if extra is not None :
+            report.update(extra)
+
+        with open(jsonFileName, "w") as jsonFile :
+            json.dump(report, jsonFile, indent=2)
+
+        return
+
+class _StageTimer :
+
+    def __init__(self, monitor, name) :
+        self.monitor = monitor
+        self.name = name
+        self.info = {}
+
+    def __enter__(self) :
+        self.wallStart = time.perf_counter()
+        self.cpuStart = time.process_time()
+        self.rssStart = PeakRSS()
+
+        # Quien activa tracemalloc ya lo importo; si no, no se importa aqui
+        self.tracemalloc = sys.modules.get("tracemalloc")
+        if self.tracemalloc is not None and not self.tracemalloc.is_tracing() :
+            self.tracemalloc = None
+        if self.tracemalloc is not None :
+            self.tracemalloc.reset_peak()
+            self.tracedStart = self.tracemalloc.get_traced_memory()[0]
+
+        return self.info
+
+    def __exit__(self, excType, excValue, excTraceback) :
+        processPeak = PeakRSS()
+        self.monitor.stages.append({"Name"             : self.name,
+                                    "WallTime"         : time.perf_counter() - self.wallStart,
+                                    "CPUTime"          : time.process_time() - self.cpuStart,
+                                    "RSSGrowthMB"      : _Growth(self.rssStart, processPeak),
+                                    "ProcessPeakRSSMB" : processPeak,
+                                    "Failed"           : excType is not None,
+                                    "Info"             : self.info})
+        if self.tracemalloc is not None :
+            self.monitor.stages[-1]["TracedPeakMB"] = (self.tracemalloc.get_traced_memory()[1] - self.tracedStart) / 1.0E6
+        return False
+
+# Cuanto subio la memoria residente pico del proceso entre dos mediciones
+def _Growth(before, after) :
+    if before is None or after is None :
+        return None
+    return after - before
@@ -0,0 +1,403 @@
+import numpy as np
+
+# Representacion compacta del modelo
+#
+#   El modelo sigue siendo un diccionario con los keys de siempre
+#   ("Nodes", "Bars", "Materials", ...), pero los datos viven en arreglos
+#   contiguos de numpy guardados en model["Arrays"]:
+#
+#       "NodeNumbers"      (n)      Numero de cada nodo
+#       "Coords"           (n x 2)  Coordenadas X, Y
+#       "BarIDs"           (m)      Numero de cada barra
+#       "Connectivity"     (m x 2)  Renglones (en "NodeNumbers") de los nodos de la barra
+#       "TypeCode"         (m)      TYPE_TRUSS o TYPE_FRAME
+#       "PropertyRow"      (m)      Renglon de la propiedad de la barra
+#       "MaterialRow"      (m)      Renglon del material de la barra
+#       "PropertyIDs", "A", "I"              Tabla de propiedades
+#       "MaterialIDs", "E", "nu", "Density"  Tabla de materiales
+#       "RestrictedNodes"  (r)      Numero de nodo de cada apoyo
+#       "RestrictionFlags" (r x 3)  TX, TY, RZ (1 restringido, 0 libre)
+#
+#   y los resultados por barra que generan Routines y Solver:
+#
+#       "BarDOF"  (m x 6)      GDL de la barra (-1 en los espacios no usados)
+#       "Length"  (m)          Longitud
+#       "k", "T"  (m x 6 x 6)  Matrices local y de transformacion
+#                              (las TRUSS ocupan el bloque de 4 x 4)
+#       "qF"      (m x 6 x N)  Fuerzas de empotramiento (N casos de carga)
+#       "HasqF"   (m)          La barra tiene cargas
+#       "qe"      (m x 6 x N)  Fuerzas elementales
+#
+#   Cada caso de carga guarda sus cargas en loadCase["Arrays"]:
+#
+#       "NodeID"      (k)      Nodo cargado
+#       "NodalForces" (k x 3)  FX, FY, MZ
+#       "BarID"       (l)      Barra cargada
+#       "BarLoads"    (l x 4)  a, wa, b, wb
+#
+#   "Nodes", "Bars", "Restrictions" y las cargas de cada caso son vistas
+#   (RecordList) sobre estos arreglos: cada renglon se presenta como un
+#   diccionario, de modo que el codigo que lee model["Bars"] sigue
+#   funcionando sin guardar un diccionario por barra.
+
+TYPE_TRUSS = 0
+TYPE_FRAME = 1
+TYPE_NAMES = ["TRUSS", "FRAME"]
+
+# GDL por extremo de barra segun el tipo
+BAR_END_DOF = np.array([2, 3])
+
+# Arreglos de cada caso de carga
+CASE_ARRAY_KEYS = ["NodeID", "NodalForces", "BarID", "BarLoads"]
+
+_MISSING = object()
+
+# Vista de un renglon de un RecordList con interfaz de diccionario
+class Record :
+
+    __slots__ = ("_records", "_row")
+
+    def __init__(self, records, row) :
+        self._records = records
+        self._row = row
+
+    def __getitem__(self, key) :
+        value = self._records._Value(self._row, key)
+        if value is _MISSING :
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value) :
+        self._records._SetValue(self._row, key, value)
+
+    def __contains__(self, key) :
+        return self._records._Value(self._row, key) is not _MISSING
+
+    def __iter__(self) :
+        return iter(self.keys())
+
+    def __len__(self) :
+        return len(self.keys())
+
+    def __eq__(self, other) :
+        return dict(self.items()) == other
+
+    def __repr__(self) :
+        return repr(dict(self.items()))
+
+    def get(self, key, default=None) :
+        value = self._records._Value(self._row, key)
+        return default if value is _MISSING else value
+
+    def update(self, values) :
+        for key in values :
+            self[key] = values[key]
+
+    def keys(self) :
+        return [key for key in self._records._Keys(self._row)]
+
+    def items(self) :
+        return [(key, self[key]) for key in self.keys()]
+
+# Lista de renglones sobre arreglos columna
+#
+#   fields: diccionario key -> funcion(row) que regresa el valor del
+#           renglon, o _MISSING si el renglon no tiene ese key
+#   setters: diccionario key -> funcion(row, value) para los keys que se
+#            guardan de regreso en los arreglos. Cualquier otro key que se
+#            asigne se guarda aparte, solo para ese renglon.
+class RecordList :
+
+    def __init__(self, count, fields, setters=None) :
+        self._count = count
+        self._fields = fields
+        self._setters = {} if setters is None else setters
+        self._extras = {}
+
+    def __len__(self) :
+        return self._count
+
+    def __getitem__(self, row) :
+        if isinstance(row, slice) :
+            return [Record(self, i) for i in range(*row.indices(self._count))]
+        if row < 0 :
+            row += self._count
+        if row < 0 or row >= self._count :
+            raise IndexError("RecordList index out of range")
+        return Record(self, row)
+
+    def __iter__(self) :
+        for row in range(self._count) :
+            yield Record(self, row)
+
+    def _Value(self, row, key) :
+        extras = self._extras.get(row)
+        if extras is not None and key in extras :
+            return extras[key]
+        field = self._fields.get(key)
+        if field is None :
+            return _MISSING
+        return field(row)
+
+    def _SetValue(self, row, key, value) :
+        setter = self._setters.get(key)
+        if setter is not None :
+            setter(row, value)
+        else :
+            self._extras.setdefault(row, {})[key] = value
+
+    def _Keys(self, row) :
+        keys = [key for key in self._fields if self._fields[key](row) is not _MISSING]
+        extras = self._extras.get(row, {})
+        return keys + [key for key in extras if key not in self._fields]
+
+# Funcion ModelFromRecords
+#   Construye el modelo compacto a partir de listas de diccionarios
+#   (formato de renglones de ReadDataFile)
+#
+#   Entradas:
+#       nodes, bars, materials, properties, restrictions: listas de diccionarios
+#       loadCases: lista de {"Name", "NodalForces", "BarForces"}
+#
+#   Salidas:
+#       model: diccionario del modelo con "Arrays" y vistas
+def ModelFromRecords(nodes, bars, materials, properties, restrictions, loadCases) :
+
+    arrays = {"NodeNumbers"      : np.array([node["Number"] for node in nodes], dtype=np.int64),
+              "Coords"           : np.array([[node["X"], node["Y"]] for node in nodes], dtype=float).reshape(-1,2),
+              "BarIDs"           : np.array([bar["ID"] for bar in bars], dtype=np.int64),
+              "BarNodes"         : np.array([[bar["Node1"], bar["Node2"]] for bar in bars], dtype=np.int64).reshape(-1,2),
+              "BarTypes"         : [bar["Type"] for bar in bars],
+              "BarPropertyIDs"   : np.array([bar["PropertyID"] for bar in bars], dtype=np.int64),
+              "BarMaterialIDs"   : np.array([bar["MaterialID"] for bar in bars], dtype=np.int64),
+              "MaterialIDs"      : np.array([material["ID"] for material in materials], dtype=np.int64),
+              "MaterialNames"    : [material["Name"] for material in materials],
+              "E"                : np.array([material["E"] for material in materials], dtype=float),
+              "nu"               : np.array([material["nu"] for material in materials], dtype=float),
+              "Density"          : np.array([material["Density"] for material in materials], dtype=float),
+              "PropertyIDs"      : np.array([prop["ID"] for prop in properties], dtype=np.int64),
+              "PropertyNames"    : [prop["Name"] for prop in properties],
+              "A"                : np.array([prop["A"] for prop in properties], dtype=float),
+              "I"                : np.array([prop["I"] for prop in properties], dtype=float),
+              "RestrictedNodes"  : np.array([rest["Node"] for rest in restrictions], dtype=np.int64),
+              "RestrictionFlags" : np.array([[rest["TX"], rest["TY"], rest["RZ"]] for rest in restrictions], dtype=np.int8).reshape(-1,3)}
+
+    caseArrays = []
+    for loadCase in loadCases :
+        nodalForces = loadCase["NodalForces"]
+        barForces = loadCase["BarForces"]
+        caseArrays.append({"Name"        : loadCase["Name"],
+                           "NodeID"      : np.array([force["NodeID"] for force in nodalForces], dtype=np.int64),
+                           "NodalForces" : np.array([[force["FX"], force["FY"], force["MZ"]] for force in nodalForces], dtype=float).reshape(-1,3),
+                           "BarID"       : np.array([force["BarID"] for force in barForces], dtype=np.int64),
+                           "BarLoads"    : np.array([[force["a"], force["wa"], force["b"], force["wb"]] for force in barForces], dtype=float).reshape(-1,4)})
+
+    return ModelFromArrays(arrays, caseArrays)
+
+# Funcion ModelFromArrays
+#   Construye el modelo compacto a partir de los arreglos leidos
+#
+#   Entradas:
+#       arrays: diccionario con los arreglos de ModelFromRecords
+#               ("BarNodes", "BarTypes", "BarPropertyIDs" y "BarMaterialIDs"
+#               traen numeros de nodo, nombres de tipo e IDs; aqui se
+#               convierten a "Connectivity", "TypeCode", "PropertyRow" y
+#               "MaterialRow")
+#       caseArrays: lista de diccionarios con "Name", "NodeID",
+#                   "NodalForces", "BarID" y "BarLoads" por caso de carga
+#
+#   Salidas:
+#       model: diccionario del modelo con "Arrays" y vistas
+def ModelFromArrays(arrays, caseArrays) :
+
+    arrays = dict(arrays)
+
+    nodeLookup     = IDLookup(arrays["NodeNumbers"], "Nodo")
+    materialLookup = IDLookup(arrays["MaterialIDs"], "Material")
+    propertyLookup = IDLookup(arrays["PropertyIDs"], "Propiedad")
+    barLookup      = IDLookup(arrays["BarIDs"], "Barra")
+
+    barTypes = np.asarray(arrays.pop("BarTypes"))
+    typeCode = np.full(barTypes.shape[0], -1, dtype=np.int8)
+    for code in range(len(TYPE_NAMES)) :
+        typeCode[barTypes == TYPE_NAMES[code]] = code
+    if np.any(typeCode < 0) :
+        row = int(np.flatnonzero(typeCode < 0)[0])
+        raise ValueError("La barra " + str(arrays["BarIDs"][row]) + " tiene un tipo desconocido: " + str(barTypes[row]))
+
+    barIDs = arrays["BarIDs"]
+    barNodes = arrays.pop("BarNodes")
+    arrays["Connectivity"] = LookupRows(nodeLookup, barNodes.ravel(), "el nodo", "La barra", np.repeat(barIDs, 2)).reshape(-1,2)
+    arrays["TypeCode"]     = typeCode
+    arrays["PropertyRow"]  = LookupRows(propertyLookup, arrays.pop("BarPropertyIDs"), "la propiedad", "La barra", barIDs)
+    arrays["MaterialRow"]  = LookupRows(materialLookup, arrays.pop("BarMaterialIDs"), "el material", "La barra", barIDs)
+    LookupRows(nodeLookup, arrays["RestrictedNodes"], "el nodo", "Un apoyo")
+
+    for case in caseArrays :
+        owner = "Una carga del caso " + case["Name"]
+        LookupRows(nodeLookup, case["NodeID"], "el nodo", owner)
+        LookupRows(barLookup, case["BarID"], "la barra", owner)
+
+    return BuildModel(arrays, caseArrays)
+
+# Funcion BuildModel
+#   Arma el diccionario del modelo (vistas e indices) sobre arreglos ya
+#   convertidos y validados por ModelFromArrays (por ejemplo, los que se
+#   leen del cache binario de IOFiles)
+def BuildModel(arrays, caseArrays) :
+
+    loadCases = []
+    for case in caseArrays :
+        caseData = {key : case[key] for key in CASE_ARRAY_KEYS}
+        loadCases.append({"Name"        : case["Name"],
+                          "NodalForces" : NodalForceRecords(caseData),
+                          "BarForces"   : BarForceRecords(caseData),
+                          "Arrays"      : caseData})
+
+    model = {"Arrays"        : arrays,
+             "Nodes"         : NodeRecords(arrays),
+             "Bars"          : BarRecords(arrays),
+             "Materials"     : [{"ID"      : int(arrays["MaterialIDs"][row]),
+                                 "Name"    : arrays["MaterialNames"][row],
+                                 "E"       : float(arrays["E"][row]),
+                                 "nu"      : float(arrays["nu"][row]),
+                                 "Density" : float(arrays["Density"][row])} for row in range(arrays["MaterialIDs"].shape[0])],
+             "Properties"    : [{"ID"   : int(arrays["PropertyIDs"][row]),
+                                 "Name" : arrays["PropertyNames"][row],
+                                 "A"    : float(arrays["A"][row]),
+                                 "I"    : float(arrays["I"][row])} for row in range(arrays["PropertyIDs"].shape[0])],
+             "Restrictions"  : RestrictionRecords(arrays),
+             "NodalForces"   : loadCases[0]["NodalForces"],
+             "BarForces"     : loadCases[0]["BarForces"],
+             "LoadCases"     : loadCases,
+             "BarIndex"      : dict(zip(arrays["BarIDs"].tolist(), range(arrays["BarIDs"].shape[0]))),
+             "MaterialIndex" : dict(zip(arrays["MaterialIDs"].tolist(), range(arrays["MaterialIDs"].shape[0]))),
+             "PropertyIndex" : dict(zip(arrays["PropertyIDs"].tolist(), range(arrays["PropertyIDs"].shape[0])))}
+
+    return model
+
+# Indice vectorizado ID -> renglon (arreglo ordenado + permutacion)
+def IDLookup(IDs, name) :
+
+    IDs = np.asarray(IDs, dtype=np.int64)
+    order = np.argsort(IDs, kind="stable")
+    sortedIDs = IDs[order]
+
+    duplicated = np.flatnonzero(sortedIDs[1:] == sortedIDs[:-1])
+    if duplicated.size > 0 :
+        raise ValueError(name + " " + str(sortedIDs[duplicated[0]]) + " duplicada en el modelo")
+
+    return {"Sorted" : sortedIDs,
+            "Order"  : order}
+
+# Renglones de un arreglo de IDs, con error claro si alguno no existe
+#
+#   owner/ownerIDs identifican en el mensaje quien hace la referencia,
+#   por ejemplo owner = "La barra" y ownerIDs = arrays["BarIDs"]
+def LookupRows(lookup, IDs, what, owner="", ownerIDs=None) :
+
+    IDs = np.asarray(IDs, dtype=np.int64)
+    sortedIDs = lookup["Sorted"]
+
+    if sortedIDs.shape[0] == 0 :
+        position = np.zeros(IDs.shape, dtype=np.int64)
+        found = np.zeros(IDs.shape, dtype=bool)
+    else :
+        position = np.minimum(np.searchsorted(sortedIDs, IDs), sortedIDs.shape[0] - 1)
+        found = sortedIDs[position] == IDs
+
+    if not np.all(found) :
+        first = np.flatnonzero(~found)[0]
+        if ownerIDs is not None :
+            owner = owner + " " + str(ownerIDs[first])
+        raise ValueError(owner + " hace referencia a " + what + " " + str(IDs[first]) + ", que no existe en el modelo")
+
+    return lookup["Order"][position]
+
+# Vistas de renglones
+
+def _Column(array, cast) :
+    return lambda row : cast(array[row])
+
+def NodeRecords(arrays) :
+
+    coords = arrays["Coords"]
+    fields = {"Number" : _Column(arrays["NodeNumbers"], int),
+              "X"      : lambda row : float(coords[row,0]),
+              "Y"      : lambda row : float(coords[row,1])}
+
+    return RecordList(arrays["NodeNumbers"].shape[0], fields)
+
+def BarRecords(arrays) :
+
+    nodeNumbers = arrays["NodeNumbers"]
+    connectivity = arrays["Connectivity"]
+    typeCode = arrays["TypeCode"]
+
+    def size(row) :
+        return 2 * int(BAR_END_DOF[typeCode[row]])
+
+    def result(key, value) :
+        def getter(row) :
+            data = arrays.get(key)
+            if data is None :
+                return _MISSING
+            return value(data, row)
+        return getter
+
+    def barMatrices(row) :
+        if arrays.get("k") is None :
+            return _MISSING
+        s = size(row)
+        return {"k" : arrays["k"][row,:s,:s],
+                "T" : arrays["T"][row,:s,:s]}
+
+    def qF(row) :
+        if arrays.get("qF") is None or not arrays["HasqF"][row] :
+            return _MISSING
+        return arrays["qF"][row,:size(row),:]
+
+    fields = {"ID"          : _Column(arrays["BarIDs"], int),
+              "Node1"       : lambda row : int(nodeNumbers[connectivity[row,0]]),
+              "Node2"       : lambda row : int(nodeNumbers[connectivity[row,1]]),
+              "Type"        : lambda row : TYPE_NAMES[typeCode[row]],
+              "PropertyID"  : lambda row : int(arrays["PropertyIDs"][arrays["PropertyRow"][row]]),
+              "MaterialID"  : lambda row : int(arrays["MaterialIDs"][arrays["MaterialRow"][row]]),
+              "BarDOF"      : result("BarDOF", lambda data, row : data[row,:size(row)].tolist()),
+              "Length"      : result("Length", lambda data, row : float(data[row])),
+              "BarMatrices" : barMatrices,
+              "qF"          : qF,
+              "qe"          : result("qe", lambda data, row : data[row,:size(row),:])}
+
+    return RecordList(arrays["BarIDs"].shape[0], fields)
+
+def RestrictionRecords(arrays) :
+
+    flags = arrays["RestrictionFlags"]
+    fields = {"Node" : _Column(arrays["RestrictedNodes"], int),
+              "TX"   : lambda row : int(flags[row,0]),
+              "TY"   : lambda row : int(flags[row,1]),
+              "RZ"   : lambda row : int(flags[row,2])}
+
+    return RecordList(arrays["RestrictedNodes"].shape[0], fields)
+
+def NodalForceRecords(caseData) :
+
+    forces = caseData["NodalForces"]
+    fields = {"NodeID" : _Column(caseData["NodeID"], int),
+              "FX"     : lambda row : float(forces[row,0]),
+              "FY"     : lambda row : float(forces[row,1]),
+              "MZ"     : lambda row : float(forces[row,2])}
+
+    return RecordList(caseData["NodeID"].shape[0], fields)
+
+def BarForceRecords(caseData) :
+
+    loads = caseData["BarLoads"]
+    fields = {"BarID" : _Column(caseData["BarID"], int),
+              "a"     : lambda row : float(loads[row,0]),
+              "wa"    : lambda row : float(loads[row,1]),
+              "b"     : lambda row : float(loads[row,2]),
+              "wb"    : lambda row : float(loads[row,3])}
+
+    return RecordList(caseData["BarID"].shape[0], fields)
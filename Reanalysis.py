@@ -0,0 +1,202 @@
+import numpy as np
+import Solver as sl
+
+import collections
+import time
+
+# Reanalisis incremental
+#
+#   En un proceso que vive entre corridas (Daemon.py) se guarda, por archivo
+#   .dat, la factorizacion de K11 y las Ke de las barras con las que se
+#   hizo. En la siguiente corrida del mismo modelo:
+#
+#       "cargas"           Las Ke y los GDL no cambiaron: se reutiliza la
+#                          factorizacion y solo se hace la sustitucion
+#       "woodbury"         Cambiaron pocas barras (WOODBURY_MAX_BARS): se
+#                          corrige la factorizacion con un ajuste de rango
+#                          bajo, sin refactorizar
+#       "refactorizacion"  Cambiaron demasiadas barras: se factoriza de nuevo
+#       "completo"         No hay corrida previa o cambio la conectividad,
+#                          los apoyos o la numeracion de GDL
+#
+#   Ajuste de rango bajo (Woodbury). Si K11 = A + U C U^T, donde A es la K11
+#   factorizada, U selecciona los r GDL desconocidos de las barras que
+#   cambiaron y C (r x r) es la suma de sus Ke nuevas menos las Ke de A:
+#
+#       K11^(-1) b = A^(-1) b - Z (I + C U^T Z)^(-1) C U^T A^(-1) b
+#       Z = A^(-1) U       (r sustituciones con la factorizacion de A)
+#
+#   Esta forma no necesita invertir C, que es singular (modos de cuerpo
+#   rigido de las barras). Las barras que cambian se acumulan contra la
+#   misma factorizacion hasta que se excede el limite y se refactoriza.
+
+# Numero maximo de barras cambiadas (respecto a la factorizacion guardada)
+# para usar el ajuste de Woodbury en lugar de refactorizar
+WOODBURY_MAX_BARS = 20
+
+# Estado por modelo (ruta absoluta del .dat). Cada estado guarda las Ke y
+# la factorizacion de K11, asi que solo se conservan los STATE_LIMIT
+# modelos usados mas recientemente
+STATE_LIMIT = 4
+STATES = collections.OrderedDict()
+
+# Funcion ReuseFactorization
+#   Compara el modelo con el estado guardado y, si se puede, deja en
+#   K["Factorization"] la factorizacion reutilizada o ajustada
+#
+#   Entradas:
+#       K           Diccionario de AssembleStiffnessMatrix
+#       model       Modelo con las matrices elementales generadas
+#       dofData     Diccionario de GenerateDOF
+#       key         Llave del modelo en STATES
+#
+#   Salidas:
+#       info        {"Path", "ChangedBars", "Rank", "UpdateTime", "Saved"};
+#                   "Saved" es el tiempo de la factorizacion evitada menos
+#                   el del ajuste (None si se va a factorizar)
+def ReuseFactorization(K, model, dofData, key) :
+
+    start = time.perf_counter()
+    arrays = model["Arrays"]
+    state = STATES.get(key)
+
+    info = {"Path"        : "completo",
+            "ChangedBars" : None,
+            "Rank"        : 0,
+            "UpdateTime"  : 0.0,
+            "Saved"       : None}
+
+    if state is None :
+        return info
+
+    # Cambio la estructura: el estado ya no sirve y se reemplaza al final
+    if not _SameStructure(state, arrays, dofData) :
+        del STATES[key]
+        return info
+
+    STATES.move_to_end(key)
+    _ResetCounters(state["Factorization"])
+
+    changed = np.flatnonzero(np.any(arrays["Ke"] != state["Ke"], axis=(1,2)))
+    info["ChangedBars"] = int(changed.shape[0])
+
+    if changed.shape[0] == 0 :
+        info["Path"] = "cargas"
+        K["Factorization"] = state["Factorization"]
+
+    elif changed.shape[0] <= WOODBURY_MAX_BARS :
+        deltaKe = arrays["Ke"][changed] - state["Ke"][changed]
+        try :
+            factorization = WoodburyFactorization(state["Factorization"], deltaKe, arrays["BarDOF"][changed], dofData["UnknownDOFCount"])
+        except np.linalg.LinAlgError :
+            # El ajuste es singular (p. ej. se formo un mecanismo): refactorizar
+            info["Path"] = "refactorizacion"
+            return info
+        info["Path"] = "woodbury"
+        info["Rank"] = factorization["Rank"]
+        K["Factorization"] = factorization
+
+    else :
+        info["Path"] = "refactorizacion"
+        return info
+
+    info["UpdateTime"] = time.perf_counter() - start
+    info["Saved"] = state["FactorTime"] - info["UpdateTime"]
+
+    return info
+
+# Funcion Remember
+#   Guarda la factorizacion recien calculada como base para la siguiente
+#   corrida (solo cuando se factorizo de nuevo)
+#
+#   Entradas:
+#       key         Llave del modelo en STATES
+#       model, dofData, K
+#       info        Salida de ReuseFactorization
+#       factorTime  Tiempo que tomo factorizar (s)
+def Remember(key, model, dofData, K, info, factorTime) :
+
+    if info["Path"] in ["cargas", "woodbury"] :
+        return
+
+    arrays = model["Arrays"]
+    STATES.pop(key, None)
+    STATES[key] = {"DOFCount"        : dofData["DOFCount"],
+                   "UnknownDOFCount" : dofData["UnknownDOFCount"],
+                   "DOFArray"        : dofData["DOFArray"].copy(),
+                   "BarDOF"          : arrays["BarDOF"].copy(),
+                   "Ke"              : arrays["Ke"].copy(),
+                   "Factorization"   : K["Factorization"],
+                   "FactorTime"      : factorTime}
+    while len(STATES) > STATE_LIMIT :
+        STATES.popitem(last=False)
+
+    return
+
+# Las factorizaciones iterativas (Solver.IterativeFactorization) acumulan
+# iteraciones y residuos por columna resuelta; al reutilizarlas se empieza
+# de cero para que el .log reporte solo los de esta corrida
+def _ResetCounters(factorization) :
+
+    for key in ["Iterations", "Residuals", "History"] :
+        if key in factorization :
+            factorization[key] = []
+
+    return
+
+def _SameStructure(state, arrays, dofData) :
+
+    return (state["DOFCount"] == dofData["DOFCount"] and
+            state["UnknownDOFCount"] == dofData["UnknownDOFCount"] and
+            np.array_equal(state["DOFArray"], dofData["DOFArray"]) and
+            np.array_equal(state["BarDOF"], arrays["BarDOF"]))
+
+# Funcion WoodburyFactorization
+#   Factorizacion de A + U C U^T a partir de la factorizacion de A
+#
+#   Entradas:
+#       base        Factorizacion de A (Solver.FactorizeStiffness)
+#       deltaKe     Cambio de las Ke de las barras (c x 6 x 6)
+#       barDOF      GDL de esas barras (c x 6, -1 sin usar)
+#       dofU        Numero de GDL desconocidos
+#
+#   Salidas:
+#       factorization   Diccionario compatible con SolveFactorized, con
+#                       "Rank" = r
+def WoodburyFactorization(base, deltaKe, barDOF, dofU) :
+
+    # GDL desconocidos que tocan las barras cambiadas
+    unknown = (barDOF >= 0) & (barDOF < dofU)
+    affected = np.unique(barDOF[unknown])
+    rank = affected.shape[0]
+    size = base["Size"]
+
+    # Las barras solo tocan GDL restringidos: K11 no cambia
+    if rank == 0 :
+        return dict(base, Rank=0)
+
+    # C: ensamble de las deltaKe sobre los GDL afectados (r x r)
+    local = np.searchsorted(affected, np.where(unknown, barDOF, 0))
+    rows = np.repeat(local, 6, axis=1).ravel()
+    cols = np.tile(local, (1, 6)).ravel()
+    used = (np.repeat(unknown, 6, axis=1) & np.tile(unknown, (1, 6))).ravel()
+    C = np.zeros((rank, rank))
+    np.add.at(C, (rows[used], cols[used]), deltaKe.ravel()[used])
+
+    # Z = A^(-1) U y la matriz de capacitancia S = I + C U^T Z
+    U = np.zeros((size, rank))
+    U[affected, np.arange(rank)] = 1.0
+    Z = sl.SolveFactorized(base, U)
+    S = np.eye(rank) + C @ Z[affected,:]
+    if not np.all(np.isfinite(S)) or np.linalg.cond(S) > 1.0E12 :
+        raise np.linalg.LinAlgError("Ajuste de Woodbury mal condicionado")
+
+    def solve(b) :
+        y = sl.SolveFactorized(base, b).reshape(size, -1)
+        w = np.linalg.solve(S, C @ y[affected,:])
+        return (y - Z @ w).reshape(np.shape(b))
+
+    return {"Method" : "woodbury(" + base["Method"] + ")",
+            "Size"   : size,
+            "Solve"  : solve,
+            "Rank"   : rank}
@@ -1,5 +1,5 @@
 import numpy as np
-import math
+import ModelData as md
 
 ## Funciones auxiliares
 DEFAULT_TOLERANCE = 0.00001
@@ -14,11 +14,20 @@ def eq(a,b,tolerance = DEFAULT_TOLERANCE):
     return abs(a-b) <= tolerance
 
 
+# Numero de nodos a partir del cual GenerateDOF reordena por omision
+REORDER_NODE_THRESHOLD = 300
+
 #   funcion GenerateDOF
 #   Calcula los grados de libertad nodales, primero los 
 #   desconocidos, al final los conocidos
 #
 #   Entrada:    model (Diccionario del modelo)
+#               reorder: None   -> GDL en el orden de los nodos del archivo
+#                        "rcm"  -> Reverse Cuthill-McKee sobre el grafo nodo-barra
+#                        "auto" -> "rcm" si hay REORDER_NODE_THRESHOLD nodos o mas
+#                                  y el RCM reduce el ancho de banda o el
+#                                  perfil sin aumentar el otro; si no, el
+#                                  orden del archivo
 #
 #   Salida:     dofData
 #               diccionario con los grados de libertad
@@ -28,57 +37,141 @@ def eq(a,b,tolerance = DEFAULT_TOLERANCE):
 #               "DOFArray"        : Matriz con numero de renglones el numero de nodos
 #                                   y 3 columnas representado el GDLx, GDLy y GDLrz
 #               "NodeNumberList"  : Lista con numero de nodos
+#               "NodeIndex"       : Diccionario numero de nodo -> renglon en
+#                                   "NodeNumberList" y "DOFArray"
+#               "Reordering"      : Reordenamiento aplicado ("none", "rcm" o
+#                                   "none (rcm descartado)" si "auto" probo el
+#                                   RCM y no mejoraba la numeracion)
+#               "NodeOrder"       : Renglones de los nodos en el orden de numeracion
+#               "BandwidthBefore", "ProfileBefore" : Ancho de banda y perfil de K11
+#                                   con la numeracion en el orden del archivo
+#               "Bandwidth", "Profile" : Ancho de banda y perfil de K11 finales
+#
+#   Los renglones de "DOFArray" siempre siguen el orden de los nodos del
+#   archivo, de modo que los resultados quedan referidos a la numeracion
+#   original de los nodos aunque se reordenen los GDL
 
-def GenerateDOF(model) :
-
-    dofList = []
-    nodeNumberList = []
+def GenerateDOF(model,reorder="auto") :
 
     # Extraer los nodos y las restricciones del modelo
-    nodes = model["Nodes"]
-    restrictions = model["Restrictions"]
-
-    # Inicializar el arreglo de nodos y DOF
-    for node in nodes:
-        nodeDOF = [-2, -2, -2]
-        nodeNumberList.append(node["Number"])
-        dofList.append(nodeDOF)
-
-
-    # Recorrer la lista de DOF para marcar los restringidos con -1
-    keys = ["TX", "TY", "RZ"]
-    for restriction in restrictions:
-        nodeNumber = restriction["Node"]
-        row = nodeNumberList.index(nodeNumber)
-        for key in keys:
-            value = restriction[key]
-            if value == 1: # Tengo restriccion
-                col = keys.index(key)
-                dofList[row][col] = -1
-
-    # Numerar los DOF desconocidos
-    dof = 0
-    for nodeDOF in dofList: #Lista de los 3 DOF por nodo
-        for col in range(0,3) :
-            if nodeDOF[col] == -2:
-                nodeDOF[col] = dof
-                dof += 1
-    unknownDOFCount = dof
-
-    # Numerar los DOF conocidos
-    for nodeDOF in dofList: #Lista de los 3 DOF por nodo
-        for col in range(0,3) :
-            if nodeDOF[col] == -1:
-                nodeDOF[col] = dof
-                dof += 1
-
-    dofData = {"DOFCount"        : dof,
+    arrays = model["Arrays"]
+    nodeNumbers = arrays["NodeNumbers"]
+    nodeCount = nodeNumbers.shape[0]
+
+    nodeNumberList = nodeNumbers.tolist()
+    nodeIndex = dict(zip(nodeNumberList, range(nodeCount)))
+
+    # Inicializar el arreglo de DOF con -2 (desconocido)
+    dofMarks = np.full((nodeCount,3),-2,dtype=np.int64)
+
+    # Marcar los restringidos con -1
+    restrictedRows = np.array([nodeIndex[number] for number in arrays["RestrictedNodes"].tolist()], dtype=np.int64)
+    flags = arrays["RestrictionFlags"]
+    for col in range(0,3) :
+        dofMarks[restrictedRows[flags[:,col] == 1], col] = -1
+
+    automatic = reorder == "auto"
+    if automatic :
+        reorder = "rcm" if nodeCount >= REORDER_NODE_THRESHOLD else None
+
+    # Numeracion en el orden del archivo
+    barNodeRows = arrays["Connectivity"]
+    naturalOrder = np.arange(nodeCount)
+    dofArray, unknownDOFCount = NumberDOF(dofMarks,naturalOrder)
+    bandwidthBefore, profileBefore = BandwidthProfile(model,barNodeRows,dofArray,unknownDOFCount)
+
+    nodeOrder = naturalOrder
+    bandwidth = bandwidthBefore
+    profile = profileBefore
+    reordering = "none"
+
+    if reorder == "rcm" :
+        rcmOrder = ReverseCuthillMcKee(nodeCount,barNodeRows)
+        rcmDOFArray, rcmUnknownDOFCount = NumberDOF(dofMarks,rcmOrder)
+        rcmBandwidth, rcmProfile = BandwidthProfile(model,barNodeRows,rcmDOFArray,rcmUnknownDOFCount)
+
+        # En "auto" el RCM se conserva solo si mejora la numeracion del archivo
+        better = (rcmBandwidth <= bandwidthBefore and rcmProfile <= profileBefore and
+                  (rcmBandwidth < bandwidthBefore or rcmProfile < profileBefore))
+        if automatic and not better :
+            reordering = "none (rcm descartado)"
+        else :
+            nodeOrder, dofArray, unknownDOFCount = rcmOrder, rcmDOFArray, rcmUnknownDOFCount
+            bandwidth, profile = rcmBandwidth, rcmProfile
+            reordering = "rcm"
+    elif reorder is not None :
+        raise ValueError("Reordenamiento de GDL desconocido: " + str(reorder))
+
+    dofData = {"DOFCount"        : 3 * nodeCount,
                "UnknownDOFCount" : unknownDOFCount,
-               "DOFArray"        : np.array(dofList),
-               "NodeNumberList"  : nodeNumberList}
+               "DOFArray"        : dofArray,
+               "NodeNumberList"  : nodeNumberList,
+               "NodeIndex"       : nodeIndex,
+               "Reordering"      : reordering,
+               "NodeOrder"       : np.asarray(nodeOrder),
+               "BandwidthBefore" : bandwidthBefore,
+               "ProfileBefore"   : profileBefore,
+               "Bandwidth"       : bandwidth,
+               "Profile"         : profile}
 
     return dofData
 
+# Numerar los GDL recorriendo los nodos en el orden nodeOrder,
+# primero los desconocidos (-2) y al final los conocidos (-1)
+def NumberDOF(dofMarks,nodeOrder) :
+
+    ordered = dofMarks[nodeOrder].ravel()
+    unknown = ordered == -2
+    unknownDOFCount = int(np.count_nonzero(unknown))
+
+    numbers = np.empty(ordered.shape[0], dtype=np.int64)
+    numbers[unknown] = np.arange(unknownDOFCount)
+    numbers[~unknown] = unknownDOFCount + np.arange(ordered.shape[0] - unknownDOFCount)
+
+    dofArray = np.empty_like(dofMarks)
+    dofArray[nodeOrder] = numbers.reshape(-1,3)
+
+    return dofArray, unknownDOFCount
+
+# Orden Reverse Cuthill-McKee del grafo nodo-barra
+def ReverseCuthillMcKee(nodeCount,barNodeRows) :
+
+    import scipy.sparse as sp
+    from scipy.sparse.csgraph import reverse_cuthill_mckee
+
+    n1 = barNodeRows[:,0]
+    n2 = barNodeRows[:,1]
+    rows = np.concatenate((n1,n2))
+    cols = np.concatenate((n2,n1))
+    graph = sp.csr_matrix((np.ones(rows.size), (rows, cols)), shape=(nodeCount,nodeCount))
+
+    return reverse_cuthill_mckee(graph, symmetric_mode=True)
+
+# Ancho de banda y perfil (envolvente inferior) de K11
+#
+#   bandwidth = max(i - j) para los K11[i,j] no nulos
+#   profile   = suma sobre los renglones de (i - primera columna no nula)
+def BandwidthProfile(model,barNodeRows,dofArray,unknownDOFCount) :
+
+    if unknownDOFCount == 0 :
+        return 0, 0
+
+    # GDL de cada barra (TRUSS solo acopla los 2 GDL de traslacion)
+    barDOF = np.concatenate((dofArray[barNodeRows[:,0]], dofArray[barNodeRows[:,1]]), axis=1)
+    isTruss = model["Arrays"]["TypeCode"] == md.TYPE_TRUSS
+    barDOF[isTruss,2] = unknownDOFCount
+    barDOF[isTruss,5] = unknownDOFCount
+
+    # Solo los GDL desconocidos forman parte de K11
+    barDOF = np.where(barDOF < unknownDOFCount, barDOF, unknownDOFCount)
+    barMin = barDOF.min(axis=1)
+
+    firstColumn = np.arange(unknownDOFCount + 1)
+    np.minimum.at(firstColumn, barDOF, barMin[:,None])
+    envelope = np.arange(unknownDOFCount) - firstColumn[:unknownDOFCount]
+
+    return int(envelope.max()), int(envelope.sum())
+
 # Rutinas del elemento armadura [k] [T]
 #
 #         | 1  0 -1  0 |
@@ -175,6 +268,72 @@ def Matrices_FRAME(A,E,I,L,C,S):
 
     return barMatrices
 
+# Rutinas por lotes [k] [T]
+#
+# Mismas matrices que Matrices_TRUSS y Matrices_FRAME, pero para m barras
+# a la vez: A, E, I, L, C, S son arreglos de longitud m y k, T son
+# arreglos de m x 4 x 4 (TRUSS) o m x 6 x 6 (FRAME)
+def BatchMatrices_TRUSS(A,E,L,C,S) :
+
+    m = L.shape[0]
+
+    # [k]
+    k = np.zeros((m,4,4))
+    EA_L = E*A/L
+    k[:,0,0] =  EA_L
+    k[:,0,2] = -EA_L
+    k[:,2,0] = -EA_L
+    k[:,2,2] =  EA_L
+
+    # [T]
+    T = np.zeros((m,4,4))
+    T[:,0,0] = C; T[:,0,1] = S
+    T[:,1,0] =-S; T[:,1,1] = C
+    T[:,2,2] = C; T[:,2,3] = S
+    T[:,3,2] =-S; T[:,3,3] = C
+
+    return {"k" : k,
+            "T" : T}
+
+def BatchMatrices_FRAME(A,E,I,L,C,S) :
+
+    m = L.shape[0]
+
+    # [k]
+    k = np.zeros((m,6,6))
+
+    # Componentes axiales
+    EA_L = E*A/L
+    k[:,0,0] =  EA_L; k[:,0,3] = -EA_L
+    k[:,3,0] = -EA_L; k[:,3,3] =  EA_L
+
+    # Componentes flexión
+    __2EI_L   = 2.0 * E * I / L
+    __4EI_L   = 2.0 * __2EI_L
+    __6EI_L2  = (__2EI_L + __4EI_L) / L
+    _12EI_L3  = 2 * __6EI_L2 / L
+
+    k[:,1,1] =  _12EI_L3; k[:,1,2] =  __6EI_L2; k[:,1,4] = -_12EI_L3; k[:,1,5] =  __6EI_L2
+    k[:,2,1] =  __6EI_L2; k[:,2,2] =  __4EI_L ; k[:,2,4] = -__6EI_L2; k[:,2,5] =  __2EI_L
+    k[:,4,1] = -_12EI_L3; k[:,4,2] = -__6EI_L2; k[:,4,4] =  _12EI_L3; k[:,4,5] = -__6EI_L2
+    k[:,5,1] =  __6EI_L2; k[:,5,2] =  __2EI_L ; k[:,5,4] = -__6EI_L2; k[:,5,5] =  __4EI_L
+
+    # [T]
+    T = np.zeros((m,6,6))
+    T[:,0,0] =  C; T[:,0,1] =  S
+    T[:,1,0] = -S; T[:,1,1] =  C
+    T[:,2,2] =  1.0
+    T[:,3,3] =  C; T[:,3,4] =  S
+    T[:,4,3] = -S; T[:,4,4] =  C
+    T[:,5,5] =  1.0
+
+    return {"k" : k,
+            "T" : T}
+
+# Matrices globales de todas las barras, Ke = Te^T * ke * Te (m x 6 x 6)
+def GlobalElementMatrices(k,T) :
+    return np.einsum("mji,mjk,mkl->mil", T, k, T, optimize=True)
+
 # Rutina que integra numericamente el caso de
 # una carga uniforme con magnitud variable desde a
 # hasta b (Caso General)
@@ -226,154 +385,303 @@ def FixedEndMoment_FRAME(L,a,wa,b,wb):
 
     return qF
 
+# Rutina por lotes de FixedEndMoment_FRAME
+#
+# Misma carga trapezoidal (wa en a, wb en b, positiva en -Y local) para n
+# cargas a la vez: L, a, wa, b, wb son arreglos de longitud n y qF es un
+# arreglo de n x 6. En lugar de la regla de Boole se usan las integrales
+# exactas, medidas desde el inicio de la carga (x = a + t, 0 <= t <= h,
+# h = b - a, e = L - a) para no perder precision en cargas cortas lejos
+# del nodo inicial:
+#
+#   x (L-x)^2 = g0 + g1 t + g2 t^2 + g3 t^3   (g = a e^2, e^2 - 2 a e, a - 2 e, 1)
+#   x^2 (L-x) = f0 + f1 t + f2 t^2 + f3 t^3   (f = a^2 e, 2 a e - a^2, e - 2 a, -1)
+#   w(x)      = wa + (wb - wa) t / h
+#
+#   MA =  1/L^2 sum_k g_k h^(k+1) (wa / (k+1) + (wb - wa) / (k+2))
+#   MB = -1/L^2 sum_k f_k h^(k+1) (wa / (k+1) + (wb - wa) / (k+2))
+#
+# Boole integra exacto polinomios de grado 5, y el integrando es de grado
+# 4, por lo que ambas dan el mismo resultado salvo redondeo. Las
+# verificaciones son las de FixedEndMoment_FRAME: a = b = 0 es carga en
+# toda la barra y las cargas con a >= b o b > L quedan en cero (se avisa
+# una sola vez cuantas son).
+def BatchFixedEndForces_FRAME(L,a,wa,b,wb) :
+
+    L  = np.asarray(L, dtype=float)
+    a  = np.asarray(a, dtype=float)
+    wa = np.asarray(wa, dtype=float)
+    b  = np.array(b, dtype=float)
+    wb = np.asarray(wb, dtype=float)
+
+    qF = np.zeros((L.shape[0],6))
+
+    # Verficaciones de seguridad
+    b, valid, inverted, beyond = CheckBarLoads(L,a,b)
+    if np.any(inverted) :
+        print("Error en carga, a >=b (" + str(int(inverted.sum())) + " cargas)")
+    if np.any(beyond) :
+        print("Error en carga, b > L (" + str(int(beyond.sum())) + " cargas)")
+
+    L, a, wa, b, wb = L[valid], a[valid], wa[valid], b[valid], wb[valid]
+
+    h = b - a
+    e = L - a
+    g = [a*e**2, e**2 - 2.0*a*e, a - 2.0*e, 1.0]
+    f = [a**2*e, 2.0*a*e - a**2, e - 2.0*a, -1.0]
+
+    MA = 0.0
+    MB = 0.0
+    for k in range(0,4):
+        weight = h ** (k+1) * (wa / (k+1) + (wb-wa) / (k+2))
+        MA = MA + g[k] * weight
+        MB = MB + f[k] * weight
+
+    MA =  MA / (L ** 2.0)
+    MB = -MB / (L ** 2.0)
+
+    # Cortantes
+    R1 = wa * (b-a)
+    d1 = a + (b-a)/2.0
+    R2 = (wb-wa)*(b-a)/2.0
+    d2 = a + 2.0 * (b - a) / 3.0
+    VB = ( R1*d1 + R2 * d2 - MA - MB) / L
+    VA = R1 + R2 - VB
+
+    qF[valid,1] = VA
+    qF[valid,2] = MA
+    qF[valid,4] = VB
+    qF[valid,5] = MB
+
+    return qF
+
+# Rutina por lotes de fuerzas de empotramiento de cargas puntuales
+#
+# Carga puntual (px, py) en ejes locales a la distancia a del nodo
+# inicial, para n cargas a la vez; qF es un arreglo de n x 6:
+#   FRAME: empotrada en ambos extremos (b = L - a)
+#       qF = -[px b/L, py b^2 (3a+b)/L^3,  py a b^2/L^2,
+#              px a/L, py a^2 (a+3b)/L^3, -py a^2 b/L^2]
+#   TRUSS: simplemente apoyada, [u1, v1, u2, v2] en los primeros 4 lugares
+#       qF = -[px b/L, py b/L, px a/L, py a/L, 0, 0]
+def BatchPointLoadForces(typeCode,L,a,px,py) :
+
+    b = L - a
+    frame = typeCode == md.TYPE_FRAME
+
+    qF = np.zeros((L.shape[0],6))
+    qF[:,0] = -px * b / L
+    qF[:,1] = np.where(frame, -py * b**2 * (3.0*a + b) / L**3, -py * b / L)
+    qF[:,2] = np.where(frame, -py * a * b**2 / L**2, -px * a / L)
+    qF[:,3] = np.where(frame, -px * a / L, -py * a / L)
+    qF[:,4] = np.where(frame, -py * a**2 * (a + 3.0*b) / L**3, 0.0)
+    qF[:,5] = np.where(frame,  py * a**2 * b / L**2, 0.0)
+
+    return qF
+
+# Verificaciones de las cargas sobre barras (arreglos de longitud n)
+#
+#   a = b = 0 es carga en toda la barra (b = L). Regresa b corregida, las
+#   cargas validas y las que tienen a >= b o b > L. Las cargas de longitud
+#   cero (a = b dentro de la tolerancia) no son validas pero tampoco error
+def CheckBarLoads(L,a,b) :
+
+    b = np.array(b, dtype=float)
+    whole = eq(a,0.0) & eq(b,0.0)
+    b[whole] = L[whole]
+
+    inverted = ~whole & ge(a,b)
+    beyond = ~whole & ~inverted & gt(b,L)
+    valid = ~inverted & ~beyond & (b > a)
+
+    return b, valid, inverted, beyond
+
+# Cargas sobre barras FRAME de un caso de carga
+#
+#   Regresa los renglones de las barras y las columnas a, wa, b, wb de
+#   "BarLoads" (wa y wb en el sentido +Y local, como en el archivo); las
+#   cargas sobre TRUSS se descartan con un aviso
+def FrameBarLoads(model,case,barLookup=None) :
+
+    arrays = model["Arrays"]
+    if barLookup is None :
+        barLookup = md.IDLookup(arrays["BarIDs"], "Barra")
+
+    loadCase = model["LoadCases"][case]
+    barLoads = loadCase["Arrays"]["BarLoads"]
+    rows = md.LookupRows(barLookup, loadCase["Arrays"]["BarID"], "la barra", "Una carga del caso " + loadCase["Name"])
+
+    # Este tipo de caras solo funcionan con el FRAME
+    frame = arrays["TypeCode"][rows] == md.TYPE_FRAME
+    if not np.all(frame) :
+        print("Aviso: Las cargas sobre barras solo aplican para elementos tipo FRAME")
+        print("Se ignoran " + str(int((~frame).sum())) + " cargas")
+
+    barLoads = barLoads[frame]
+
+    return rows[frame], barLoads[:,0], barLoads[:,1], barLoads[:,2], barLoads[:,3]
+
 # Utilerias
 
 # Generar la lista de DOF en cada barra
-# y pegarlas al diccionario de cada barra
+#
+# model["Arrays"]["BarDOF"] (m x 6): GDL de los extremos de cada barra,
+# las TRUSS usan los primeros 4 (x1, y1, x2, y2) y el resto queda en -1
 def GenerateElementsDOF(model,dofData):
 
-    # extraer la lista de barras del modelo
-    bars = model["Bars"]
+    # extraer la conectividad y el tipo de las barras
+    arrays = model["Arrays"]
+    connectivity = arrays["Connectivity"]
+    isTruss = arrays["TypeCode"] == md.TYPE_TRUSS
 
-    # Extraer la lista de nodos y sus DOF
-    nodeNumberList = dofData["NodeNumberList"]
+    # Extraer los DOF de los nodos
     dofArray = dofData["DOFArray"]
 
-    # Recorrido por todas las barras
-    for bar in bars :
-        barNodes = [ bar["Node1"] , bar["Node2"] ]
-        type = bar["Type"]
+    barDOF = np.concatenate((dofArray[connectivity[:,0]], dofArray[connectivity[:,1]]), axis=1)
+    barDOF[isTruss] = np.concatenate((barDOF[isTruss][:,[0,1,3,4]],
+                                      np.full((np.count_nonzero(isTruss),2),-1,dtype=np.int64)), axis=1)
 
-        barDOF = []
-        dofPerBarEnd = 0
-        if type == "TRUSS" :
-            dofPerBarEnd = 2
-        else :
-            dofPerBarEnd = 3
-
-        for barNode in barNodes :
-            row = nodeNumberList.index(barNode)
-            for ii in range(0,dofPerBarEnd) :
-                dof = int(dofArray[row,ii])
-                barDOF.append(dof)
-
-        bar.update({"BarDOF" : barDOF})
+    arrays["BarDOF"] = barDOF
 
     return
 
 # Generar todas las matrices elementales
-# y pegarlas al diccionario de cada barra
+#
+# model["Arrays"]["k"], ["T"], ["Ke"] (m x 6 x 6) y ["Length"] (m),
+# calculadas por lotes para todas las barras de cada tipo
 def GenerateElementMatrices(model,dofData):
 
-    # extraer la lista de barras
-    bars = model["Bars"]
-
-    # extraer el ordemiento de los nodos
-    nodeNumberList = dofData["NodeNumberList"]
+    # extraer los arreglos del modelo
+    arrays = model["Arrays"]
+    barCount = arrays["BarIDs"].shape[0]
     
-    # extraer del modelo la lista nodos
-    # para calcular L, C, S
-    nodes = model["Nodes"]
-
-    # extraer la lista de propiedades
-    # para extraer A,I
-    properties = model["Properties"]
-
-    # extraer la lista de materiales
-    # para extraer E
-    materials = model["Materials"]
-
-    for bar in bars :
-        type = bar["Type"] #TRUSS o FRAME
-        barNodes = [ bar["Node1"], bar["Node2"] ]
-        xcoord = []
-        ycoord = []
-
-        for barNode in barNodes:
-            row = nodeNumberList.index(barNode)
-            xcoord.append( nodes[row]["X"] )
-            ycoord.append( nodes[row]["Y"] )
-        
-        dx = xcoord[1] - xcoord[0]
-        dy = ycoord[1] - ycoord[0]
-        L = math.sqrt( dx**2.0 + dy**2.0)
-        C = dx / L
-        S = dy / L
-
-        propertyID = bar["PropertyID"]
-        materialID = bar["MaterialID"]
-
-        barProperty = []
-        barMaterial = []
-
-        for property in properties:
-            if propertyID == property["ID"] :
-                barProperty = property
-                break
-
-        for material in materials :
-            if materialID == material["ID"] :
-                barMaterial = material
-                break
-
-        barMatrices = []
-        if type == "TRUSS" :
-            barMatrices = Matrices_TRUSS(barProperty["A"],
-                                         barMaterial["E"],
-                                         L, C, S)
-        elif type ==  "FRAME" :
-            barMatrices = Matrices_FRAME(barProperty["A"],
-                                         barMaterial["E"],
-                                         barProperty["I"],
-                                         L,C,S)
-
-        bar.update({"BarMatrices" : barMatrices})
-        bar.update({"Length" : L})
+    # coordenadas de los nodos de cada barra para calcular L, C, S
+    coords = arrays["Coords"]
+    connectivity = arrays["Connectivity"]
+    delta = coords[connectivity[:,1]] - coords[connectivity[:,0]]
+    L = np.hypot(delta[:,0], delta[:,1])
+
+    if np.any(L == 0.0) :
+        row = int(np.flatnonzero(L == 0.0)[0])
+        raise ValueError("La barra " + str(arrays["BarIDs"][row]) + " tiene longitud cero")
+
+    C = delta[:,0] / L
+    S = delta[:,1] / L
+
+    # propiedades (A, I) y material (E) de cada barra
+    A = arrays["A"][arrays["PropertyRow"]]
+    I = arrays["I"][arrays["PropertyRow"]]
+    E = arrays["E"][arrays["MaterialRow"]]
+
+    kArray = np.zeros((barCount,6,6))
+    TArray = np.zeros((barCount,6,6))
+
+    truss = arrays["TypeCode"] == md.TYPE_TRUSS
+    barMatrices = BatchMatrices_TRUSS(A[truss], E[truss], L[truss], C[truss], S[truss])
+    kArray[truss,:4,:4] = barMatrices["k"]
+    TArray[truss,:4,:4] = barMatrices["T"]
+
+    frame = arrays["TypeCode"] == md.TYPE_FRAME
+    barMatrices = BatchMatrices_FRAME(A[frame], E[frame], I[frame], L[frame], C[frame], S[frame])
+    kArray[frame] = barMatrices["k"]
+    TArray[frame] = barMatrices["T"]
+
+    arrays["k"] = kArray
+    arrays["T"] = TArray
+    arrays["Ke"] = GlobalElementMatrices(kArray, TArray)
+    arrays["Length"] = L
 
     return
 
 # Generar los vectores de empotramiento perfecto elementales
-# y pegarselos al diccionario de la barra
+#
+# model["Arrays"]["qF"] es un arreglo de m x 6 x N, una columna por cada
+# caso de carga de model["LoadCases"], y model["Arrays"]["HasqF"] marca
+# las barras que tienen carga
+#
+# Todas las cargas de un caso se calculan juntas (BatchFixedEndForces_FRAME)
+# y se suman a sus barras con np.add.at (una barra puede tener varias)
 def GenerateElementFixedEndForces(model) :
 
-    # Extraer del modelo la informacion de los bar forces
-    barForces = model["BarForces"]
+    # Extraer los casos de carga del modelo
+    loadCases = model["LoadCases"]
+    caseCount = len(loadCases)
 
-    # Extraer los diccionarios de las barras
-    bars = model["Bars"]
+    # Extraer los arreglos de las barras y su indice
+    arrays = model["Arrays"]
+    barLookup = md.IDLookup(arrays["BarIDs"], "Barra")
+    barCount = arrays["BarIDs"].shape[0]
+    lengths = arrays["Length"]
 
-    for barForce in barForces :
+    qFArray = np.zeros((barCount,6,caseCount))
+    hasqF = np.zeros(barCount, dtype=bool)
 
-        barID = barForce["BarID"]
-        appliedBarForce = []
+    for case in range(caseCount) :
 
-        # Buscar la barra en la lista de barras
-        for bar in bars :
-            if barID == bar["ID"] :
-                appliedBarForce = bar
-                break
-        
-        # Este tipo de caras solo funcionan con el FRAME
-        if appliedBarForce["Type"] == "FRAME" :
-            L  = appliedBarForce["Length"]
-            a  =  barForce["a"]
-            wa = -barForce["wa"] # Sentido -Y local es positivo en las FixedEndMoment_FRAME
-            b  =  barForce["b"]
-            wb = -barForce["wb"] #  Sentido -Y local es positivo en las FixedEndMoment_FRAME
-            qF = FixedEndMoment_FRAME(L,a,wa,b,wb)
-
-            # Tiene o no tiene qF este barra?
-            if appliedBarForce.get("qF") is not None: # Sumarlo
-                prev_qf = appliedBarForce["qF"]
-                qF = qF + prev_qf
-                appliedBarForce["qF"] = qF
-            else :
-                appliedBarForce.update({"qF" : qF})
-            
-        else :
-            print("Aviso: Las cargas sobre barras solo aplican para elementos tipo FRAME")
-            print("La carga será ignorada")
+        # Cargas del caso sobre barras FRAME
+        rows, a, wa, b, wb = FrameBarLoads(model,case,barLookup)
+        L  = lengths[rows]
+        wa = -wa # Sentido -Y local es positivo en las FixedEndMoment_FRAME
+        wb = -wb #  Sentido -Y local es positivo en las FixedEndMoment_FRAME
+        qF = BatchFixedEndForces_FRAME(L,a,wa,b,wb)
+
+        np.add.at(qFArray[:,:,case], rows, qF)
+        hasqF[rows] = True
+
+    arrays["qF"] = qFArray
+    arrays["HasqF"] = hasqF
 
     return
 
+# Funcion GenerateElementFixedEndForcesByLoads
+#   Version original, una carga a la vez con FixedEndMoment_FRAME (regla de
+#   Boole). Produce los mismos qF que GenerateElementFixedEndForces; se
+#   conserva como referencia para comparar resultados y tiempos (ver
+#   Benchmark.py)
+def GenerateElementFixedEndForcesByLoads(model) :
+
+    # Extraer los casos de carga del modelo
+    loadCases = model["LoadCases"]
+    caseCount = len(loadCases)
+
+    # Extraer los arreglos de las barras y su indice
+    arrays = model["Arrays"]
+    barIndex = model["BarIndex"]
+    barCount = arrays["BarIDs"].shape[0]
+    lengths = arrays["Length"]
+    typeCode = arrays["TypeCode"]
+
+    qFArray = np.zeros((barCount,6,caseCount))
+    hasqF = np.zeros(barCount, dtype=bool)
+
+    for case in range(caseCount) :
 
+        # Extraer del caso la informacion de los bar forces
+        caseData = loadCases[case]["Arrays"]
+        barLoads = caseData["BarLoads"]
+        barIDs = caseData["BarID"].tolist()
+
+        for load in range(len(barIDs)) :
+
+            row = barIndex[barIDs[load]]
+            
+            # Este tipo de caras solo funcionan con el FRAME
+            if typeCode[row] == md.TYPE_FRAME :
+                L  = lengths[row]
+                a  =  barLoads[load,0]
+                wa = -barLoads[load,1] # Sentido -Y local es positivo en las FixedEndMoment_FRAME
+                b  =  barLoads[load,2]
+                wb = -barLoads[load,3] #  Sentido -Y local es positivo en las FixedEndMoment_FRAME
+                qF = FixedEndMoment_FRAME(L,a,wa,b,wb)
+
+                qFArray[row,:,case] += qF[:,0]
+                hasqF[row] = True
+                
+            else :
+                print("Aviso: Las cargas sobre barras solo aplican para elementos tipo FRAME")
+                print("La carga será ignorada")
+
+    arrays["qF"] = qFArray
+    arrays["HasqF"] = hasqF
+
+    return
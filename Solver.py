@@ -8,17 +8,35 @@ import numpy as np
 # | K21 K22 |   | Dk |    | QF2 | = | Q2 + R |
 #
 
+# Numero de GDL a partir del cual el ensamble es disperso por omision
+SPARSE_DOF_THRESHOLD = 1000
+
 # Rutina que ensambla la matriz de rigidez K
 #
 # Entrada:     
 #       model: Diccionario con el modelo
 #       dofData: Diccionario con la información de los DOF
+#       sparse: True  -> ensamble disperso (scipy.sparse, CSR)
+#               False -> ensamble denso (numpy)
+#               None  -> disperso si DOFCount >= SPARSE_DOF_THRESHOLD
+#       matrixFree: True -> K11 no se ensambla (ElementOperator), ver
+#                   AssembleStiffnessMatrix_MATRIXFREE
 #
 # Salida:
 #       K:  Diccionario con la matriz de rigidez particionada
-def AssembleStiffnessMatrix(model,dofData) :
+def AssembleStiffnessMatrix(model,dofData,sparse=None,matrixFree=False) :
+
+    dofCount = dofData["DOFCount"]
+
+    if matrixFree :
+        return AssembleStiffnessMatrix_MATRIXFREE(model,dofData)
+
+    if sparse is None :
+        sparse = dofCount >= SPARSE_DOF_THRESHOLD
+
+    if sparse :
+        return AssembleStiffnessMatrix_SPARSE(model,dofData)
 
-    dofCount = dofData["DOFCount"]  
     K = np.full((dofCount,dofCount),0.0) 
 
     bars = model["Bars"]
@@ -49,36 +67,195 @@ def AssembleStiffnessMatrix(model,dofData) :
             "K21" : K21,
             "K22" : K22}
 
+# Rutina que ensambla la matriz de rigidez K en formato disperso
+#
+# Se toman todas las Ke = Te^T * ke * Te de model["Arrays"]["Ke"]
+# (m x 6 x 6, ver Routines.GenerateElementMatrices) y se generan los tripletes
+# (renglon, columna, valor) de todas las barras a la vez. Los espacios no
+# usados de las TRUSS (GDL -1) se descartan y los duplicados se suman al
+# convertir de COO a CSR.
+#
+# Entrada:     
+#       model: Diccionario con el modelo
+#       dofData: Diccionario con la información de los DOF
+#
+# Salida:
+#       K:  Diccionario con la matriz de rigidez particionada (bloques CSR)
+def AssembleStiffnessMatrix_SPARSE(model,dofData) :
+
+    import scipy.sparse as sp
+
+    dofCount = dofData["DOFCount"]
+    dofU = dofData["UnknownDOFCount"]
+
+    arrays = model["Arrays"]
+    barDOF = arrays["BarDOF"]
+    Ke = arrays["Ke"]
+
+    rows = np.repeat(barDOF, 6, axis=1).ravel()
+    cols = np.tile(barDOF, (1, 6)).ravel()
+    values = Ke.ravel()
+    used = (rows >= 0) & (cols >= 0)
+
+    K = sp.coo_matrix((values[used], (rows[used], cols[used])), shape=(dofCount, dofCount)).tocsr()
+
+    K11 = K[0    : dofU     , 0    : dofU    ]
+    K12 = K[0    : dofU     , dofU : dofCount]
+    K21 = K[dofU : dofCount , 0    : dofU    ]
+    K22 = K[dofU : dofCount , dofU : dofCount]
+
+    return {"K11" : K11,
+            "K12" : K12,
+            "K21" : K21,
+            "K22" : K22}
+
+# Rutina que ensambla la matriz de rigidez K sin formar K11
+#
+# K11 es un ElementOperator que calcula K11 * v barra por barra con las Ke
+# de model["Arrays"]. Solo se ensamblan (CSR) K12, K21 y K22, que tienen
+# los terminos de los GDL conocidos y son mucho mas chicas.
+#
+# Entrada:     
+#       model: Diccionario con el modelo
+#       dofData: Diccionario con la información de los DOF
+#
+# Salida:
+#       K:  Diccionario con la matriz de rigidez particionada
+def AssembleStiffnessMatrix_MATRIXFREE(model,dofData) :
+
+    import scipy.sparse as sp
+
+    dofCount = dofData["DOFCount"]
+    dofU = dofData["UnknownDOFCount"]
+
+    # Solo las barras que tocan algun GDL conocido (apoyos) tienen terminos
+    # en K12, K21 y K22
+    arrays = model["Arrays"]
+    supported = np.flatnonzero(np.any(arrays["BarDOF"] >= dofU, axis=1))
+    barDOF = arrays["BarDOF"][supported]
+    Ke = arrays["Ke"][supported]
+
+    # Tripletes con al menos un GDL conocido
+    rows = np.repeat(barDOF, 6, axis=1).ravel()
+    cols = np.tile(barDOF, (1, 6)).ravel()
+    used = (rows >= 0) & (cols >= 0) & ((rows >= dofU) | (cols >= dofU))
+
+    K = sp.coo_matrix((Ke.ravel()[used], (rows[used], cols[used])), shape=(dofCount, dofCount)).tocsr()
+
+    K12 = K[0    : dofU     , dofU : dofCount]
+    K21 = K[dofU : dofCount , 0    : dofU    ]
+    K22 = K[dofU : dofCount , dofU : dofCount]
+
+    return {"K11" : ElementOperator(model,dofData),
+            "K12" : K12,
+            "K21" : K21,
+            "K22" : K22}
+
+# Clase ElementOperator
+#   K11 sin ensamblar (elemento por elemento)
+#
+#   K11 * v = sum_e  U_e^T Ke U_e v
+#
+#   donde U_e toma de v los GDL desconocidos de la barra e. Se hace para
+#   todas las barras a la vez: se recogen los valores de v en un arreglo
+#   (m x 6), se multiplican por las Ke (m x 6 x 6) y se suman de regreso con
+#   np.bincount. Los GDL conocidos y los espacios sin usar de las TRUSS
+#   apuntan a un renglon extra de v que vale cero y cuya suma se descarta.
+#
+#   Solo guarda las Ke de las barras que tocan algun GDL desconocido y sus
+#   indices (m x 6), en lugar de los no ceros de K11 y los tripletes del
+#   ensamble. Tiene shape, dtype, matvec, matmat y @, por lo que se puede
+#   pasar directo a scipy.sparse.linalg (cg, minres, ...), y diagonal()
+#   para el precondicionador de Jacobi.
+class ElementOperator :
+
+    def __init__(self, model, dofData) :
+
+        arrays = model["Arrays"]
+        barDOF = arrays["BarDOF"]
+        dofU = dofData["UnknownDOFCount"]
+
+        unknown = (barDOF >= 0) & (barDOF < dofU)
+        bars = np.flatnonzero(unknown.any(axis=1))
+        if bars.shape[0] == barDOF.shape[0] :
+            self.Ke = arrays["Ke"]
+        else :
+            self.Ke = arrays["Ke"][bars]
+            unknown = unknown[bars]
+            barDOF = barDOF[bars]
+
+        self.index = np.where(unknown, barDOF, dofU).ravel()
+        self.shape = (dofU, dofU)
+        self.dtype = np.dtype(float)
+
+    @property
+    def nbytes(self) :
+        return self.Ke.nbytes + self.index.nbytes
+
+    def matvec(self, v) :
+        size = self.shape[0]
+        x = np.zeros(size + 1)
+        x[:size] = np.ravel(v)
+        y = np.einsum("mij,mj->mi", self.Ke, x[self.index].reshape(-1, 6))
+        return np.bincount(self.index, weights=y.ravel(), minlength=size + 1)[:size]
+
+    def matmat(self, V) :
+        V = np.asarray(V, dtype=float).reshape(self.shape[0], -1)
+        return np.column_stack([self.matvec(V[:,c]) for c in range(V.shape[1])])
+
+    def __matmul__(self, v) :
+        v = np.asarray(v, dtype=float)
+        return self.matvec(v) if v.ndim == 1 else self.matmat(v)
+
+    def diagonal(self) :
+        size = self.shape[0]
+        diagonal = np.diagonal(self.Ke, axis1=1, axis2=2).ravel()
+        return np.bincount(self.index, weights=diagonal, minlength=size + 1)[:size]
+
+    # K11 ensamblada (CSR), para la solucion directa de respaldo
+    def Assemble(self) :
+
+        import scipy.sparse as sp
+
+        size = self.shape[0]
+        index = self.index.reshape(-1, 6)
+        rows = np.repeat(index, 6, axis=1).ravel()
+        cols = np.tile(index, (1, 6)).ravel()
+        used = (rows < size) & (cols < size)
+
+        return sp.coo_matrix((self.Ke.ravel()[used], (rows[used], cols[used])), shape=self.shape).tocsr()
+
 # Rutina que ensambla el vector de cargas de empotramiento perfecto QF
 #
+# QFe = Te^T * qF para todas las barras cargadas a la vez
+#
 # Entrada:     
 #       model: Diccionario con el modelo
 #       dofData: Diccionario con la información de los DOF
 #
 # Salida:
 #       QF:  Diccionario el vector de cargas QF particionado 
+#            (una columna por caso de carga)
 def AssebembleElementForcesVector(model,dofData) :
 
     dofCount = dofData["DOFCount"]  
     dofU = dofData["UnknownDOFCount"]
+    caseCount = len(model["LoadCases"])
 
-    QF = np.full((dofCount,1),0.0)
+    QF = np.full((dofCount,caseCount),0.0)
 
-    bars = model["Bars"]
+    arrays = model["Arrays"]
+    loaded = arrays["HasqF"]
+    barDOF = arrays["BarDOF"][loaded]
+    Te = arrays["T"][loaded]
+    qF = arrays["qF"][loaded]
+    QFe = np.einsum("mji,mjc->mic", Te, qF)
 
-    for bar in bars:
-        if bar.get("qF") is not None :
-            barMatrices = bar["BarMatrices"]
-            barDOF = bar["BarDOF"]
-            qF = bar["qF"]
-            Te = barMatrices["T"]
-            QFe = Te.transpose() @ qF
-            for i in range(0,QFe.shape[0]) :
-                ii = barDOF[i]
-                QF[ii,0] += QFe[i,0]
-
-    QF1 = QF[0    : dofU     , 0 : 1]
-    QF2 = QF[dofU : dofCount , 0 : 1]
+    used = barDOF >= 0
+    np.add.at(QF, barDOF[used], QFe[used])
+
+    QF1 = QF[0    : dofU     , :]
+    QF2 = QF[dofU : dofCount , :]
 
     return {"QF1" : QF1,
             "QF2" : QF2}
@@ -92,34 +269,353 @@ def AssebembleElementForcesVector(model,dofData) :
 #
 # Salida:
 #       Q:  Diccionario el vector de cargas Q particionado 
+#           (una columna por caso de carga)
 def AssembleForceVector(model,dofData):
 
     dofCount       = dofData["DOFCount"] 
-    nodeNumberList = dofData["NodeNumberList"]
+    nodeIndex      = dofData["NodeIndex"]
     dofArray       = dofData["DOFArray"]
     dofU           = dofData["UnknownDOFCount"]
 
-    Q = np.full((dofCount,1),0.0)
+    loadCases = model["LoadCases"]
 
-    nodalForces = model["NodalForces"]
+    Q = np.full((dofCount,len(loadCases)),0.0)
 
-    keys = ["FX" , "FY" , "MZ"]
-    for nodalForce in nodalForces :
-        nodeID = nodalForce["NodeID"]
-        row = nodeNumberList.index(nodeID)
-        for i in range(0,3) :
-            value = nodalForce[keys[i]]
-            dof = dofArray[row,i]
-            Q[dof,0] += value
+    for case in range(len(loadCases)) :
+        caseData = loadCases[case]["Arrays"]
+        rows = np.array([nodeIndex[nodeID] for nodeID in caseData["NodeID"].tolist()], dtype=np.int64)
+        np.add.at(Q[:,case], dofArray[rows], caseData["NodalForces"])
 
-    Q1 = Q[0    : dofU     , 0 : 1]
-    Q2 = Q[dofU : dofCount , 0 : 1]
+    Q1 = Q[0    : dofU     , :]
+    Q2 = Q[dofU : dofCount , :]
 
     return {"Q1" : Q1,
             "Q2" : Q2}
 
 # Soluciones
 
+# Factorizacion de K11
+#
+# Metodos disponibles:
+#   "cholesky"        : Cholesky denso (scipy.linalg.cho_factor)
+#   "lu"              : LU denso con pivoteo (scipy.linalg.lu_factor)
+#   "sparse_cholesky" : Cholesky disperso (scikit-sparse/CHOLMOD si existe,
+#                       si no, SuperLU en modo simetrico)
+#   "sparse_lu"       : LU disperso (scipy.sparse.linalg.splu)
+#   "auto"            : Cholesky denso o disperso segun el tipo de K11,
+#                       con LU como respaldo si K11 no es definida positiva
+#   "pcg_jacobi"      : Gradientes conjugados precondicionados (iterativo,
+#   "pcg_ssor"          sin factorizar K11), ver IterativeFactorization
+#   "pcg_amg"
+#   "pcg_matrixfree"  : "pcg_jacobi" con K11 sin ensamblar (ElementOperator,
+#                       ver AssembleStiffnessMatrix con matrixFree=True)
+#
+# Entrada:
+#       K11:     Matriz de rigidez de los GDL desconocidos (densa, dispersa o
+#                ElementOperator; los metodos directos la ensamblan)
+#       method:  Metodo de factorizacion
+#       options: Opciones de IterativeFactorization para los metodos "pcg_*"
+#
+# Salida:
+#       factorization: Diccionario reutilizable con los keys
+#                      "Method" : Metodo realmente utilizado
+#                      "Size"   : Numero de renglones de K11
+#                      "Solve"  : Funcion que resuelve K11 * x = b
+FACTORIZATION_METHODS = ["auto", "cholesky", "lu", "sparse_cholesky", "sparse_lu", "pcg_jacobi", "pcg_ssor", "pcg_amg",
+                         "pcg_matrixfree"]
+
+# Hasta este tamano las factorizaciones densas se hacen solo con numpy
+# (numpy.linalg.cholesky o _DenseLU) y se resuelven con _ForwardSubstitution
+# y _BackSubstitution: importar scipy.linalg (~0.2 s) es casi todo el tiempo
+# de un modelo chico
+NUMPY_DENSE_THRESHOLD = 300
+
+def FactorizeStiffness(K11, method="auto", options=None) :
+
+    if method not in FACTORIZATION_METHODS :
+        raise ValueError("Metodo de factorizacion desconocido: " + str(method))
+
+    if method == "pcg_matrixfree" :
+        return IterativeFactorization(K11, "jacobi", **(options or {}))
+
+    if method.startswith("pcg_") :
+        return IterativeFactorization(K11, method[4:], **(options or {}))
+
+    if isinstance(K11, ElementOperator) :
+        K11 = K11.Assemble()
+
+    isSparse = hasattr(K11, "tocsc")
+
+    if method == "auto" :
+        method = "sparse_cholesky" if isSparse else "cholesky"
+        try :
+            return FactorizeStiffness(K11, method)
+        except np.linalg.LinAlgError :
+            method = "sparse_lu" if isSparse else "lu"
+
+    size = K11.shape[0]
+
+    if method == "cholesky" and size <= NUMPY_DENSE_THRESHOLD :
+        L = np.linalg.cholesky(_ToDense(K11))
+        U = np.ascontiguousarray(L.T)
+        solve = lambda b : _BackSubstitution(U, _ForwardSubstitution(L, b))
+
+    elif method == "lu" and size <= NUMPY_DENSE_THRESHOLD :
+        L, U, order = _DenseLU(_ToDense(K11))
+        solve = lambda b : _BackSubstitution(U, _ForwardSubstitution(L, np.asarray(b)[order]))
+
+    elif method == "cholesky" :
+        import scipy.linalg as sla
+        factor = sla.cho_factor(_ToDense(K11))
+        solve = lambda b : sla.cho_solve(factor, b)
+
+    elif method == "lu" :
+        import scipy.linalg as sla
+        factor = sla.lu_factor(_ToDense(K11))
+        solve = lambda b : sla.lu_solve(factor, b)
+
+    elif method == "sparse_cholesky" :
+        A = _ToSparse(K11)
+        try :
+            from sksparse.cholmod import cholesky, CholmodNotPositiveDefiniteError
+        except ImportError :
+            # SuperLU con ordenamiento simetrico y sin pivoteo fuera de la diagonal
+            from scipy.sparse.linalg import splu
+            factor = splu(A, permc_spec="MMD_AT_PLUS_A", diag_pivot_thresh=0.0,
+                          options={"SymmetricMode" : True})
+            if np.any(factor.U.diagonal() <= 0.0) :
+                raise np.linalg.LinAlgError("K11 no es definida positiva")
+        else :
+            try :
+                factor = cholesky(A)
+            except CholmodNotPositiveDefiniteError as error :
+                raise np.linalg.LinAlgError(str(error))
+        solve = factor.solve if hasattr(factor, "solve") else factor
+
+    else : # sparse_lu
+        from scipy.sparse.linalg import splu
+        factor = splu(_ToSparse(K11))
+        solve = factor.solve
+
+    return {"Method" : method,
+            "Size"   : size,
+            "Solve"  : solve}
+
+# Factorizacion LU densa con pivoteo parcial, P A = L U (L con diagonal
+# unitaria); order es la permutacion de renglones (b[order] = P b)
+def _DenseLU(A) :
+
+    A = np.array(A, dtype=float)
+    size = A.shape[0]
+    order = np.arange(size)
+
+    for k in range(size) :
+        pivot = k + int(np.argmax(np.abs(A[k:,k])))
+        if A[pivot,k] == 0.0 :
+            raise np.linalg.LinAlgError("K11 es singular")
+        if pivot != k :
+            A[[k,pivot]] = A[[pivot,k]]
+            order[[k,pivot]] = order[[pivot,k]]
+        A[k+1:,k] /= A[k,k]
+        A[k+1:,k+1:] -= np.outer(A[k+1:,k], A[k,k+1:])
+
+    return np.tril(A, -1) + np.eye(size), np.triu(A), order
+
+# Sustitucion hacia adelante (L triangular inferior) y hacia atras (U
+# triangular superior); b es un vector o una matriz con varios lados
+# derechos
+def _ForwardSubstitution(L, b) :
+
+    x = np.array(b, dtype=float)
+    for i in range(x.shape[0]) :
+        x[i] = (x[i] - L[i,:i] @ x[:i]) / L[i,i]
+
+    return x
+
+def _BackSubstitution(U, b) :
+
+    x = np.array(b, dtype=float)
+    for i in range(x.shape[0] - 1, -1, -1) :
+        x[i] = (x[i] - U[i,i+1:] @ x[i+1:]) / U[i,i]
+
+    return x
+
+# Solucion iterativa de K11 (gradientes conjugados precondicionados)
+#
+# Para modelos en los que la factorizacion directa no cabe en memoria. Se
+# guarda solo K11 y el precondicionador, de memoria lineal en GDL:
+#   "jacobi" : diagonal de K11
+#   "ssor"   : Gauss-Seidel simetrico, M = (D + L) D^(-1) (D + U), con
+#              las partes triangulares de K11 (sin relleno). Hace las veces de
+#              Cholesky incompleto: scipy no lo tiene y su ILU (spilu) no
+#              es simetrico, por lo que CG se estanca con el
+#   "amg"    : multimalla algebraica (pyamg, opcional; sin pyamg se usa
+#              "ssor")
+#
+# Si K11 es un ElementOperator no se guarda K11 ensamblada; solo se puede
+# usar "jacobi" (los otros precondicionadores necesitan los no ceros) y la
+# solucion directa de respaldo ensambla K11 en ese momento.
+#
+# Cada columna de b se resuelve con scipy.sparse.linalg.cg hasta
+# ||b - K11 x|| <= tolerance * ||b||. Cada reportEvery iteraciones se
+# registra el residuo relativo. Si el mejor residuo no baja a la mitad en
+# stagnationIterations iteraciones, o se llega a maxIterations, el sistema
+# se resuelve con la factorizacion directa fallback ("auto" por omision;
+# None para lanzar LinAlgError).
+#
+# Entrada:
+#       K11:            Matriz de rigidez de los GDL desconocidos
+#       preconditioner: "jacobi", "ssor" o "amg"
+#
+# Salida:
+#       factorization: Diccionario como el de FactorizeStiffness, mas
+#                      "Iterations"  : iteraciones por columna resuelta
+#                      "Residuals"   : residuo relativo final por columna
+#                      "History"     : [(iteracion, residuo relativo), ...]
+#                                      de la ultima columna
+#                      "Fallback"    : True si se uso la solucion directa
+#                      "Warnings"    : avisos para el .log (p. ej. pyamg no
+#                                      instalado); main.py los escribe
+PCG_PRECONDITIONERS = ["jacobi", "ssor", "amg"]
+PCG_TOLERANCE = 1.0E-10
+PCG_REPORT_EVERY = 25
+PCG_STAGNATION_ITERATIONS = 2000
+
+def IterativeFactorization(K11, preconditioner="jacobi", tolerance=PCG_TOLERANCE, maxIterations=None,
+                           reportEvery=PCG_REPORT_EVERY, stagnationIterations=PCG_STAGNATION_ITERATIONS,
+                           fallback="auto") :
+
+    import scipy.sparse as sp
+    import scipy.sparse.linalg as spla
+
+    if preconditioner not in PCG_PRECONDITIONERS :
+        raise ValueError("Precondicionador desconocido: " + str(preconditioner))
+
+    matrixFree = isinstance(K11, ElementOperator)
+    if matrixFree and preconditioner != "jacobi" :
+        raise ValueError("El precondicionador " + preconditioner + " necesita K11 ensamblada")
+
+    A = K11 if matrixFree else _ToSparse(K11).tocsr()
+    size = A.shape[0]
+    if maxIterations is None :
+        maxIterations = max(1000, 10 * size)
+
+    diagonal = A.diagonal()
+    if np.any(diagonal <= 0.0) :
+        raise np.linalg.LinAlgError("K11 tiene ceros o negativos en la diagonal")
+
+    warnings = []
+    if preconditioner == "amg" :
+        try :
+            import pyamg
+        except ImportError :
+            warnings.append("pyamg no esta instalado, se usa el precondicionador ssor")
+            preconditioner = "ssor"
+        else :
+            M = pyamg.smoothed_aggregation_solver(A, symmetry="symmetric").aspreconditioner(cycle="V")
+
+    if preconditioner == "jacobi" :
+        inverse = 1.0 / diagonal
+        M = spla.LinearOperator(A.shape, matvec=lambda x : inverse * x.ravel(), dtype=float)
+
+    elif preconditioner == "ssor" :
+        # SuperLU sin reordenar ni pivotear no agrega relleno a una matriz
+        # triangular y sus sustituciones son mas rapidas que spsolve_triangular
+        options = {"permc_spec" : "NATURAL", "diag_pivot_thresh" : 0.0, "options" : {"SymmetricMode" : True}}
+        lower = spla.splu(sp.tril(A, format="csc"), **options)
+        upper = spla.splu(sp.triu(A, format="csc"), **options)
+        M = spla.LinearOperator(A.shape, matvec=lambda x : upper.solve(diagonal * lower.solve(x.ravel())), dtype=float)
+
+    factorization = {"Method"     : "pcg_matrixfree" if matrixFree else "pcg_" + preconditioner,
+                     "Size"       : size,
+                     "Iterations" : [],
+                     "Residuals"  : [],
+                     "History"    : [],
+                     "Fallback"   : False,
+                     "Warnings"   : warnings}
+
+    def solveColumn(b) :
+
+        bNorm = np.linalg.norm(b)
+        if bNorm == 0.0 :
+            factorization["Iterations"].append(0)
+            factorization["Residuals"].append(0.0)
+            return np.zeros(size)
+
+        history = []
+        state = {"Iteration" : 0,
+                 "Best"      : np.inf,
+                 "BestAt"    : 0}
+
+        def callback(x) :
+            state["Iteration"] += 1
+            if state["Iteration"] % reportEvery == 0 :
+                residual = float(np.linalg.norm(b - A @ x) / bNorm)
+                history.append((state["Iteration"], residual))
+                if residual < 0.5 * state["Best"] :
+                    state["Best"] = residual
+                    state["BestAt"] = state["Iteration"]
+                elif state["Iteration"] - state["BestAt"] >= stagnationIterations :
+                    raise _Stagnation()
+
+        try :
+            x, info = spla.cg(A, b, rtol=tolerance, atol=0.0, maxiter=maxIterations, M=M, callback=callback)
+            converged = info == 0
+        except _Stagnation :
+            converged = False
+
+        if not converged :
+            if fallback is None :
+                raise np.linalg.LinAlgError("PCG no convergio en " + str(state["Iteration"]) + " iteraciones")
+            if "Direct" not in factorization :
+                factorization["Direct"] = FactorizeStiffness(A.Assemble() if matrixFree else A, fallback)
+                factorization["Fallback"] = True
+                factorization["Method"] = factorization["Method"] + " -> " + factorization["Direct"]["Method"]
+            x = SolveFactorized(factorization["Direct"], b)
+
+        residual = float(np.linalg.norm(b - A @ x) / bNorm)
+        history.append((state["Iteration"], residual))
+        factorization["Iterations"].append(state["Iteration"])
+        factorization["Residuals"].append(residual)
+        factorization["History"] = history
+
+        return x
+
+    def solve(b) :
+        B = np.asarray(b, dtype=float).reshape(size, -1)
+        X = np.column_stack([solveColumn(B[:,c]) for c in range(B.shape[1])])
+        return X.reshape(np.shape(b))
+
+    factorization["Solve"] = solve
+
+    return factorization
+
+class _Stagnation(Exception) :
+    pass
+
+# Resolver K11 * x = b con una factorizacion existente
+# (solo sustitucion hacia adelante y hacia atras)
+#
+# b puede ser un vector (n,1) o una matriz (n,N) con varios lados derechos
+def SolveFactorized(factorization, b) :
+
+    b = np.asarray(b, dtype=float)
+    if b.shape[0] == 0 :
+        return np.array(b)
+
+    x = factorization["Solve"](b)
+
+    return np.asarray(x).reshape(b.shape)
+
+def _ToDense(A) :
+    return A.toarray() if hasattr(A, "toarray") else np.asarray(A)
+
+def _ToSparse(A) :
+    if hasattr(A, "tocsc") :
+        return A.tocsc()
+    import scipy.sparse as sp
+    return sp.csc_matrix(A)
+
 # Rutina que soluciona para los desplazamientos desconocidos Du
 #
 # 
@@ -131,14 +627,25 @@ def AssembleForceVector(model,dofData):
 #
 # Solucion
 # Du = K11^(-1) * ( Q1 - QF1 - K12 * Dk )
-def SolveDisplacements(K,QF,Q,Dk) :
+#
+# K11 no se invierte: se factoriza una sola vez y la factorizacion se
+# guarda en K["Factorization"] para reutilizarla en soluciones posteriores.
+# Todos los casos de carga (columnas de Q1 y QF1) se resuelven juntos.
+# method y options se pasan a FactorizeStiffness (p. ej. "pcg_jacobi" con
+# {"tolerance" : 1.0E-8}).
+def SolveDisplacements(K,QF,Q,Dk,method="auto",options=None) :
 
     K11 = K["K11"]
     K12 = K["K12"]
     QF1 = QF["QF1"]
     Q1  = Q["Q1"]
 
-    Du = np.linalg.inv(K11) @ (Q1 - QF1 - K12 @ Dk)     
+    factorization = K.get("Factorization")
+    if factorization is None :
+        factorization = FactorizeStiffness(K11, method, options)
+        K["Factorization"] = factorization
+
+    Du = SolveFactorized(factorization, Q1 - QF1 - K12 @ Dk)
 
     return Du
 
@@ -170,29 +677,26 @@ def SolveReactions(K,QF,Q,D) :
 #
 # qe = ke * Te * De + qF
 #
-# El resultado se añade al diccionario de la barra
+# El resultado (una columna por caso de carga) se guarda en
+# model["Arrays"]["qe"] (m x 6 x N)
 def SolveElementForces(model,D) :
 
     Du = D["Du"]
     Dk = D["Dk"]
     Disp = np.concatenate((Du,Dk))
 
-    bars = model["Bars"]
+    arrays = model["Arrays"]
+    barDOF = arrays["BarDOF"]
 
-    for bar in bars :
-        barDOF = bar["BarDOF"]
-        size = len(barDOF)
-        De = np.full((size,1),0.0)
-        for i in range(0,size) :
-            dof = barDOF[i]
-            De[i,0] = Disp[dof,0]
-        barMatrices = bar["BarMatrices"]   
-        ke = barMatrices["k"]
-        Te = barMatrices["T"]
-        qe = ke @ Te @ De
-        if bar.get("qF") is not None:
-            qF = bar["qF"]
-            qe = qe + qF
-        bar.update({"qe" : qe})
+    # Desplazamientos de todas las barras (m x 6 x N), 0 en los GDL no usados
+    used = barDOF >= 0
+    De = Disp[np.where(used, barDOF, 0)]
+    De[~used] = 0.0
+
+    # qe = ke * Te * De + qF para todas las barras a la vez
+    qe = np.matmul(arrays["k"], np.matmul(arrays["T"], De))
+    qe += arrays["qF"]
+
+    arrays["qe"] = qe
 
-    return
\ No newline at end of file
+    return
@@ -0,0 +1,165 @@
+import numpy as np
+import ModelData as md
+import Routines as rt
+
+# Diagramas de fuerzas internas por estaciones
+#
+#   Evalua N, V, M y la deflexion local en k estaciones equidistantes de
+#   cada barra (x = 0, L/(k-1), ..., L), para todas las barras y casos a la
+#   vez, a partir de qe, los desplazamientos de los extremos y las cargas
+#   sobre las barras. Con el mismo signo que BarEndForces en IOFiles, de
+#   modo que la primera y la ultima estacion coinciden con los extremos:
+#
+#       N(x) = -qe1
+#       V(x) =  qe2 + int_0^x p
+#       M(x) = -qe3 + qe2 x + int_0^x p(s) (x - s) ds
+#       v(x) =  v1 + theta1 x + (-qe3 x^2/2 + qe2 x^3/6 + int int int_0^x p) / EI
+#
+#   (qe1, qe2, qe3 son las fuerzas en el extremo inicial, p es la carga en
+#   +Y local). Cada carga trapezoidal se escribe con funciones de
+#   singularidad <x - a>^n, que dan las integrales exactas:
+#
+#       p(s) = pa <s-a>^0 + r <s-a>^1 - pb <s-b>^0 - r <s-b>^1,   r = (pb-pa)/(b-a)
+#
+#   En las TRUSS N es constante, V = M = 0 y la deflexion se interpola
+#   linealmente entre los extremos.
+#
+#   Los extremos por barra (BarExtrema) son los de las estaciones, no los
+#   analiticos: con pocas estaciones el maximo de M en el claro puede quedar
+#   entre dos de ellas.
+
+# Estaciones por barra por omision (incluye los extremos)
+STATION_COUNT = 11
+
+# Funcion SampleStations
+#
+#   Entradas:
+#       model          Modelo con qe calculadas (Solver.SolveElementForces)
+#       D              Diccionario con "Du" y "Dk"
+#       stationCount   Numero de estaciones por barra (k >= 2)
+#
+#   Salidas:
+#       En model["Arrays"]:
+#       "StationX"            Posicion de cada estacion (m x k)
+#       "StationN", "StationV", "StationM", "StationDeflection"
+#                             Valores en cada estacion (m x k x N)
+def SampleStations(model, D, stationCount=STATION_COUNT) :
+
+    if stationCount < 2 :
+        raise ValueError("Se necesitan al menos 2 estaciones por barra")
+
+    arrays = model["Arrays"]
+    caseCount = len(model["LoadCases"])
+    L = arrays["Length"]
+    qe = arrays["qe"]
+    truss = arrays["TypeCode"] == md.TYPE_TRUSS
+
+    s = np.linspace(0.0, 1.0, stationCount)
+    x = L[:,None] * s[None,:]
+
+    # Desplazamientos locales de los extremos (m x 6 x N)
+    Disp = np.concatenate((D["Du"],D["Dk"]))
+    barDOF = arrays["BarDOF"]
+    used = barDOF >= 0
+    De = Disp[np.where(used, barDOF, 0)]
+    De[~used] = 0.0
+    d = np.matmul(arrays["T"], De)
+
+    EI = arrays["E"][arrays["MaterialRow"]] * arrays["I"][arrays["PropertyRow"]]
+    EI = np.where(truss, 1.0, EI)
+
+    # Terminos de las cargas sobre las barras (m x k x N)
+    shear, moment, deflection = _LoadTerms(model, x)
+
+    qe1 = qe[:,None,0,:]
+    qe2 = qe[:,None,1,:]
+    qe3 = qe[:,None,2,:]
+    X = x[:,:,None]
+
+    N = np.broadcast_to(-qe1, (L.shape[0], stationCount, caseCount)).copy()
+    V = qe2 + shear
+    M = -qe3 + qe2 * X + moment
+    v = d[:,None,1,:] + d[:,None,2,:] * X + (-qe3 * X**2 / 2.0 + qe2 * X**3 / 6.0 + deflection) / EI[:,None,None]
+
+    # TRUSS: [u1, v1, u2, v2] en los primeros 4 lugares
+    V[truss] = 0.0
+    M[truss] = 0.0
+    v[truss] = d[truss,None,1,:] + (d[truss,None,3,:] - d[truss,None,1,:]) * s[None,:,None]
+
+    arrays["StationX"] = x
+    arrays["StationN"] = N
+    arrays["StationV"] = V
+    arrays["StationM"] = M
+    arrays["StationDeflection"] = v
+
+    return
+
+# Integrales de las cargas de cada caso en las estaciones x (m x k)
+def _LoadTerms(model, x) :
+
+    arrays = model["Arrays"]
+    caseCount = len(model["LoadCases"])
+    barLookup = md.IDLookup(arrays["BarIDs"], "Barra")
+
+    shape = x.shape + (caseCount,)
+    shear = np.zeros(shape)
+    moment = np.zeros(shape)
+    deflection = np.zeros(shape)
+
+    for case in range(caseCount) :
+
+        rows, a, pa, b, pb = rt.FrameBarLoads(model,case,barLookup)
+        b, valid, _, _ = rt.CheckBarLoads(arrays["Length"][rows],a,b)
+        rows, a, pa, b, pb = rows[valid], a[valid], pa[valid], b[valid], pb[valid]
+
+        r = ((pb - pa) / (b - a))[:,None]
+        pa = pa[:,None]
+        pb = pb[:,None]
+        ta = np.maximum(x[rows] - a[:,None], 0.0)
+        tb = np.maximum(x[rows] - b[:,None], 0.0)
+
+        np.add.at(shear[:,:,case], rows, pa*ta + r*ta**2/2.0 - pb*tb - r*tb**2/2.0)
+        np.add.at(moment[:,:,case], rows, pa*ta**2/2.0 + r*ta**3/6.0 - pb*tb**2/2.0 - r*tb**3/6.0)
+        np.add.at(deflection[:,:,case], rows, pa*ta**4/24.0 + r*ta**5/120.0 - pb*tb**4/24.0 - r*tb**5/120.0)
+
+    return shear, moment, deflection
+
+# Funcion BarExtrema
+#   Extremos por barra y caso de los valores en las estaciones
+#
+#   Salidas:
+#       extrema     Diccionario de arreglos m x N:
+#                   "MaxMoment", "MaxMomentX", "MinMoment", "MinMomentX",
+#                   "Moment" (mayor en valor absoluto, con signo),
+#                   "MomentX", "MaxShear" (idem),
+#                   "MaxShearX", "Axial", "MaxDeflection" (idem),
+#                   "MaxDeflectionX"
+def BarExtrema(model) :
+
+    arrays = model["Arrays"]
+    x = arrays["StationX"][:,:,None]
+    M = arrays["StationM"]
+    V = arrays["StationV"]
+    v = arrays["StationDeflection"]
+
+    def take(values, index) :
+        return (np.take_along_axis(values, index[:,None,:], axis=1)[:,0,:],
+                np.take_along_axis(np.broadcast_to(x, values.shape), index[:,None,:], axis=1)[:,0,:])
+
+    maxMoment, maxMomentX = take(M, np.argmax(M, axis=1))
+    minMoment, minMomentX = take(M, np.argmin(M, axis=1))
+    moment, momentX = take(M, np.argmax(np.abs(M), axis=1))
+    maxShear, maxShearX = take(V, np.argmax(np.abs(V), axis=1))
+    maxDeflection, maxDeflectionX = take(v, np.argmax(np.abs(v), axis=1))
+
+    return {"MaxMoment"      : maxMoment,
+            "MaxMomentX"     : maxMomentX,
+            "MinMoment"      : minMoment,
+            "MinMomentX"     : minMomentX,
+            "Moment"         : moment,
+            "MomentX"        : momentX,
+            "MaxShear"       : maxShear,
+            "MaxShearX"      : maxShearX,
+            "Axial"          : arrays["StationN"][:,0,:],
+            "MaxDeflection"  : maxDeflection,
+            "MaxDeflectionX" : maxDeflectionX}
@@ -7,6 +7,25 @@ rm -f "$2/$1.err"
 # OutputFile: $2/$1.log
 # ErrorFile: $2/$1.err
 
+# Si el servicio de Daemon.py esta corriendo (python Daemon.py start) el
+# modelo se resuelve en ese proceso, que ya tiene cargados Python y NumPy.
+# Codigo 3: no hay servicio (o no hay python3), se usa el ejecutable.
+#
+# Daemon.py no se copia al problemtype: se usa el del directorio del codigo,
+# TALLER_SOURCE o, por omision, el que contiene a Taller.gid (como en el
+# repositorio). El cliente solo usa la biblioteca estandar; el servicio corre
+# con los modulos de ese mismo directorio.
+SOURCE_PATH="${TALLER_SOURCE:-$3/..}"
+if [ -f "$SOURCE_PATH/Daemon.py" ] && command -v python3 >/dev/null 2>&1 ; then
+    python3 "$SOURCE_PATH/Daemon.py" run "$2/$1" 2> "$2/$1.err"
+    status=$?
+    if [ $status -ne 3 ] ; then
+        [ -s "$2/$1.err" ] || rm -f "$2/$1.err"
+        exit $status
+    fi
+    rm -f "$2/$1.err"
+fi
+
 # Para OSX se hace un ejecutable usando la utiletia pyinstaller
 
-"$3/main" "$2/$1"
\ No newline at end of file
+"$3/main" "$2/$1"
@@ -14,6 +14,9 @@ del %2\%1.log
 del %2\%1.err
 del %2\%1.post.res
 
+rem El servicio de Daemon.py usa Unix sockets y no se usa en Windows:
+rem cada corrida es de una sola vez
+
 set PYTHON_PATH=C:\Program Files\GiD\GiD 17.1.1d\scripts\tohil\python\python
 set SOURCE_PATH=C:\Users\jfgracia\Documents\Taller-GiD-Python\main.py
 
@@ -1,108 +1,327 @@
-import IOFiles as io
-import Routines as rt
-import Solver as sl
+import Instrumentation as ins
 
-import numpy as np
+import os
 import sys
+import traceback
 
-dataFileName    = ""
-logFileName     = ""
-resultsFileName = ""
-message         = ""
-
-# Lectura del modelo
-GiD = True
-if(len(sys.argv) > 1) :  # Este prrograma se invoca desde el GiD
-    fileName = sys.argv[1]
-    dataFileName    = fileName + ".dat"
-    logFileName     = fileName + ".log"
-    resultsFileName = fileName + ".post.res"
-    message = "Este modelo viene de un documento de GiD\n\n"
-else : # Este programa se invoca desde Visual Studio
-    dataFileName = "Ruta_a_mi_documento.dat" #<== Modificar segun el user
-    resultsFileName = "Ruta_a_mi_archivo_de_resultados.post.res" #<== Modificar segun el user
-    GiD = False
-    message = "Este modelo es de prueba y se invoca desde Visual Studio\n\n"
-
-io.reportMessage(logFileName,message,GiD,"w")
-
-
-# Lectura del modelo
-model = io.ReadDataFile(dataFileName)
-###
-message = "Modelo Leido\n"
-message = message + "Nodos:               " + str(len(model["Nodes"]))       + "\n"
-message = message + "Barras:              " + str(len(model["Bars"]))        + "\n"
-message = message + "Materiales:          " + str(len(model["Materials"]))   + "\n"
-message = message + "Propiedades:         " + str(len(model["Properties"]))  + "\n"
-message = message + "Apoyos:              " + str(len(model["Restrictions"]))+ "\n"
-message = message + "Fuerzas Nodales:     " + str(len(model["NodalForces"])) + "\n"
-message = message + "Fuerzas Elementales: " + str(len(model["BarForces"]))   + "\n"
-message = message + "\n\n"
-io.reportMessage(logFileName,message,GiD)
-
-# Numeracion de los GDL
-dofData = rt.GenerateDOF(model)
-###
-message = "Calculo de grados de libertad\n"
-message = message + "GDL Total:          " + str(dofData["DOFCount"])        + "\n"
-message = message + "GDL Desconocidos:   " + str(dofData["UnknownDOFCount"]) + "\n"
-message = message + "\n\n"
-io.reportMessage(logFileName,message,GiD)
-
-# Generacion de las matrices elementales
-rt.GenerateElementsDOF(model,dofData)
-rt.GenerateElementMatrices(model,dofData)
-rt.GenerateElementFixedEndForces(model)
-###
-message = "Generacion de matriz de rigidez...     OK\n"
-message = message + "\n\n"
-io.reportMessage(logFileName,message,GiD)
-
-# Ensamblaje
-K = sl.AssembleStiffnessMatrix(model,dofData)
-###
-message = "Ensamble de matriz de rigidez...       OK\n"
-message = message + "\n\n"
-io.reportMessage(logFileName,message,GiD)
-
-QF = sl.AssebembleElementForcesVector(model,dofData)
-###
-message = "Ensamble de fuerzas elementales...     OK\n"
-message = message + "\n\n"
-io.reportMessage(logFileName,message,GiD)
-
-Q = sl.AssembleForceVector(model,dofData)
-###
-message = "Ensamble de fuerzas nodales...         OK\n"
-message = message + "\n\n"
-io.reportMessage(logFileName,message,GiD)
-
-# Solucion de desplazamientos
-dofCount = dofData["DOFCount"]
-unknownDOFCount = dofData["UnknownDOFCount"]
-Dk = np.full((dofCount-unknownDOFCount,1),0.0)
-Du = sl.SolveDisplacements(K,QF,Q,Dk)
-D = {"Du" : Du,
-     "Dk" : Dk}
-###
-message = "Solucion de desplazamientos nodales... OK\n"
-message = message + "\n\n"
-io.reportMessage(logFileName,message,GiD)
-
-# Solucion de reacciones
-R = sl.SolveReactions(K,QF,Q,D)
-###
-message = "Solucion de reacciones...              OK\n"
-message = message + "\n\n"
-io.reportMessage(logFileName,message,GiD)
-
-# Solucion de fuerzas elementales
-sl.SolveElementForces(model,D)
-###
-message = "Solucion de fuerzas elementales...     OK\n"
-message = message + "\n\n"
-io.reportMessage(logFileName,message,GiD)
-
-# Salida de datos
-io.ExportResultsFile(resultsFileName,model,D,R,dofData)
+# Arranque en frio
+#
+#   Al importar este archivo solo se cargan modulos de la biblioteca
+#   estandar: el primer renglon del .log se escribe antes de cargar NumPy y
+#   el pipeline (LoadPipeline), y SciPy solo se importa en la etapa que lo
+#   necesita (ensamble ralo, RCM, factorizaciones grandes), asi que un
+#   modelo chico nunca lo carga. PyInstaller encuentra tambien los imports
+#   dentro de funciones, por lo que el ejecutable los sigue incluyendo.
+#   Ver "python Benchmark.py startup".
+
+# Funcion LoadPipeline
+#   Importa los modulos del pipeline (NumPy incluido) y los regresa como
+#   (IOFiles, Routines, Solver, numpy); Python los guarda en sys.modules, asi
+#   que solo la primera llamada cuesta
+def LoadPipeline() :
+
+    import IOFiles as io
+    import Routines as rt
+    import Solver as sl
+    import numpy as np
+
+    return io, rt, sl, np
+
+# Funcion RunModel
+#   Corre el pipeline completo sobre un modelo: lectura, GDL, matrices
+#   elementales, ensamble, solucion y escritura del .log, .post.res y
+#   .stats.json. La usan la linea de comandos de este archivo, Batch.py y
+#   el servicio de Daemon.py
+#
+#   Entradas:
+#       fileName    Ruta del documento sin extension (como la manda GiD);
+#                   None para correr el modelo de prueba de Visual Studio
+#       incremental Reutilizar la factorizacion de la corrida anterior del
+#                   mismo modelo en este proceso (ver Reanalysis.py); solo
+#                   sirve en procesos que viven entre corridas (Daemon.py)
+#       method      Metodo de solucion de K11 (Solver.FACTORIZATION_METHODS,
+#                   p. ej. "pcg_jacobi" para modelos que no caben en memoria
+#                   con la factorizacion directa, o "pcg_matrixfree" para
+#                   no ensamblar K11)
+#       options     Opciones de Solver.IterativeFactorization
+#       stations    Estaciones por barra para los diagramas de N, V, M y
+#                   deflexion (Stations.py); con 0 no se calculan. Se
+#                   escriben en el .post.res y los extremos por barra en
+#                   documento.extrema.csv
+#       saveResults Guardar D, R y qe de todos los casos en
+#                   documento.results.npz para las combinaciones de carga
+#                   (Combinations.py)
+#
+#   Salidas:
+#       summary     Diccionario con el modelo, GDL, metodo de solucion y
+#                   las mediciones de PipelineMonitor.Report()
+def RunModel(fileName=None, incremental=False, method="auto", options=None, stations=0, saveResults=False) :
+
+    dataFileName    = ""
+    logFileName     = ""
+    resultsFileName = ""
+    statsFileName   = ""
+    extremaFileName = ""
+    message         = ""
+
+    # Lectura del modelo
+    GiD = True
+    if fileName is not None :  # Este prrograma se invoca desde el GiD
+        dataFileName    = fileName + ".dat"
+        logFileName     = fileName + ".log"
+        resultsFileName = fileName + ".post.res"
+        statsFileName   = fileName + ".stats.json"
+        extremaFileName = fileName + ".extrema.csv"
+        message = "Este modelo viene de un documento de GiD\n\n"
+    else : # Este programa se invoca desde Visual Studio
+        dataFileName = "Ruta_a_mi_documento.dat" #<== Modificar segun el user
+        resultsFileName = "Ruta_a_mi_archivo_de_resultados.post.res" #<== Modificar segun el user
+        statsFileName   = "Ruta_a_mi_archivo_de_mediciones.stats.json" #<== Modificar segun el user
+        extremaFileName = "Ruta_a_mi_archivo_de_extremos.extrema.csv" #<== Modificar segun el user
+        GiD = False
+        message = "Este modelo es de prueba y se invoca desde Visual Studio\n\n"
+
+    log = ins.LogFile(logFileName,GiD)
+    state = {}
+    try :
+        summary = _Pipeline(dataFileName,resultsFileName,statsFileName,extremaFileName,GiD,log,message,state,incremental,method,options,stations,saveResults)
+    except Exception :
+        # El error queda en el .log (ademas de propagarse al .err de GiD);
+        # el escritor de resultados se cierra para no dejar el hilo vivo
+        if "Writer" in state :
+            state["Writer"].Close()
+        log.Write("ERROR\n" + traceback.format_exc())
+        raise
+    finally :
+        log.Close()
+
+    return summary
+
+def _Pipeline(dataFileName,resultsFileName,statsFileName,extremaFileName,GiD,log,message,state,incremental,method,options,stations,saveResults) :
+
+    # Un solo handle para todo el .log; cada etapa se mide con el monitor
+    monitor = ins.PipelineMonitor()
+    log.Write(message)
+
+    with monitor.Stage("Carga de modulos") :
+        io, rt, sl, np = LoadPipeline()
+
+
+    # Lectura del modelo (o de su cache binario si el .dat no ha cambiado)
+    with monitor.Stage("Lectura") :
+        model = io.ReadModel(dataFileName, saveCache=False)
+    ###
+    message = "Modelo Leido\n"
+    if model["Cache"]["Hit"] :
+        message = message + "Cache:               " + model["Cache"]["FileName"] + "\n"
+    message = message + "Nodos:               " + str(len(model["Nodes"]))       + "\n"
+    message = message + "Barras:              " + str(len(model["Bars"]))        + "\n"
+    message = message + "Materiales:          " + str(len(model["Materials"]))   + "\n"
+    message = message + "Propiedades:         " + str(len(model["Properties"]))  + "\n"
+    message = message + "Apoyos:              " + str(len(model["Restrictions"]))+ "\n"
+    message = message + "Fuerzas Nodales:     " + str(len(model["NodalForces"])) + "\n"
+    message = message + "Fuerzas Elementales: " + str(len(model["BarForces"]))   + "\n"
+    message = message + "Casos de carga:      " + str(len(model["LoadCases"]))   + "\n"
+    message = message + monitor.StageMessage("Lectura")
+    message = message + "\n\n"
+    log.Write(message)
+
+    # Numeracion de los GDL (guardada en el cache junto con el modelo)
+    with monitor.Stage("Grados de libertad") :
+        dofData = model["Cache"]["DOFData"]
+        if dofData is None :
+            dofData = rt.GenerateDOF(model)
+            io.SaveCache(model, dofData)
+    ###
+    message = "Calculo de grados de libertad\n"
+    message = message + "GDL Total:          " + str(dofData["DOFCount"])        + "\n"
+    message = message + "GDL Desconocidos:   " + str(dofData["UnknownDOFCount"]) + "\n"
+    message = message + "Reordenamiento:     " + dofData["Reordering"]              + "\n"
+    message = message + "Ancho de banda:     " + str(dofData["BandwidthBefore"]) + " -> " + str(dofData["Bandwidth"]) + "\n"
+    message = message + "Perfil:             " + str(dofData["ProfileBefore"])   + " -> " + str(dofData["Profile"])   + "\n"
+    message = message + monitor.StageMessage("Grados de libertad")
+    message = message + "\n\n"
+    log.Write(message)
+
+    # Generacion de las matrices elementales
+    with monitor.Stage("Matrices elementales") as stage :
+        rt.GenerateElementsDOF(model,dofData)
+        rt.GenerateElementMatrices(model,dofData)
+        rt.GenerateElementFixedEndForces(model)
+        stage["Elementos"] = len(model["Bars"])
+        stage["Memoria Ke (MB)"] = round(model["Arrays"]["Ke"].nbytes / 1.0E6, 3)
+    ###
+    message = "Generacion de matriz de rigidez...     OK\n"
+    message = message + monitor.StageMessage("Matrices elementales")
+    message = message + "\n\n"
+    log.Write(message)
+
+    # Ensamblaje
+    with monitor.Stage("Ensamble") as stage :
+        K = sl.AssembleStiffnessMatrix(model,dofData,matrixFree=(method == "pcg_matrixfree"))
+        QF = sl.AssebembleElementForcesVector(model,dofData)
+        Q = sl.AssembleForceVector(model,dofData)
+        stage.update(ins.MatrixInfo("K11", K["K11"]))
+    ###
+    message = "Ensamble de matriz de rigidez...       OK\n"
+    message = message + "Ensamble de fuerzas elementales...     OK\n"
+    message = message + "Ensamble de fuerzas nodales...         OK\n"
+    message = message + monitor.StageMessage("Ensamble")
+    message = message + "\n\n"
+    log.Write(message)
+
+    # Reanalisis: reutilizar o ajustar la factorizacion de la corrida anterior
+    if incremental :
+        import Reanalysis as rn
+        modelKey = os.path.abspath(dataFileName)
+        with monitor.Stage("Reanalisis") :
+            reanalysis = rn.ReuseFactorization(K,model,dofData,modelKey)
+
+    # Solucion de desplazamientos
+    with monitor.Stage("Desplazamientos") as stage :
+        dofCount = dofData["DOFCount"]
+        unknownDOFCount = dofData["UnknownDOFCount"]
+        caseCount = len(model["LoadCases"])
+        Dk = np.full((dofCount-unknownDOFCount,caseCount),0.0)
+        Du = sl.SolveDisplacements(K,QF,Q,Dk,method,options)
+        D = {"Du" : Du,
+             "Dk" : Dk}
+        stage["Metodo"] = K["Factorization"]["Method"]
+        if "Iterations" in K["Factorization"] :
+            stage["Iteraciones"] = K["Factorization"]["Iterations"]
+            stage["Residuos"] = K["Factorization"]["Residuals"]
+        if K["Factorization"].get("Warnings") :
+            stage["Advertencias"] = K["Factorization"]["Warnings"]
+    if incremental :
+        rn.Remember(modelKey,model,dofData,K,reanalysis,monitor.Find("Desplazamientos")["WallTime"])
+
+    # Escritura de resultados en segundo plano: cada bloque se escribe mientras
+    # se calcula el siguiente
+    writer = io.ResultsWriter(resultsFileName,model,stations)
+    state["Writer"] = writer
+    writer.SubmitDisplacements(D,dofData)
+    ###
+    message = "Solucion de desplazamientos nodales... OK\n"
+    message = message + "Metodo de solucion: " + K["Factorization"]["Method"] + "\n"
+    if "History" in K["Factorization"] :
+        message = message + "Residuo relativo por iteracion (ultimo caso):\n"
+        for iteration, residual in K["Factorization"]["History"] :
+            message = message + "    %8d   %.3e\n" % (iteration, residual)
+    if incremental :
+        message = message + "Reanalisis:         " + reanalysis["Path"]
+        if reanalysis["ChangedBars"] is not None :
+            message = message + " (" + str(reanalysis["ChangedBars"]) + " barras cambiadas"
+            if reanalysis["Path"] == "woodbury" :
+                message = message + ", rango " + str(reanalysis["Rank"])
+            message = message + ")"
+        message = message + "\n"
+        if reanalysis["Saved"] is not None :
+            message = message + "Tiempo ahorrado:    %.3f s (estimado)\n" % reanalysis["Saved"]
+    message = message + monitor.StageMessage("Desplazamientos")
+    message = message + "\n\n"
+    log.Write(message)
+
+    # Solucion de reacciones
+    with monitor.Stage("Reacciones") :
+        R = sl.SolveReactions(K,QF,Q,D)
+    writer.SubmitReactions(R,dofData)
+    ###
+    message = "Solucion de reacciones...              OK\n"
+    message = message + monitor.StageMessage("Reacciones")
+    message = message + "\n\n"
+    log.Write(message)
+
+    # Solucion de fuerzas elementales
+    with monitor.Stage("Fuerzas elementales") :
+        sl.SolveElementForces(model,D)
+    writer.SubmitBarForces()
+    ###
+    message = "Solucion de fuerzas elementales...     OK\n"
+    message = message + monitor.StageMessage("Fuerzas elementales")
+    message = message + "\n\n"
+    log.Write(message)
+
+    # Resultados de los casos para las combinaciones de carga
+    if saveResults :
+        with monitor.Stage("Resultados por caso") :
+            io.SaveCaseResults(io.ResultsCacheFileName(dataFileName),model,dofData,D,R)
+        ###
+        message = "Resultados por caso...                 OK\n"
+        message = message + monitor.StageMessage("Resultados por caso")
+        message = message + "\n\n"
+        log.Write(message)
+
+    # Diagramas de fuerzas internas por estaciones
+    if stations > 0 :
+        import Stations as st
+        with monitor.Stage("Estaciones") as stage :
+            st.SampleStations(model,D,stations)
+            writer.SubmitStations()
+            extrema = st.BarExtrema(model)
+            io.ExportExtremaFile(extremaFileName,model,extrema)
+            stage["Estaciones"] = stations
+        ###
+        message = "Diagramas por estaciones...            OK\n"
+        barIDs = model["Arrays"]["BarIDs"]
+        for case in range(len(model["LoadCases"])) :
+            bar = int(np.argmax(np.abs(extrema["Moment"][:,case])))
+            message = message + "Caso %d: M max %.4g kN-m en la barra %d (x = %.3f m)" % (case + 1, extrema["Moment"][bar,case], barIDs[bar],
+                                                                                        extrema["MomentX"][bar,case])
+            bar = int(np.argmax(np.abs(extrema["MaxDeflection"][:,case])))
+            message = message + ", v max %.4g m en la barra %d (x = %.3f m)\n" % (extrema["MaxDeflection"][bar,case], barIDs[bar],
+                                                                                 extrema["MaxDeflectionX"][bar,case])
+        message = message + monitor.StageMessage("Estaciones")
+        message = message + "\n\n"
+        log.Write(message)
+
+    # Salida de datos (espera a que el escritor termine los bloques pendientes)
+    with monitor.Stage("Escritura de resultados") :
+        error = writer.Close()
+    if error is not None :
+        message = "Escritura de resultados...             ERROR\n" + error + "\n"
+        log.Write(message)
+        raise RuntimeError("No se pudo escribir " + resultsFileName)
+    ###
+    message = "Escritura de resultados...             OK\n"
+    message = message + monitor.StageMessage("Escritura de resultados")
+    message = message + "\n\n"
+    message = message + monitor.SummaryMessage()
+    log.Write(message)
+
+    # Mediciones en JSON junto al .log
+    summary = {"Model"      : dataFileName,
+               "Nodes"      : len(model["Nodes"]),
+               "Bars"       : len(model["Bars"]),
+               "DOF"        : dofData["DOFCount"],
+               "UnknownDOF" : dofData["UnknownDOFCount"],
+               "Reordering" : dofData["Reordering"],
+               "Bandwidth"  : int(dofData["Bandwidth"]),
+               "Method"     : K["Factorization"]["Method"]}
+    if incremental :
+        summary["Reanalysis"] = reanalysis
+    if GiD :
+        monitor.Save(statsFileName, summary)
+    summary.update(monitor.Report())
+
+    return summary
+
+if __name__ == "__main__" :
+
+    # Opcional: --stations k para los diagramas por estaciones y
+    # --save-results para guardar los resultados de los casos
+    arguments = sys.argv[1:]
+    stations = 0
+    if "--stations" in arguments :
+        position = arguments.index("--stations")
+        stations = int(arguments[position + 1])
+        del arguments[position:position + 2]
+    saveResults = "--save-results" in arguments
+    if saveResults :
+        arguments.remove("--save-results")
+
+    if len(arguments) > 1 :  # Metodo de solucion opcional despues del documento
+        RunModel(arguments[0], method=arguments[1], stations=stations, saveResults=saveResults)
+    elif len(arguments) > 0 :  # Este prrograma se invoca desde el GiD
+        RunModel(arguments[0], stations=stations, saveResults=saveResults)
+    else :
+        RunModel(stations=stations, saveResults=saveResults)